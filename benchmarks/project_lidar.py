@@ -0,0 +1,89 @@
+"""
+Benchmark of the lidar projection into the camera.
+
+Compares the vectorised Sequence.project_lidar against the previous per-point
+implementation and checks that both produce the same image.
+
+| Usage (from the repository root):
+| $ python benchmarks/project_lidar.py
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import cv2
+import matplotlib.pyplot as plt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import radiate
+
+
+def project_lidar_loop(seq, lidar, lidar_extrinsics, cam_intrinsic, color_mode='same'):
+    """per-point reference implementation"""
+    fx = cam_intrinsic[0, 0]
+    fy = cam_intrinsic[1, 1]
+    cx = cam_intrinsic[0, 2]
+    cy = cam_intrinsic[1, 2]
+    res = seq.config['left_cam_calib']['res']
+    max_dist = seq.config['lidar_proj']['max_dist']
+    if color_mode == 'same' or color_mode == 'pseudo_distance':
+        im_lidar = np.zeros((res[1], res[0], 3))
+    else:
+        im_lidar = np.zeros((res[1], res[0]))
+    lidar_points = np.matmul(lidar_extrinsics[:3, :3], lidar[:, :3].T).T
+    lidar_points += lidar_extrinsics[:3, 3]
+    for i in range(lidar.shape[0]):
+        if (lidar_points[i, 2] > 0 and lidar_points[i, 2] < max_dist):
+            xx = int(((lidar_points[i, 0] * fx) / lidar_points[i, 2]) + cx)
+            yy = int(((lidar_points[i, 1] * fy) / lidar_points[i, 2]) + cy)
+            if (xx > 0 and xx < res[0] and yy > 0 and yy < res[1]):
+                dist = np.sqrt(lidar_points[i, 0]*lidar_points[i, 0] +
+                               lidar_points[i, 1]*lidar_points[i, 1] +
+                               lidar_points[i, 2]*lidar_points[i, 2])
+                if color_mode == 'same':
+                    im_lidar = cv2.circle(
+                        im_lidar, (xx, yy), 1, color=(0, 255, 0))
+                elif color_mode == 'pseudo_distance':
+                    norm_dist = np.array(
+                        [(dist/max_dist)*255]).astype(np.uint8)
+                    cc = np.array(plt.get_cmap('viridis')(norm_dist))*255
+                    im_lidar = cv2.circle(
+                        im_lidar, (xx, yy), 1, color=cc.tolist()[0][:3][::-1])
+                elif color_mode == 'distance':
+                    im_lidar[yy, xx] = dist
+    return im_lidar
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sequence', default='data/radiate/tiny_foggy', type=str)
+    parser.add_argument('--frames', default=10, type=int)
+    args = parser.parse_args()
+
+    seq = radiate.Sequence(args.sequence)
+    lidar_folder = os.path.join(args.sequence, 'velo_lidar')
+    lidar_files = sorted(os.listdir(lidar_folder))[:args.frames]
+    clouds = [seq.read_lidar(os.path.join(lidar_folder, f))
+              for f in lidar_files]
+    extrinsics, intrinsic = seq.calib.LidarToRight, seq.calib.right_cam_mat
+
+    for color_mode in ['same', 'pseudo_distance', 'distance']:
+        t_loop = 0.0
+        t_vec = 0.0
+        for lidar in clouds:
+            t0 = time.perf_counter()
+            ref = project_lidar_loop(seq, lidar, extrinsics, intrinsic, color_mode)
+            t1 = time.perf_counter()
+            out = seq.project_lidar(lidar, extrinsics, intrinsic, color_mode)
+            t2 = time.perf_counter()
+            t_loop += t1 - t0
+            t_vec += t2 - t1
+            assert np.array_equal(ref, out), color_mode
+        n = len(clouds)
+        print('{:16s} loop {:8.2f} ms/frame  vectorised {:8.2f} ms/frame  speedup {:6.1f}x'.format(
+            color_mode, 1000 * t_loop / n, 1000 * t_vec / n, t_loop / t_vec))
+
+
+if __name__ == '__main__':
+    main()
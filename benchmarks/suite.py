@@ -0,0 +1,421 @@
+"""
+Benchmarks of the Sequence hot paths on a recorded sequence (data/radiate/tiny_foggy
+by default).
+
+Each benchmark runs a function over all the frames of the sequence, a few times, and
+reports the time per call, the throughput and the peak memory allocated during one call
+(numpy and Python allocations traced by tracemalloc). The results are written as JSON
+and compared with a stored baseline, and the benchmarks that became slower (or use more
+memory) than the tolerance are flagged as regressions.
+
+The point clouds can be made bigger (each cloud tiled with jittered copies) and
+the annotations can get more tracks (shifted copies of each track, written to a
+temporary copy of the sequence) to see how the code scales.
+
+| Usage (from the repository root):
+| $ python benchmarks/suite.py --output results.json
+| $ python benchmarks/suite.py --lidar_scale 4 --tracks 10 --only project_lidar_same
+| $ python benchmarks/suite.py --save_baseline   # store benchmarks/baseline.json
+| $ python benchmarks/suite.py --check           # exit code 1 on regressions
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import resource
+import tempfile
+import argparse
+import subprocess
+import statistics
+import tracemalloc
+import numpy as np
+import cv2
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+import radiate
+from utils.cfar import cfar2d
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+class Benchmark:
+    """
+    A function timed over a list of inputs
+    """
+
+    def __init__(self, name, fn, inputs, items=None, unit='frames', trace_memory=True):
+        """
+        :param name: benchmark name
+        :type name: string
+        :param fn: function called with each input
+        :type fn: callable
+        :param inputs: inputs of one pass
+        :type inputs: list
+        :param items: number of items processed by each call (e.g. points), 1 by default
+        :type items: list
+        :param unit: name of the items
+        :type unit: string
+        :param trace_memory: whether to measure the peak memory
+        :type trace_memory: bool
+        """
+        self.name = name
+        self.fn = fn
+        self.inputs = inputs
+        self.items = items if items is not None else [1] * len(inputs)
+        self.unit = unit
+        self.trace_memory = trace_memory
+
+    def run(self, repeat, min_time=0.05):
+        """
+        Time the benchmark after one warm-up pass. Each repetition runs enough passes
+        over the inputs to last min_time, so fast functions are not dominated by noise
+
+        :param repeat: number of timed repetitions
+        :type repeat: int
+        :param min_time: minimum duration of a repetition in seconds
+        :type min_time: float
+
+        :return: dictionary with the time per call in ms ('ms_median', 'ms_min', 'ms_mean'),
+            'calls_per_s', 'items_per_s', 'unit' and 'peak_mb'
+        :rtype: dict
+        """
+        t0 = time.perf_counter()
+        for x in self.inputs:
+            self.fn(x)
+        passes = max(1, int(np.ceil(min_time / (time.perf_counter() - t0))))
+        times = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            for _ in range(passes):
+                for x in self.inputs:
+                    self.fn(x)
+            times.append((time.perf_counter() - t0) / (passes * len(self.inputs)))
+        median = statistics.median(times)
+        return {'ms_median': 1000 * median,
+                'ms_min': 1000 * min(times),
+                'ms_mean': 1000 * statistics.mean(times),
+                'calls_per_s': 1 / median,
+                'items_per_s': float(np.mean(self.items)) / median,
+                'unit': self.unit,
+                'peak_mb': self.peak_memory() if self.trace_memory else None}
+
+    def peak_memory(self):
+        """
+        :return: peak memory in MB allocated during the call with the first input
+        :rtype: float
+        """
+        tracemalloc.start()
+        try:
+            self.fn(self.inputs[0])
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return peak / 2**20
+
+
+def scale_lidar(lidar, scale, rng):
+    """
+    Tile a point cloud with jittered copies
+
+    :param lidar: point cloud Nx5
+    :type lidar: np.array
+    :param scale: number of copies
+    :type scale: int
+    :param rng: random generator
+    :type rng: np.random.Generator
+
+    :return: point cloud with N * scale points
+    :rtype: np.array
+    """
+    if scale <= 1:
+        return lidar
+    copies = np.tile(lidar, (scale, 1))
+    copies[len(lidar):, :3] += rng.normal(0, 0.05, (len(copies) - len(lidar), 3))
+    return copies
+
+
+def scale_tracks(annotations, tracks, rng):
+    """
+    Add shifted copies of each annotation track
+
+    :param annotations: annotations.json content
+    :type annotations: list
+    :param tracks: number of tracks for each original track
+    :type tracks: int
+    :param rng: random generator
+    :type rng: np.random.Generator
+
+    :return: new annotations
+    :rtype: list
+    """
+    scaled = list(annotations)
+    next_id = max([obj['id'] for obj in annotations] + [0]) + 1
+    for _ in range(tracks - 1):
+        for obj in annotations:
+            dx, dy = rng.uniform(-150, 150, 2)
+            bboxes = []
+            for bbox in obj['bboxes']:
+                # frames without the object have an empty list
+                if bbox and bbox.get('position'):
+                    x, y, w, h = bbox['position']
+                    bbox = dict(bbox, position=[x + dx, y + dy, w, h])
+                bboxes.append(bbox)
+            scaled.append(dict(obj, id=next_id, bboxes=bboxes))
+            next_id += 1
+    return scaled
+
+
+def scaled_sequence(sequence_path, tracks, folder, rng):
+    """
+    Copy of a sequence folder with more annotation tracks. The sensor files are
+    symbolic links to the original ones
+
+    :param sequence_path: path/to/sequence_root
+    :type sequence_path: string
+    :param tracks: number of tracks for each original track
+    :type tracks: int
+    :param folder: folder where the copy is created
+    :type folder: string
+    :param rng: random generator
+    :type rng: np.random.Generator
+
+    :return: path of the copy
+    :rtype: string
+    """
+    if not os.path.isdir(sequence_path):
+        raise ValueError('annotation tracks can only be added to sequence folders')
+    copy_path = os.path.join(folder, os.path.basename(os.path.normpath(sequence_path)))
+    os.makedirs(os.path.join(copy_path, 'annotations'))
+    for name in os.listdir(sequence_path):
+        if name != 'annotations':
+            os.symlink(os.path.abspath(os.path.join(sequence_path, name)),
+                       os.path.join(copy_path, name))
+    with open(os.path.join(sequence_path, 'annotations', 'annotations.json')) as f:
+        annotations = json.load(f)
+    with open(os.path.join(copy_path, 'annotations', 'annotations.json'), 'w') as f:
+        json.dump(scale_tracks(annotations, tracks, rng), f)
+    return copy_path
+
+
+def cold_start(sequence_path, config_file):
+    """
+    Start a new process which imports radiate and opens a Sequence
+
+    :param sequence_path: path/to/sequence_root
+    :type sequence_path: string
+    :param config_file: configuration file
+    :type config_file: string
+    """
+    code = 'import radiate; radiate.Sequence({!r}, {!r})'.format(sequence_path, config_file)
+    subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True)
+
+
+def build_benchmarks(seq, args, rng):
+    """
+    Prepare the inputs of all the benchmarks
+
+    :param seq: sequence
+    :type seq: radiate.Sequence
+    :param args: command line arguments
+    :type args: argparse.Namespace
+    :param rng: random generator
+    :type rng: np.random.Generator
+
+    :return: list of benchmarks
+    :rtype: list
+    """
+    # radar frames where all the sensors are synchronised
+    outputs = [(frame, t, seq.get_from_timestamp(t, get_sensors=False))
+               for frame, t in zip(seq.timestamp_radar['frame'], seq.timestamp_radar['time'])]
+    outputs = [output for output in outputs if output[2]][:args.frames]
+    frames = [frame for frame, _, _ in outputs]
+    times = [t for _, t, _ in outputs]
+    lidar_frames = seq.timestamp_lidar['frame'][:args.frames]
+    camera_frames = seq.timestamp_camera['frame'][:args.frames]
+
+    lidar_paths = [os.path.join(seq.sequence_path, 'velo_lidar', '{:06d}.csv'.format(f))
+                   for f in lidar_frames]
+    clouds = [scale_lidar(np.asarray(seq.read_lidar(path), dtype=np.float64), args.lidar_scale, rng)
+              for path in lidar_paths]
+    points = [len(lidar) for lidar in clouds]
+    cameras = [(seq.read_image('zed_left', f), seq.read_image('zed_right', f))
+               for f in camera_frames]
+    polar = [cv2.imread(os.path.join(seq.sequence_path, 'Navtech_Polar', '{:06d}.png'.format(f)),
+                        cv2.IMREAD_GRAYSCALE) for f in frames]
+    annotation_ids = [int(f) - 1 for f in frames]
+    lidar_annotations = [output['annotations'].get('lidar_bev_image', [])
+                         for _, _, output in outputs]
+    boxes = [len(seq.get_annotation_from_id(i)) for i in annotation_ids]
+
+    benchmarks = [
+        Benchmark('read_lidar', seq.read_lidar, lidar_paths,
+                  [len(seq.read_lidar(path)) for path in lidar_paths], 'points'),
+        Benchmark('lidar_to_image', seq.lidar_to_image, clouds, points, 'points')]
+    for color_mode in ['same', 'pseudo_distance', 'distance']:
+        benchmarks.append(Benchmark(
+            'project_lidar_' + color_mode,
+            lambda lidar, color_mode=color_mode: seq.project_lidar(
+                lidar, seq.calib.LidarToLeft, seq.calib.left_cam_mat, color_mode),
+            clouds, points, 'points'))
+    benchmarks += [
+        Benchmark('get_rectfied', lambda images: seq.get_rectfied(*images), cameras),
+        Benchmark('get_annotation_from_id', seq.get_annotation_from_id, annotation_ids,
+                  boxes, 'boxes'),
+        Benchmark('project_bboxes_to_camera',
+                  lambda annotations: seq.project_bboxes_to_camera(
+                      annotations, seq.calib.left_cam_mat, seq.calib.RadarToLeft),
+                  lidar_annotations, [len(a) for a in lidar_annotations], 'boxes'),
+        Benchmark('cfar2d', lambda image: cfar2d(image, args.cfar_train, args.cfar_guard,
+                                                 args.cfar_rate), polar),
+        Benchmark('get_from_timestamp',
+                  lambda t: seq.get_from_timestamp(t)['sensors'].load(), times),
+        # the memory of the new process is not traced
+        Benchmark('cold_start', lambda path: cold_start(path, args.config),
+                  [seq.sequence_path], unit='processes', trace_memory=False)]
+    return benchmarks
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare results with a baseline
+
+    :param results: benchmark results
+    :type results: dict
+    :param baseline: baseline results
+    :type baseline: dict
+    :param tolerance: relative slowdown (or memory increase) flagged as a regression
+    :type tolerance: float
+
+    :return: dictionary with the 'status' ('ok', 'regression', 'improvement' or 'new'),
+        'time_ratio' and 'memory_ratio' of each benchmark
+    :rtype: dict
+    """
+    comparison = {}
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            comparison[name] = {'status': 'new', 'time_ratio': None, 'memory_ratio': None}
+            continue
+        # the fastest pass is the least affected by other processes
+        time_ratio = result['ms_min'] / base['ms_min']
+        memory_ratio = None
+        # memory below 1 MB is ignored, small allocations vary between runs
+        if result.get('peak_mb') is not None and base.get('peak_mb') is not None:
+            memory_ratio = (max(result['peak_mb'], 1.0) / max(base['peak_mb'], 1.0))
+        if time_ratio > 1 + tolerance or (memory_ratio is not None and
+                                           memory_ratio > 1 + tolerance):
+            status = 'regression'
+        elif time_ratio < 1 / (1 + tolerance):
+            status = 'improvement'
+        else:
+            status = 'ok'
+        comparison[name] = {'status': status, 'time_ratio': time_ratio,
+                            'memory_ratio': memory_ratio}
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sequence', default='data/radiate/tiny_foggy', type=str)
+    parser.add_argument('--config', default='config/config.yaml', type=str)
+    parser.add_argument('--frames', default=20, type=int,
+                        help='maximum number of frames of each pass')
+    parser.add_argument('--repeat', default=5, type=int, help='number of timed repetitions')
+    parser.add_argument('--min_time', default=0.05, type=float,
+                        help='minimum duration of a repetition in seconds')
+    parser.add_argument('--lidar_scale', default=1, type=int,
+                        help='copies of each point cloud (synthetic scaling)')
+    parser.add_argument('--tracks', default=1, type=int,
+                        help='copies of each annotation track (synthetic scaling)')
+    parser.add_argument('--cfar_train', default=20, type=int)
+    parser.add_argument('--cfar_guard', default=4, type=int)
+    parser.add_argument('--cfar_rate', default=1e-3, type=float)
+    parser.add_argument('--only', nargs='*', default=None, help='benchmarks to run')
+    parser.add_argument('--output', default=None, type=str,
+                        help='JSON file with the results (printed when not given)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, type=str)
+    parser.add_argument('--save_baseline', action='store_true',
+                        help='store the results as the baseline')
+    parser.add_argument('--tolerance', default=0.5, type=float,
+                        help='relative slowdown flagged as a regression')
+    parser.add_argument('--check', action='store_true',
+                        help='exit with code 1 if there are regressions')
+    args = parser.parse_args()
+
+    sequence_path = os.path.abspath(args.sequence)
+    args.config = os.path.abspath(args.config)
+    baseline_path = os.path.abspath(args.baseline)
+    # the configuration refers to files relative to the repository root
+    os.chdir(ROOT)
+    rng = np.random.default_rng(0)
+    tmp_folder = tempfile.mkdtemp()
+    try:
+        if args.tracks > 1:
+            sequence_path = scaled_sequence(sequence_path, args.tracks, tmp_folder, rng)
+        seq = radiate.Sequence(sequence_path, args.config)
+        benchmarks = build_benchmarks(seq, args, rng)
+
+        results = {}
+        for benchmark in benchmarks:
+            if args.only and benchmark.name not in args.only:
+                continue
+            results[benchmark.name] = benchmark.run(args.repeat, args.min_time)
+            r = results[benchmark.name]
+            print('{:30s} {:10.3f} ms/call {:14.1f} {}/s {:10s}'.format(
+                benchmark.name, r['ms_median'], r['items_per_s'], r['unit'],
+                '' if r['peak_mb'] is None else '{:8.1f} MB'.format(r['peak_mb'])),
+                file=sys.stderr)
+    finally:
+        shutil.rmtree(tmp_folder)
+
+    report = {'meta': {'sequence': args.sequence,
+                       'frames': args.frames,
+                       'repeat': args.repeat,
+                       'lidar_scale': args.lidar_scale,
+                       'tracks': args.tracks,
+                       'python': platform.python_version(),
+                       'numpy': np.__version__,
+                       'opencv': cv2.__version__,
+                       'machine': platform.machine(),
+                       'cpus': os.cpu_count(),
+                       'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                       'date': time.strftime('%Y-%m-%dT%H:%M:%S')},
+              'results': results}
+
+    regressions = []
+    if os.path.isfile(baseline_path) and not args.save_baseline:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        scaling = ('lidar_scale', 'tracks')
+        if any(baseline['meta'].get(key) != report['meta'][key] for key in scaling):
+            print('the baseline was measured with another synthetic scaling, not compared',
+                  file=sys.stderr)
+        else:
+            report['comparison'] = compare(results, baseline['results'], args.tolerance)
+            for name, c in report['comparison'].items():
+                if c['status'] != 'ok':
+                    print('{:30s} {:12s} time x{}'.format(
+                        name, c['status'],
+                        '-' if c['time_ratio'] is None else '{:.2f}'.format(c['time_ratio'])),
+                        file=sys.stderr)
+            regressions = [name for name, c in report['comparison'].items()
+                           if c['status'] == 'regression']
+
+    data = json.dumps(report, indent=2)
+    if args.save_baseline:
+        with open(baseline_path, 'w') as f:
+            f.write(data + '\n')
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(data + '\n')
+    elif not args.save_baseline:
+        print(data)
+    if args.check and regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
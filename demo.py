@@ -1,5 +1,4 @@
 import radiate
-import numpy as np
 import os
 
 # path to the sequence
@@ -12,7 +11,6 @@ dt = 0.25
 # load sequence
 seq = radiate.Sequence(os.path.join(root_path, sequence_name))
 
-# play sequence
-for t in np.arange(seq.init_timestamp, seq.end_timestamp, dt):
-    output = seq.get_from_timestamp(t)
+# play sequence (the next frames are loaded in background threads)
+for t, output in seq.iter_frames(dt):
     seq.vis_all(output, 0)
\ No newline at end of file
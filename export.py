@@ -0,0 +1,46 @@
+"""
+Export the visualisation of RADIATE sequences without a display.
+
+| Example (all sequences, one zip file of jpg images per sequence):
+| $ python export.py data/radiate/ --format jpg --archive
+"""
+import os
+import argparse
+import radiate
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("root_folder", help="root folder with radiate dataset",
+                        type=str)
+    parser.add_argument("--sequences", help="sequences to export (default: all)",
+                        nargs='*', default=None)
+    parser.add_argument("--dt", help="time step in seconds", type=float, default=0.25)
+    parser.add_argument("--output", help="output folder (default: config output_folder)",
+                        type=str, default=None)
+    parser.add_argument("--format", help="'png', 'jpg' or 'avi' (default: config)",
+                        type=str, default=None)
+    parser.add_argument("--archive", help="one zip file per sequence",
+                        action='store_true')
+    parser.add_argument("--config", help="config file", type=str,
+                        default='config/config.yaml')
+    args = parser.parse_args()
+
+    sequences = args.sequences
+    if not sequences:
+        sequences = sorted(s for s in os.listdir(args.root_folder)
+                           if os.path.isdir(os.path.join(args.root_folder, s, 'Navtech_Cartesian')))
+
+    for sequence in sequences:
+        seq = radiate.Sequence(os.path.join(args.root_folder, sequence), args.config)
+        if args.format is not None:
+            seq.config.setdefault('export', {})['format'] = args.format
+        if args.archive:
+            seq.config.setdefault('export', {})['archive'] = True
+        output_folder = None
+        if args.output is not None:
+            output_folder = os.path.join(args.output, sequence)
+        stats = seq.export_all(args.dt, output_folder)
+        print('{}: {} frames, {} images, {:.1f} MB in {:.1f} s ({:.1f} fps, {:.1f} MB/s, '
+              '{:.1f} s waiting for the writers)'.format(
+                  sequence, stats['frames'], stats['images'], stats['bytes'] / 1e6,
+                  stats['elapsed'], stats['fps'], stats['mb_per_s'], stats['blocked']))
@@ -1,12 +1,28 @@
 import cv2
 import os
 import numpy as np
-import matplotlib.pyplot as plt
 import json
-import pandas as pd
 import math
-import yaml
-from utils.calibration import Calibration
+import threading
+import warnings
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from utils.config import load_config, read_yaml
+from utils.lidar import project_to_camera, bev_image
+from utils.geometry import (transform_point_cloud, boxes_from_annotations, rotated_box_corners,
+                            pseudo_box_vertices, project_points, BOX_3D_PATH)
+from utils.lidar_cache import LidarCache, read_csv
+from utils.shard import ShardReader, EXTENSION as SHARD_EXTENSION
+from utils.dataset_index import load_index
+from utils.rectification import load_rectification_maps
+from utils.polar import PolarToCartesian
+from utils.odometry import Odometry
+from utils.sweeps import SweepAccumulator, euler_transform
+from utils.annotations import AnnotationIndex
+from utils.draw import color_to_bgr, draw_polylines
+from utils.export import FrameExporter, to_uint8
+from utils.lazy import Lazy, LazyDict
+from utils.frame_cache import FrameCache, cached, freeze
 
 
 class Sequence:
@@ -27,31 +43,57 @@ class Sequence:
         access the sensor and annotation information at certain timestamp
 
         :type sequence_path: string
-        :param sequence_path: path/to/sequence_root
+        :param sequence_path: path/to/sequence_root, or path to a sequence packed with
+            utils.shard (path/to/sequence_root.shard). A folder with a packed shard next
+            to it is read from the shard
 
         :type config_file: string
         :param config_file: the path to the configuration files
         """
         self.sequence_path = sequence_path
 
-        # load annotations
+        # packed sequence (None if the sequence was not packed)
+        self.shard = ShardReader.open(self.sequence_path)
+
+        # binary lidar cache (None if the sequence was not converted)
+        self.lidar_folder = os.path.abspath(
+            os.path.join(self.sequence_path, 'velo_lidar'))
+        self.lidar_cache = LidarCache.open(self.sequence_path)
+
+        # GPS/IMU odometry, parsed (or read from its binary cache) on first use
+        self.__odometry = None
+        self.__odometry_lock = threading.Lock()
+
+        # ring buffers of the lidar sweeps, one per accumulation setting
+        self.__sweeps = {}
+
+        # annotations, parsed on first use
         self.annotations_path = os.path.join(
             self.sequence_path, 'annotations', 'annotations.json')
-        self.__load_annotations()
+        self.__annotations = Lazy(self.__load_annotations)
+
+        # parameters merged with the calibration file, and calibration matrices
+        # (both parsed once per process)
+        self.config, self.calib = load_config(config_file)
 
-        # load parameters and calibration file
-        with open(config_file, 'r') as file:
-            self.config = yaml.full_load(file)
-        with open(self.config['calib_file'], 'r') as file:
-            self.calib = yaml.full_load(file)
-        self.config.update(self.calib)
+        # stereo rectification maps, computed on first use
+        self.__rect_maps = None
 
-        # generate calibration matrices from calib file
-        self.calib = Calibration(self.config)
+        # polar to cartesian converters (remap tables) of each output grid
+        self.__polar_converters = {}
+        self.__polar_lock = threading.Lock()
+
+        # in-memory LRU caches of decoded sensors and derived products (opt-in)
+        cache_cfg = self.config.get('frame_cache', {})
+        self.enable_cache(cache_cfg.get('raw_bytes', 0),
+                          cache_cfg.get('derived_bytes', 0))
 
         # output folder
+        sequence_name = os.path.basename(os.path.normpath(self.sequence_path))
+        if sequence_name.endswith(SHARD_EXTENSION):
+            sequence_name = sequence_name[:-len(SHARD_EXTENSION)]
         self.output_folder = os.path.join(
-            self.config['output_folder'], os.path.basename(self.sequence_path))
+            self.config['output_folder'], sequence_name)
 
         # colors used for display
         self.colors = {'car': (1, 0, 0),
@@ -64,6 +106,20 @@ class Sequence:
                        'bicycle': (0.3, 1.0, 1.0),
                        'vehicle': (1.0, 0.0, 0.0)
                        }
+        self.colors_bgr = {class_name: color_to_bgr(color)
+                           for class_name, color in self.colors.items()}
+
+        # window title of each rendered view
+        self.windows = {'camera_left_raw': 'camera left raw',
+                        'camera_right_raw': 'camera right raw',
+                        'left_bb': 'camera left',
+                        'right_bb': 'camera right',
+                        'radar_cart_vis': 'radar',
+                        'radar_polar': 'radar polar',
+                        'radar_cart_polar_vis': 'radar from polar',
+                        'lidar_vis': 'lidar image',
+                        'overlay_left_bb': 'projected lidar to left camera',
+                        'overlay_right_bb': 'projected lidar to right camera'}
 
         # average object height
         self.heights = {'car': 1.5,
@@ -96,13 +152,61 @@ class Sequence:
                                      self.timestamp_radar['time'][-1]])
 
     def __load_annotations(self):
-        if (os.path.exists(self.annotations_path)):
-            f = open(self.annotations_path)
-            self.annotations = json.load(f)
+        data = None
+        if self.shard is not None:
+            data = self.shard.read_file('annotations/annotations.json')
+        if data is not None:
+            annotations = json.loads(data)
+        elif (os.path.exists(self.annotations_path)):
+            with open(self.annotations_path) as f:
+                annotations = json.load(f)
         else:
-            self.annotations = None
+            return None, None
+        return annotations, AnnotationIndex(annotations)
+
+    @property
+    def annotations(self):
+        """annotations of the sequence (annotations.json), parsed on first use
 
-    def overlay_camera_lidar(self, camera, lidar):
+        :return: list of objects, None if the sequence is not annotated
+        :rtype: list
+        """
+        return self.__annotations()[0]
+
+    @property
+    def annotation_index(self):
+        """index of the annotations by frame, built on first use
+
+        :return: annotation index, None if the sequence is not annotated
+        :rtype: AnnotationIndex
+        """
+        return self.__annotations()[1]
+
+    def enable_cache(self, raw_bytes, derived_bytes):
+        """enable the in-memory LRU caches used by self.get_from_timestamp. Raw decoded sensors
+        (images, point clouds) are cached by (sensor, frame id) and derived products (rectified
+        images, bird's eye view, projections) by (product, frame id, options), so changing an
+        option only misses the products it affects. Cached arrays are shared and read-only
+
+        :param raw_bytes: memory budget in bytes of the raw sensors cache, 0 disables it
+        :type raw_bytes: int
+        :param derived_bytes: memory budget in bytes of the derived products cache, 0 disables it
+        :type derived_bytes: int
+        """
+        self.raw_cache = FrameCache(raw_bytes) if raw_bytes > 0 else None
+        self.derived_cache = FrameCache(
+            derived_bytes) if derived_bytes > 0 else None
+
+    def cache_stats(self):
+        """statistics of the in-memory caches
+
+        :return: dictionary with 'raw' and 'derived' statistics (None if disabled), see FrameCache.stats
+        :rtype: dict
+        """
+        return {'raw': self.raw_cache.stats() if self.raw_cache is not None else None,
+                'derived': self.derived_cache.stats() if self.derived_cache is not None else None}
+
+    def overlay_camera_lidar(self, camera, lidar, inplace=False):
         """
         Method that joins camera and projected lidar in one image for visualisation
 
@@ -112,14 +216,18 @@ class Sequence:
         :type lidar: np.array
         :param lidar: lidar image with the same size as camera
 
+        :type inplace: bool
+        :param inplace: whether to draw into camera instead of a copy
+
         :return: overlayed image
         :rtype: np.array
         """
-        overlay = np.copy(camera)
-        overlay[np.nonzero(lidar)] = lidar[np.nonzero(lidar)]
+        overlay = camera if inplace else np.copy(camera)
+        nonzero = lidar != 0
+        overlay[nonzero] = lidar[nonzero]
         return overlay
 
-    def project_lidar(self, lidar, lidar_extrinsics, cam_intrinsic, color_mode='same'):
+    def project_lidar(self, lidar, lidar_extrinsics, cam_intrinsic, color_mode='same', point_radius=1):
         """
         Method to project the lidar into the camera
 
@@ -141,50 +249,20 @@ class Sequence:
         options: 'same' always constant color. 'pseudo_distance': uses a color map to create a psedo
         color which refers to the distance. 'distance' creates an image with the actual distance as float
 
+        :type point_radius: int
+        :param point_radius: radius in pixels of each projected point for the 'same' and
+        'pseudo_distance' modes
+
         :rtype: np.array
         :return: returns the projected lidar into the respective camera with the same size as the camera
         """
-        fx = cam_intrinsic[0, 0]
-        fy = cam_intrinsic[1, 1]
-        cx = cam_intrinsic[0, 2]
-        cy = cam_intrinsic[1, 2]
-        if color_mode == 'same' or color_mode == 'pseudo_distance':
-            im_lidar = np.zeros((self.config['left_cam_calib']['res'][1],
-                                 self.config['left_cam_calib']['res'][0], 3))
-        else:
-            im_lidar = np.zeros((self.config['left_cam_calib']['res'][1],
-                                 self.config['left_cam_calib']['res'][0]))
-        lidar_points = lidar[:, :3].T
-        R = lidar_extrinsics[:3, :3]
-        lidar_points = np.matmul(R, lidar_points).T
-        lidar_points += lidar_extrinsics[:3, 3]
-        for i in range(lidar.shape[0]):
-            if (lidar_points[i, 2] > 0 and lidar_points[i, 2] < self.config['lidar_proj']['max_dist']):
-                xx = int(((lidar_points[i, 0] * fx) / lidar_points[i, 2]) + cx)
-                yy = int(((lidar_points[i, 1] * fy) / lidar_points[i, 2]) + cy)
-                if (xx > 0 and xx < self.config['left_cam_calib']['res'][0] and
-                        yy > 0 and yy < self.config['left_cam_calib']['res'][1]):
-                    if color_mode == 'same':
-                        im_lidar = cv2.circle(
-                            im_lidar, (xx, yy), 1, color=(0, 255, 0))
-                    elif color_mode == 'pseudo_distance':
-                        dist = np.sqrt(lidar_points[i, 0]*lidar_points[i, 0] +
-                                       lidar_points[i, 1]*lidar_points[i, 1] +
-                                       lidar_points[i, 2]*lidar_points[i, 2])
-                        norm_dist = np.array(
-                            [(dist/self.config['lidar_proj']['max_dist'])*255]).astype(np.uint8)
-                        cc = np.array(plt.get_cmap('viridis')(norm_dist))*255
-                        im_lidar = cv2.circle(
-                            im_lidar, (xx, yy), 1, color=cc.tolist()[0][:3][::-1])
-                    elif color_mode == 'distance':
-                        dist = np.sqrt(lidar_points[i, 0]*lidar_points[i, 0] +
-                                       lidar_points[i, 1]*lidar_points[i, 1] +
-                                       lidar_points[i, 2]*lidar_points[i, 2])
-                        im_lidar[yy, xx] = dist
-
-        return im_lidar
-
-    def get_from_timestamp(self, t, get_sensors=True, get_annotations=True):
+        return project_to_camera(lidar, lidar_extrinsics, cam_intrinsic,
+                                 self.config['left_cam_calib']['res'],
+                                 self.config['lidar_proj']['max_dist'],
+                                 color_mode=color_mode,
+                                 point_radius=point_radius)
+
+    def get_from_timestamp(self, t, get_sensors=True, get_annotations=True, sync=None):
         """method to get sensor and annotation information from some timestamp
 
         :param t: This is the timestamp which access the sensors/annotations
@@ -193,17 +271,93 @@ class Sequence:
         :type get_sensors: bool, optional
         :param get_annotations: whether to retrieve annotation info, defaults to True
         :type get_annotations: bool, optional
-        :return: returns a single variable as a dictionary with 'sensors' and 'annotations' as key
+        :param sync: row of self.sync_table for t, which avoids searching the frames, defaults to None
+        :type sync: np.void, optional
+        :return: returns a single variable as a dictionary with 'sensors' and 'annotations' as key.
+            'sensors' and 'annotations' are LazyDict mappings, each entry is read/computed on first access
         :rtype: dict
         """
-        output = {}
         self.current_time = t
-        id_camera, ts_camera = self.get_id(
-            t, self.timestamp_camera, self.config['sync']['camera'])
-        id_lidar, ts_lidar = self.get_id(
-            t, self.timestamp_lidar, self.config['sync']['lidar'])
-        id_radar, ts_radar = self.get_id(
-            t, self.timestamp_radar, self.config['sync']['radar'])
+        return self.__read_frame(t, get_sensors, get_annotations, sync)
+
+    def iter_frames(self, dt, start=None, end=None, workers=4, prefetch=8,
+                    get_sensors=True, get_annotations=True):
+        """iterate over the sequence with a fixed time step while a thread pool prepares the
+        next frames in the background. Frames are returned in order and at most prefetch
+        frames are prepared ahead. Breaking the loop (or calling close() on the iterator)
+        cancels the pending frames.
+
+        | Example:
+        | >>> for t, output in seq.iter_frames(0.25, workers=4):
+        | >>>     seq.vis_all(output)
+
+        :param dt: time step in seconds
+        :type dt: float
+        :param start: first timestamp, defaults to self.init_timestamp
+        :type start: float, optional
+        :param end: end timestamp (not included), defaults to self.end_timestamp
+        :type end: float, optional
+        :param workers: number of threads, 0 reads the frames in the calling thread, defaults to 4
+        :type workers: int, optional
+        :param prefetch: maximum number of frames prepared ahead, defaults to 8
+        :type prefetch: int, optional
+        :param get_sensors: whether to retrieve sensor information, defaults to True
+        :type get_sensors: bool, optional
+        :param get_annotations: whether to retrieve annotation info, defaults to True
+        :type get_annotations: bool, optional
+        :return: generator of tuples (t, output) where output is the same as self.get_from_timestamp(t),
+            with all the entries already computed
+        :rtype: generator
+        """
+        table = self.sync_table(dt, start, end)
+        if workers <= 0:
+            for sync in table:
+                self.current_time = sync['t']
+                yield sync['t'], self.__read_frame(sync['t'], get_sensors, get_annotations, sync)
+            return
+
+        executor = ThreadPoolExecutor(max_workers=workers)
+        pending = deque()
+        try:
+            for sync in table:
+                pending.append((sync['t'], executor.submit(
+                    self.__load_frame, sync['t'], get_sensors, get_annotations, sync)))
+                if len(pending) >= max(prefetch, 1):
+                    t, future = pending.popleft()
+                    output = future.result()
+                    self.current_time = t
+                    yield t, output
+            while pending:
+                t, future = pending.popleft()
+                output = future.result()
+                self.current_time = t
+                yield t, output
+        finally:
+            for _, future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def __load_frame(self, t, get_sensors=True, get_annotations=True, sync=None):
+        # read the frame and compute all its lazy entries (ego_pose is a plain dict)
+        output = self.__read_frame(t, get_sensors, get_annotations, sync)
+        for value in output.values():
+            if isinstance(value, LazyDict):
+                value.load()
+        return output
+
+    def __read_frame(self, t, get_sensors=True, get_annotations=True, sync=None):
+        output = {}
+        if sync is None:
+            id_camera, ts_camera = self.get_id(
+                t, self.timestamp_camera, self.config['sync']['camera'])
+            id_lidar, ts_lidar = self.get_id(
+                t, self.timestamp_lidar, self.config['sync']['lidar'])
+            id_radar, ts_radar = self.get_id(
+                t, self.timestamp_radar, self.config['sync']['radar'])
+        else:
+            id_camera, ts_camera = sync['camera_frame'], sync['camera_time']
+            id_lidar, ts_lidar = sync['lidar_frame'], sync['lidar_time']
+            id_radar, ts_radar = sync['radar_frame'], sync['radar_time']
         if (len(self.timestamp_radar['time']) > id_radar + 1):
             t2 = self.timestamp_radar['time'][id_radar + 1]
         else:
@@ -213,101 +367,204 @@ class Sequence:
             str_format = '{:06d}'
 
             # generata paths from frames
-            im_left_path = os.path.join(
-                self.sequence_path, 'zed_left', str_format.format(id_camera) + '.png')
-
-            im_right_path = os.path.join(
-                self.sequence_path, 'zed_right', str_format.format(id_camera) + '.png')
-
-            radar_cartesian_path = os.path.join(
-                self.sequence_path, 'Navtech_Cartesian', str_format.format(id_radar) + '.png')
-
             lidar_path = os.path.join(
                 self.sequence_path, 'velo_lidar', str_format.format(id_lidar) + '.csv')
 
-            sensors = {}
-            if (self.config['use_camera_left_raw'] or
-                self.config['use_camera_right_raw'] or
-                self.config['use_camera_left_rect'] or
-                    self.config['use_camera_right_rect']):
-                im_left = cv2.imread(im_left_path)
-                im_right = cv2.imread(im_right_path)
-
-            if (self.config['use_camera_left_rect'] or self.config['use_camera_right_rect']):
-                im_left_rect, im_right_rect, disp_to_depth = self.get_rectfied(
-                    im_left, im_right)
-
-            if (self.config['use_lidar_bev_image'] or
-                self.config['use_proj_lidar_left'] or
-                    self.config['use_proj_lidar_right']):
-                lidar = self.read_lidar(lidar_path)
-
-            if (self.config['use_camera_left_raw']):
-                sensors['camera_left_raw'] = im_left
-
-            if (self.config['use_camera_right_raw']):
-                sensors['camera_right_raw'] = im_right
-
-            if (self.config['use_camera_left_rect']):
-                sensors['camera_left_rect'] = im_left_rect
-
-            if (self.config['use_camera_right_rect']):
-                sensors['camera_right_rect'] = im_right_rect
-
-            if (self.config['use_radar_cartesian']):
-                radar_cartesian = cv2.imread(radar_cartesian_path)
-                sensors['radar_cartesian'] = radar_cartesian
-
-            if (self.config['use_lidar_bev_image']):
-                sensors['lidar_bev_image'] = self.lidar_to_image(lidar)
-
-            if (self.config['use_proj_lidar_left']):
-                proj_lidar_left = self.project_lidar(lidar, self.calib.LidarToLeft, self.calib.left_cam_mat,
-                                                     color_mode=self.config['lidar_proj']['color_mode'])
-                sensors['proj_lidar_left'] = proj_lidar_left
-
-            if (self.config['use_proj_lidar_right']):
-                proj_lidar_right = self.project_lidar(lidar, self.calib.LidarToRight, self.calib.right_cam_mat,
-                                                      color_mode=self.config['lidar_proj']['color_mode'])
-                sensors['proj_lidar_right'] = proj_lidar_right
+            cfg = self.config
+            proj_cfg = cfg['lidar_proj']
+
+            # every entry is read/computed on first access and the intermediate
+            # inputs (raw images, point cloud) are shared between entries
+            raw_cache = self.raw_cache
+            derived_cache = self.derived_cache
+            im_left = Lazy(lambda: cached(raw_cache, ('camera_left', id_camera),
+                                          lambda: self.read_image('zed_left', id_camera)))
+            im_right = Lazy(lambda: cached(raw_cache, ('camera_right', id_camera),
+                                           lambda: self.read_image('zed_right', id_camera)))
+            lidar = Lazy(lambda: cached(raw_cache, ('lidar', id_lidar),
+                                        lambda: self.read_lidar(lidar_path)))
+            rect_key = freeze(cfg.get('rectification'))
+            bev_key = freeze(cfg['lidar_bev_image'])
+            proj_key = freeze(proj_cfg)
+
+            # the lidar outputs use the accumulated sweeps when n_sweeps > 1
+            acc_cfg = cfg.get('lidar_accumulation') or {}
+            n_sweeps = acc_cfg.get('n_sweeps', 1)
+            if n_sweeps > 1:
+                acc_key = freeze(acc_cfg)
+                lidar_accumulated = Lazy(lambda: cached(
+                    derived_cache, ('lidar_pc_accumulated', id_lidar, acc_key),
+                    lambda: self.get_lidar_accumulated(ts_lidar, n_sweeps, id_lidar,
+                                                       acc_cfg.get('ego_motion', False))))
+                lidar = Lazy(lambda: lidar_accumulated()[:, :5])
+                sensors_accumulated = lidar_accumulated
+                bev_key = (bev_key, acc_key)
+                proj_key = (proj_key, acc_key)
+
+            sensors = LazyDict()
+            if n_sweeps > 1:
+                sensors.set_lazy('lidar_pc_accumulated', sensors_accumulated)
+
+            if (cfg['use_camera_left_raw']):
+                sensors.set_lazy('camera_left_raw', im_left)
+
+            if (cfg['use_camera_right_raw']):
+                sensors.set_lazy('camera_right_raw', im_right)
+
+            if (cfg['use_camera_left_rect']):
+                sensors.set_lazy('camera_left_rect', lambda: cached(
+                    derived_cache, ('camera_left_rect', id_camera, rect_key),
+                    lambda: self.get_rectfied(im_left(), None)[0]))
+
+            if (cfg['use_camera_right_rect']):
+                sensors.set_lazy('camera_right_rect', lambda: cached(
+                    derived_cache, ('camera_right_rect', id_camera, rect_key),
+                    lambda: self.get_rectfied(None, im_right())[1]))
+
+            if (cfg['use_radar_cartesian']):
+                sensors.set_lazy('radar_cartesian', lambda: cached(
+                    raw_cache, ('radar_cartesian', id_radar),
+                    lambda: self.read_image('Navtech_Cartesian', id_radar)))
+
+            radar_polar = Lazy(lambda: cached(raw_cache, ('radar_polar', id_radar),
+                                              lambda: self.read_image('Navtech_Polar', id_radar)))
+            if (cfg['use_radar_polar']):
+                sensors.set_lazy('radar_polar', radar_polar)
+
+            if (cfg.get('use_radar_cartesian_from_polar', False)):
+                polar_key = freeze(cfg.get('radar_polar_to_cartesian'))
+                sensors.set_lazy('radar_cartesian_from_polar', lambda: cached(
+                    derived_cache, ('radar_cartesian_from_polar', id_radar, polar_key),
+                    lambda: self.polar_to_cartesian(radar_polar())))
+
+            if (cfg['use_lidar_bev_image']):
+                bev_channels = cfg['lidar_bev_image'].get('channels')
+                if bev_channels:
+                    bev = Lazy(lambda: cached(
+                        derived_cache, ('lidar_bev_image', id_lidar, bev_key),
+                        lambda: self.lidar_to_image(lidar(), bev_channels)))
+                    sensors.set_lazy('lidar_bev_image', lambda: bev()[0])
+                    sensors.set_lazy('lidar_bev_channels', lambda: bev()[1])
+                else:
+                    sensors.set_lazy('lidar_bev_image', lambda: cached(
+                        derived_cache, ('lidar_bev_image', id_lidar, bev_key),
+                        lambda: self.lidar_to_image(lidar())))
+
+            if (cfg['use_proj_lidar_left']):
+                sensors.set_lazy('proj_lidar_left', lambda: cached(
+                    derived_cache, ('proj_lidar_left', id_lidar, proj_key),
+                    lambda: self.project_lidar(
+                        lidar(), self.calib.LidarToLeft, self.calib.left_cam_mat,
+                        color_mode=proj_cfg['color_mode'],
+                        point_radius=proj_cfg.get('point_radius', 1))))
+
+            if (cfg['use_proj_lidar_right']):
+                sensors.set_lazy('proj_lidar_right', lambda: cached(
+                    derived_cache, ('proj_lidar_right', id_lidar, proj_key),
+                    lambda: self.project_lidar(
+                        lidar(), self.calib.LidarToRight, self.calib.right_cam_mat,
+                        color_mode=proj_cfg['color_mode'],
+                        point_radius=proj_cfg.get('point_radius', 1))))
 
             output['sensors'] = sensors
 
         if (get_annotations):
-            annotations = {}
+            annotations = LazyDict()
             if (self.annotations != None):
+                lidar_annotations = Lazy(lambda: self.get_lidar_annotations(
+                    id_radar, self.config['interpolate_bboxes'], t, ts_radar, t2))
 
+                radar_annotation_id = self.__get_correct_radar_id_from_raw_ind(
+                    id_radar)
                 if self.config['use_radar_cartesian']:
-                    radar_annotation_id = self.__get_correct_radar_id_from_raw_ind(
-                        id_radar)
-                    radar_annotations = self.get_annotation_from_id(
-                        radar_annotation_id)
-                    annotations['radar_cartesian'] = radar_annotations
+                    annotations.set_lazy('radar_cartesian',
+                                         lambda: self.get_annotation_from_id(radar_annotation_id))
+
+                if self.config.get('use_radar_cartesian_from_polar', False):
+                    annotations.set_lazy('radar_cartesian_from_polar',
+                                         lambda: self.polar_to_cartesian_annotations(
+                                             self.get_annotation_from_id(radar_annotation_id)))
 
-                if self.config['use_lidar_bev_image']:
-                    annotations['lidar_bev_image'] = self.get_lidar_annotations(
-                        id_radar, self.config['interpolate_bboxes'], t, ts_radar, t2)
+                if (self.config['use_lidar_bev_image'] or
+                    self.config['use_camera_left_rect'] or
+                        self.config['use_camera_right_rect']):
+                    annotations.set_lazy('lidar_bev_image', lidar_annotations)
 
                 if self.config['use_camera_left_rect']:
-                    annotations['lidar_bev_image'] = self.get_lidar_annotations(
-                        id_radar, self.config['interpolate_bboxes'], t, ts_radar, t2)
-                    bboxes_3d = self.project_bboxes_to_camera(annotations['lidar_bev_image'],
-                                                              self.calib.left_cam_mat,
-                                                              self.calib.RadarToLeft)
-                    annotations['camera_left_rect'] = bboxes_3d
+                    annotations.set_lazy('camera_left_rect', lambda: self.project_bboxes_to_camera(
+                        lidar_annotations(), self.calib.left_cam_mat, self.calib.RadarToLeft))
 
                 if self.config['use_camera_right_rect']:
-                    annotations['lidar_bev_image'] = self.get_lidar_annotations(
-                        id_radar, self.config['interpolate_bboxes'], t, ts_radar, t2)
-                    bboxes_3d = self.project_bboxes_to_camera(annotations['lidar_bev_image'],
-                                                              self.calib.right_cam_mat,
-                                                              self.calib.RadarToRight)
-                    annotations['camera_right_rect'] = bboxes_3d
+                    annotations.set_lazy('camera_right_rect', lambda: self.project_bboxes_to_camera(
+                        lidar_annotations(), self.calib.right_cam_mat, self.calib.RadarToRight))
 
             output['annotations'] = annotations
 
+        if self.config.get('use_ego_pose', False):
+            odometry = self.get_odometry()
+            if odometry is not None:
+                poses = odometry.pose_at([t])
+                output['ego_pose'] = {key: value[0] for key, value in poses.items()}
+
         return output
 
+    def render_all(self, output):
+        """render all the sensors/annotations enabled in the config, without displaying them
+
+        :param output: gets the output from self.get_from_timestamp(t)
+        :type output: dict
+        :return: dictionary with the image of each view, whose names are the ones used
+            when saving them ('camera_left_raw', 'left_bb', 'radar_cart_vis', ...)
+        :rtype: dict
+        """
+        images = {}
+        if output == {}:
+            return images
+        sensors = output['sensors']
+        if self.config['use_camera_left_raw']:
+            images['camera_left_raw'] = sensors['camera_left_raw']
+
+        if self.config['use_camera_right_raw']:
+            images['camera_right_raw'] = sensors['camera_right_raw']
+
+        if self.config['use_camera_left_rect']:
+            images['left_bb'] = self.vis_3d_bbox_cam(
+                sensors['camera_left_rect'], output['annotations']['camera_left_rect'])
+
+        if self.config['use_camera_right_rect']:
+            images['right_bb'] = self.vis_3d_bbox_cam(
+                sensors['camera_right_rect'], output['annotations']['camera_right_rect'])
+
+        if self.config['use_radar_cartesian']:
+            images['radar_cart_vis'] = self.vis(
+                sensors['radar_cartesian'], output['annotations']['radar_cartesian'])
+
+        if self.config['use_radar_polar']:
+            images['radar_polar'] = sensors['radar_polar']
+
+        if self.config.get('use_radar_cartesian_from_polar', False):
+            images['radar_cart_polar_vis'] = self.vis(
+                sensors['radar_cartesian_from_polar'],
+                output['annotations']['radar_cartesian_from_polar'])
+
+        if self.config['use_lidar_bev_image']:
+            images['lidar_vis'] = self.vis(
+                sensors['lidar_bev_image'], output['annotations']['lidar_bev_image'])
+
+        if self.config['use_proj_lidar_left']:
+            overlay_left = self.overlay_camera_lidar(sensors['camera_left_rect'],
+                                                     sensors['proj_lidar_left'])
+            images['overlay_left_bb'] = self.vis_3d_bbox_cam(
+                overlay_left, output['annotations']['camera_left_rect'], inplace=True)
+
+        if self.config['use_proj_lidar_right']:
+            overlay_right = self.overlay_camera_lidar(sensors['camera_right_rect'],
+                                                      sensors['proj_lidar_right'])
+            images['overlay_right_bb'] = self.vis_3d_bbox_cam(
+                overlay_right, output['annotations']['camera_right_rect'], inplace=True)
+
+        return images
+
     def vis_all(self, output, wait_time=1):
         """method to diplay all the sensors/annotations
 
@@ -316,83 +573,54 @@ class Sequence:
         :param wait_time: how to long to wait until display next frame. 0 means it will wait for any key, defaults to 1
         :type wait_time: int, optional
         """
-        if (output != {}):
+        images = self.render_all(output)
+        if images and self.config['save_images']:
+            os.makedirs(os.path.join(self.output_folder,
+                                     str(self.current_time)), exist_ok=True)
+        for name, image in images.items():
+            cv2.imshow(self.windows[name], image)
             if self.config['save_images']:
-                os.makedirs(os.path.join(self.output_folder,
-                                         str(self.current_time)), exist_ok=True)
-            if self.config['use_camera_left_raw']:
-                cv2.imshow('camera left raw',
-                           output['sensors']['camera_left_raw'])
-                if self.config['save_images']:
-                    cv2.imwrite(os.path.join(self.output_folder,  str(
-                        self.current_time), 'camera_left_raw.png'), output['sensors']['camera_left_raw'])
-
-            if self.config['use_camera_right_raw']:
-                cv2.imshow('camera right raw',
-                           output['sensors']['camera_right_raw'])
-                if self.config['save_images']:
-                    cv2.imwrite(os.path.join(self.output_folder,  str(
-                        self.current_time), 'camera_right_raw.png'), output['sensors']['camera_right_raw'])
-
-            if self.config['use_camera_left_rect']:
-                left_bb = self.vis_3d_bbox_cam(
-                    output['sensors']['camera_left_rect'], output['annotations']['camera_left_rect'])
-                cv2.imshow('camera left', left_bb)
-                if self.config['save_images']:
-                    cv2.imwrite(os.path.join(self.output_folder,  str(
-                        self.current_time), 'left_bb.png'), left_bb)
-
-            if self.config['use_camera_right_rect']:
-                right_bb = self.vis_3d_bbox_cam(
-                    output['sensors']['camera_right_rect'], output['annotations']['camera_right_rect'])
-                cv2.imshow('camera right', right_bb)
-                if self.config['save_images']:
-                    cv2.imwrite(os.path.join(self.output_folder,  str(
-                        self.current_time), 'right_bb.png'), right_bb.astype(np.uint8))
-
-            if self.config['use_radar_cartesian']:
-                radar_cart_vis = self.vis(
-                    output['sensors']['radar_cartesian'], output['annotations']['radar_cartesian'])
-                cv2.imshow('radar', radar_cart_vis)
-                if self.config['save_images']:
-                    cv2.imwrite(os.path.join(self.output_folder,  str(
-                        self.current_time), 'radar_cart_vis.png'), radar_cart_vis)
-
-            if self.config['use_radar_polar']:
-                cv2.imshow('radar', output['sensors']['radar_polar'])
-                if self.config['save_images']:
-                    cv2.imwrite(os.path.join(self.output_folder,  str(
-                        self.current_time), 'radar_polar.png'), output['sensors']['radar_polar'])
-
-            if (self.config['use_lidar_bev_image']):
-                lidar_vis = self.vis(
-                    output['sensors']['lidar_bev_image'], output['annotations']['lidar_bev_image'])
-                cv2.imshow('lidar image', lidar_vis)
-                if self.config['save_images']:
-                    cv2.imwrite(os.path.join(self.output_folder,  str(
-                        self.current_time), 'lidar_vis.png'), lidar_vis)
-
-            if self.config['use_proj_lidar_left']:
-                overlay_left = self.overlay_camera_lidar(output['sensors']['camera_left_rect'],
-                                                         output['sensors']['proj_lidar_left'])
-                overlay_left_bb = self.vis_3d_bbox_cam(
-                    overlay_left, output['annotations']['camera_left_rect'])
-                cv2.imshow('projected lidar to left camera', overlay_left_bb)
-                if self.config['save_images']:
-                    cv2.imwrite(os.path.join(self.output_folder,  str(
-                        self.current_time), 'overlay_left_bb.png'), overlay_left_bb)
-            if self.config['use_proj_lidar_right']:
-                overlay_right = self.overlay_camera_lidar(output['sensors']['camera_right_rect'],
-                                                          output['sensors']['proj_lidar_right'])
-                overlay_right_bb = self.vis_3d_bbox_cam(
-                    overlay_right, output['annotations']['camera_right_rect'])
-                cv2.imshow('projected lidar to right camera', overlay_right_bb)
-                if self.config['save_images']:
-                    cv2.imwrite(os.path.join(self.output_folder, str(
-                        self.current_time), 'overlay_right_bb.png'), overlay_right_bb)
+                cv2.imwrite(os.path.join(self.output_folder, str(
+                    self.current_time), name + '.png'), to_uint8(image))
 
         cv2.waitKey(wait_time)
 
+    def export_all(self, dt, output_folder=None, start=None, end=None):
+        """render all the sensors/annotations every dt seconds and write them without a display,
+        using the 'export' options of the config. Frames are loaded, encoded and written in
+        background threads
+
+        :param dt: time step in seconds
+        :type dt: float
+        :param output_folder: output folder, defaults to the sequence folder inside
+            config['output_folder']
+        :type output_folder: string
+        :param start: first timestamp, defaults to the first timestamp of the sequence
+        :type start: float
+        :param end: last timestamp, defaults to the last timestamp of the sequence
+        :type end: float
+        :return: throughput statistics, see utils.export.FrameExporter.stats
+        :rtype: dict
+        """
+        export_cfg = self.config.get('export', {})
+        if output_folder is None:
+            output_folder = self.output_folder
+        exporter = FrameExporter(output_folder,
+                                 format=export_cfg.get('format', 'png'),
+                                 archive=export_cfg.get('archive', False),
+                                 workers=export_cfg.get('workers', 2),
+                                 max_pending=export_cfg.get('max_pending', 16),
+                                 png_compression=export_cfg.get('png_compression', 3),
+                                 jpeg_quality=export_cfg.get('jpeg_quality', 95),
+                                 fps=export_cfg.get('fps', 1.0 / dt))
+        with exporter:
+            for t, output in self.iter_frames(dt, start, end,
+                                              workers=export_cfg.get('load_workers', 4)):
+                images = self.render_all(output)
+                if images:
+                    exporter.write(t, images)
+        return exporter.stats()
+
     def project_bboxes_to_camera(self, annotations, intrinsict, extrinsic):
         """method to project the bounding boxes to the camera
 
@@ -405,23 +633,27 @@ class Sequence:
         :return: dictionary with the list of bbounding boxes with camera coordinate frames
         :rtype: dict
         """
+        if len(annotations) == 0:
+            return []
+        heights = np.array([self.heights[obj['class_name']] for obj in annotations])
+        vertices = pseudo_box_vertices(boxes_from_annotations(annotations), heights,
+                                       self.config['radar_calib']['range_res'],
+                                       self.config['radar_calib']['range_cells'])
+        uv, _, mask = project_points(vertices[:, BOX_3D_PATH], intrinsict, extrinsic,
+                                     self.config['max_range_bbox_camera'])
+
         bboxes_3d = []
-        for object in annotations:
+        for ii, object in enumerate(annotations):
             obj = {}
-            class_name = object['class_name']
-            obj['class_name'] = class_name
+            obj['class_name'] = object['class_name']
             obj['id'] = (object['id'] if 'id' in object.keys() else 0)
-            height = self.heights[class_name]
-            bb = object['bbox']['position']
-            rotation = object['bbox']['rotation']
-            bbox_3d = self.__get_projected_bbox(
-                bb, rotation, intrinsict, extrinsic, height)
-            obj['bbox_3d'] = bbox_3d
+            # the path is closed, so its first visible point is skipped
+            obj['bbox_3d'] = uv[ii][mask[ii]][1:]
             bboxes_3d.append(obj)
 
         return bboxes_3d
 
-    def vis_3d_bbox_cam(self, image, bboxes_3d, pc_size=0.7):
+    def vis_3d_bbox_cam(self, image, bboxes_3d, pc_size=0.7, thickness=1, inplace=False):
         """diplay pseudo 3d bounding box from camera
 
         :param image: camera which the bounding box is going to be projected
@@ -430,20 +662,19 @@ class Sequence:
         :type bboxes_3d: dict
         :param pc_size: percentage of the size of the bounding box [0.0 1.0]
         :type pc_size: float
+        :param thickness: line thickness in pixels
+        :type thickness: int
+        :param inplace: whether to draw into image instead of a copy
+        :type inplace: bool
         :return: camera image with the correspondent bounding boxes
         :rtype: np.array
         """
-        vis_im = np.copy(image)
-        for obj in bboxes_3d:
-            bbox_3d = obj['bbox_3d']
-            for ii in range(len(bbox_3d)):
-                color = self.colors[obj['class_name']]
-                vis_im = cv2.line(vis_im, (bbox_3d[ii - 1][0], bbox_3d[ii - 1][1]),
-                                  (bbox_3d[ii][0], bbox_3d[ii][1]), (np.array(color) * 255).astype(np.int).tolist(), 1)
+        vis_im = image if inplace else np.copy(image)
+        return draw_polylines(vis_im, [obj['bbox_3d'] for obj in bboxes_3d],
+                              [obj['class_name'] for obj in bboxes_3d],
+                              self.colors_bgr, closed=True, thickness=thickness)
 
-        return vis_im
-
-    def vis_bbox_cam(self, image, bboxes_3d, pc_size=0.7):
+    def vis_bbox_cam(self, image, bboxes_3d, pc_size=0.7, inplace=False):
         """diplay pseudo 2d bounding box from camera
 
         :param image: camera which the bounding box is going to be projected
@@ -452,12 +683,14 @@ class Sequence:
         :type bboxes_3d: dict
         :param pc_size: percentage of the size of the bounding box [0.0 1.0]
         :type pc_size: float
+        :param inplace: whether to draw into image instead of a copy
+        :type inplace: bool
         :return: camera image with the correspondent bounding boxes
         :rtype: np.array
         """
-        vis_im = np.copy(image)
+        vis_im = image if inplace else np.copy(image)
         for obj in bboxes_3d:
-            color = self.colors[obj['class_name']]
+            color = self.colors_bgr[obj['class_name']]
             bb = np.zeros((4))
             if obj['bbox_3d'].shape[0] > 0:
                 bb[0] = np.min(obj['bbox_3d'][:, 0])
@@ -468,9 +701,9 @@ class Sequence:
                 # hei = bb[3] - bb[1]
                 bb[0] += wid*(1.0 - pc_size)
                 bb[2] -= wid*(1.0 - pc_size)
-                bb = bb.astype(np.int)
+                bb = bb.astype(int).tolist()
                 vis_im = cv2.rectangle(
-                    vis_im, (bb[0], bb[1]), (bb[2], bb[3]), (np.array(color) * 255))
+                    vis_im, (bb[0], bb[1]), (bb[2], bb[3]), color)
 
         return vis_im
 
@@ -506,111 +739,254 @@ class Sequence:
                     # __linear_interpolation(self, p1, t_c, t_r1, t_r2, p2)
                 except:
                     pass
-        M = self.calib.RadarToLidar
-
-        h_width = self.config['lidar_bev_image']['res'][0]/2.0
-        h_height = self.config['lidar_bev_image']['res'][1]/2.0
-        cell_res_x = 100.0/h_width
-        cell_res_y = 100.0/h_height
-
-        # convert meters to pixel
-        M[3, 0] = M[3, 0] / cell_res_x
-        M[3, 1] = M[3, 1] / cell_res_y
-        lidar_annotations = self.transform_annotations(lidar_annotations, M)
+        # the lidar bird's eye view image uses the pixel grid of the radar image,
+        # so the positions are kept as they are
         return lidar_annotations
 
     def get_rectfied(self, left_im, right_im):
-        """get the left and right image rectfied
+        """get the left and right image rectfied. The rectification maps are computed once
+        per sequence (or loaded from the on-disk cache set in the config)
 
-        :param left_im: raw left image
+        :param left_im: raw left image, None to skip the left camera
         :type left_im: np.array
-        :param right_im: raw right image
+        :param right_im: raw right image, None to skip the right camera
         :type right_im: np.array
         :return: tuple (left_rect, right_rect, disp_to_depth)
             WHERE
-            np.array left_rect is the rectfied left image
-            np.array right_rect is the rectfied right image
+            np.array left_rect is the rectfied left image (None if left_im is None)
+            np.array right_rect is the rectfied right image (None if right_im is None)
             np.array disp_to_depth is a matrix that converts the disparity values to distance in meters
         :rtype: tuple
         """
-        (leftRectification, rightRectification, leftProjection,
-         rightProjection, dispartityToDepthMap, leftROI, rightROI) = cv2.stereoRectify(
-            cameraMatrix1=self.calib.left_cam_mat,
-            distCoeffs1=self.calib.left_cam_dist,
-            cameraMatrix2=self.calib.right_cam_mat,
-            distCoeffs2=self.calib.right_cam_dist,
-            imageSize=tuple(self.calib.left_cam_res),
-            R=self.calib.stereoR,
-            T=self.calib.stereoT,
-            flags=cv2.CALIB_ZERO_DISPARITY,
-            alpha=0
-        )
-
-        leftMapX, leftMapY = cv2.initUndistortRectifyMap(
-            self.calib.left_cam_mat,
-            self.calib.left_cam_dist,
-            leftRectification,
-            leftProjection, tuple(self.calib.left_cam_res), cv2.CV_32FC1)
-
-        rightMapX, rightMapY = cv2.initUndistortRectifyMap(
-            self.calib.right_cam_mat,
-            self.calib.left_cam_dist,
-            rightRectification,
-            rightProjection, tuple(self.calib.left_cam_res), cv2.CV_32FC1)
-
-        fixedLeft = cv2.remap(left_im, leftMapX,
-                              leftMapY, cv2.INTER_LINEAR)
-        fixedRight = cv2.remap(right_im, rightMapX,
-                               rightMapY, cv2.INTER_LINEAR)
-
-        return fixedLeft, fixedRight, dispartityToDepthMap
-
-    def transform_annotations(self, annotations, M):
-        """method to transform the annotations to annother coordinate
+        maps = self.get_rectification_maps()
+        fixedLeft = None
+        fixedRight = None
+        if left_im is not None:
+            fixedLeft = cv2.remap(left_im, maps['left_map1'],
+                                  maps['left_map2'], cv2.INTER_LINEAR)
+        if right_im is not None:
+            fixedRight = cv2.remap(right_im, maps['right_map1'],
+                                   maps['right_map2'], cv2.INTER_LINEAR)
+
+        return fixedLeft, fixedRight, maps['disp_to_depth']
+
+    def get_rectification_maps(self):
+        """get the stereo rectification maps, computed on the first call
+
+        :return: dictionary with 'left_map1', 'left_map2', 'right_map1', 'right_map2'
+            and 'disp_to_depth'
+        :rtype: dict
+        """
+        if self.__rect_maps is None:
+            rect_cfg = self.config.get('rectification', {})
+            self.__rect_maps = load_rectification_maps(
+                self.calib,
+                fixed_point=rect_cfg.get('fixed_point', True),
+                cache_folder=rect_cfg.get('cache_folder'))
+        return self.__rect_maps
+
+    def get_odometry(self):
+        """get the GPS/IMU odometry of the sequence, parsed on the first call (and cached
+        in binary form inside the sequence folder)
+
+        :return: the odometry, or None if the sequence has no GPS/IMU data
+        :rtype: utils.odometry.Odometry
+        """
+        with self.__odometry_lock:
+            if self.__odometry is None:
+                odometry = Odometry.open(self.sequence_path, self.shard)
+                # False marks a sequence without GPS/IMU data (an Odometry may be empty)
+                self.__odometry = False if odometry is None else odometry
+        return None if self.__odometry is False else self.__odometry
+
+    def pose_at(self, ts):
+        """interpolate the ego pose at a batch of timestamps
+
+        :param ts: timestamps
+        :type ts: np.array
+        :return: dictionary with 't', 'position' (Nx3 east, north, up in meters from the
+            first GPS record), 'lla', 'orientation' (Nx4 quaternions x, y, z, w),
+            'linear_velocity', 'angular_velocity' and 'valid', see utils.odometry.Odometry.pose_at
+        :rtype: dict
+        """
+        odometry = self.get_odometry()
+        if odometry is None:
+            raise ValueError('the sequence has no GPS/IMU data')
+        return odometry.pose_at(ts)
+
+    def get_lidar_accumulated(self, t, n_sweeps=None, frame=None, ego_motion=None):
+        """merge the lidar sweep closest to t with the n_sweeps - 1 previous ones, moved into
+        the frame of the current sweep with the GPS/IMU poses when ego_motion is set (config
+        lidar_accumulation). The sweeps are stacked without moving them, with a warning, when
+        the GPS/IMU records do not cover them. The transformed sweeps are kept in a ring
+        buffer, so consecutive frames only read and transform their newest sweep
+
+        :param t: timestamp in seconds
+        :type t: float
+        :param n_sweeps: number of sweeps, defaults to config lidar_accumulation n_sweeps
+        :type n_sweeps: int
+        :param frame: lidar frame of the current sweep, defaults to the closest one to t
+            (using the lidar sync offset)
+        :type frame: int
+        :param ego_motion: whether to move the previous sweeps with the GPS/IMU poses (needs
+            config lidar_accumulation lidar_to_imu), defaults to config lidar_accumulation
+            ego_motion
+        :type ego_motion: bool
+        :return: point cloud Nx6 (x,y,z,intensity,ring,dt) where dt is the time of the sweep of
+            each point minus the time of the current sweep (0 for the current sweep, < 0 for
+            the previous ones)
+        :rtype: np.array
+        """
+        acc_cfg = self.config.get('lidar_accumulation') or {}
+        if n_sweeps is None:
+            n_sweeps = acc_cfg.get('n_sweeps', 1)
+        if frame is None:
+            frame, _ = self.get_id(t, self.timestamp_lidar, self.config['sync']['lidar'])
+        frames = self.timestamp_lidar['frame']
+        times = self.timestamp_lidar['time']
+        ind = int(np.flatnonzero(frames == frame)[0])
+        first = max(0, ind - max(1, n_sweeps) + 1)
+        accumulator = self.get_sweep_accumulator(ego_motion)
+        return accumulator.accumulate(frames[first:ind + 1].tolist(),
+                                      times[first:ind + 1].tolist())
+
+    def get_sweep_accumulator(self, ego_motion=None):
+        """get the ring buffer of lidar sweeps used by self.get_lidar_accumulated for the
+        current config lidar_accumulation, created on the first call with each setting
+
+        :param ego_motion: whether the sweeps are moved with the GPS/IMU poses, defaults to
+            config lidar_accumulation ego_motion. Without GPS/IMU data the sweeps are stacked
+            without moving them, with a warning
+        :type ego_motion: bool
+        :return: the accumulator
+        :rtype: utils.sweeps.SweepAccumulator
+        """
+        acc_cfg = self.config.get('lidar_accumulation') or {}
+        if ego_motion is None:
+            ego_motion = acc_cfg.get('ego_motion', False)
+        lidar_to_imu = acc_cfg.get('lidar_to_imu')
+        if ego_motion and not lidar_to_imu:
+            raise ValueError('ego-motion compensation needs the lidar to IMU transform, '
+                             'set lidar_accumulation lidar_to_imu (T, R) in the config')
+        buffer_size = max(acc_cfg.get('buffer_size', 10), acc_cfg.get('n_sweeps', 1))
+        key = (bool(ego_motion), freeze(lidar_to_imu) if ego_motion else None, buffer_size)
+        accumulator = self.__sweeps.get(key)
+        if accumulator is not None:
+            return accumulator
+
+        odometry = None
+        if ego_motion:
+            odometry = self.get_odometry()
+            if odometry is None:
+                warnings.warn('{} has no GPS/IMU data, the lidar sweeps are stacked without '
+                              'ego-motion compensation'.format(self.sequence_path))
+        lidar_to_imu_matrix = None
+        if odometry is not None:
+            lidar_to_imu_matrix = euler_transform(lidar_to_imu['R'], lidar_to_imu['T'])
+        str_format = '{:06d}.csv'
+        accumulator = SweepAccumulator(
+            lambda frame: self.read_lidar(os.path.join(
+                self.sequence_path, 'velo_lidar', str_format.format(frame))),
+            odometry, lidar_to_imu_matrix, buffer_size)
+        with self.__odometry_lock:
+            return self.__sweeps.setdefault(key, accumulator)
+
+    def get_polar_converter(self, res=None, max_range=None, interpolation=None):
+        """get the polar to cartesian converter of an output grid. The remap tables of each
+        grid are computed once per sequence
+
+        :param res: meters per cartesian pixel, defaults to config radar_polar_to_cartesian
+            (or the radar range resolution, as the Navtech_Cartesian images)
+        :type res: float
+        :param max_range: half the side of the cartesian image in meters, defaults to
+            config radar_polar_to_cartesian (or the radar range)
+        :type max_range: float
+        :param interpolation: 'nearest', 'linear' or 'cubic', defaults to the config
+        :type interpolation: string
+        :return: the converter
+        :rtype: utils.polar.PolarToCartesian
+        """
+        polar_cfg = self.config.get('radar_polar_to_cartesian') or {}
+        radar_cfg = self.config['radar_calib']
+        if res is None:
+            res = polar_cfg.get('res') or radar_cfg['range_res']
+        if max_range is None:
+            max_range = polar_cfg.get('max_range') or radar_cfg['range_res'] * radar_cfg['range_cells']
+        if interpolation is None:
+            interpolation = polar_cfg.get('interpolation', 'linear')
+        key = (res, max_range, interpolation)
+        with self.__polar_lock:
+            converter = self.__polar_converters.get(key)
+            if converter is None:
+                converter = PolarToCartesian(radar_cfg['range_res'], radar_cfg['range_cells'],
+                                             radar_cfg['azimuth_cells'], res, max_range,
+                                             interpolation, polar_cfg.get('fixed_point', True))
+                self.__polar_converters[key] = converter
+        return converter
+
+    def polar_to_cartesian(self, polar, res=None, max_range=None, interpolation=None):
+        """convert a polar radar image to a cartesian image centred on the radar
+
+        :param polar: polar radar image (range x azimuth), e.g. sensors['radar_polar']
+        :type polar: np.array
+        :param res: meters per cartesian pixel, see self.get_polar_converter
+        :type res: float
+        :param max_range: half the side of the cartesian image in meters
+        :type max_range: float
+        :param interpolation: 'nearest', 'linear' or 'cubic'
+        :type interpolation: string
+        :return: cartesian radar image, with the same channels as the polar image
+        :rtype: np.array
+        """
+        converter = self.get_polar_converter(res, max_range, interpolation)
+        if polar.ndim == 3 and polar.shape[2] == 3:
+            # the channels of the radar images are equal, so only one is remapped
+            return cv2.cvtColor(converter(polar[:, :, 0]), cv2.COLOR_GRAY2BGR)
+        return converter(polar)
+
+    def polar_to_cartesian_annotations(self, annotations, res=None, max_range=None):
+        """move radar annotations to the grid of self.polar_to_cartesian
+
+        :param annotations: annotations of the Navtech_Cartesian images
+        :type annotations: list
+        :param res: meters per cartesian pixel, see self.get_polar_converter
+        :type res: float
+        :param max_range: half the side of the cartesian image in meters
+        :type max_range: float
+        :return: annotations of the cartesian images computed from the polar ones
+        :rtype: list
+        """
+        radar_cfg = self.config['radar_calib']
+        converter = self.get_polar_converter(res, max_range)
+        return converter.transform_annotations(annotations, radar_cfg['range_res'],
+                                               2 * radar_cfg['range_cells'])
+
+    def transform_annotations(self, annotations):
+        """method to transform the annotations from the radar to the lidar bird's eye view image.
+        Both images share the same pixel grid, so the positions are kept as they are
 
         :param annotations: the list of annotations
         :type annotations: list
-        :param M: transformation matrix
-        :type M: np.array
-        :return: the list of annotations in another coodinate frame
+        :return: the list of annotations in the lidar bird's eye view image
         :rtype: list
         """
-        new_annotations = []
-        for object in annotations:
-            new_object = object
-            xx = object['bbox']['position'][0]
-            yy = object['bbox']['position'][1]
-            zz = self.config['sensors_height']
-            pos = np.array([xx, yy, zz, 1])
-            new_pos = np.matmul(M, pos)
-            new_pos = new_pos/new_pos[3]
-            new_object['bbox']['position'][0] = pos[0]
-            new_object['bbox']['position'][1] = pos[1]
-            new_annotations.append(new_object)
-        return new_annotations
-
-    def transform_point_cloud(self, pc, M):
+        return list(annotations)
+
+    def transform_point_cloud(self, pc, M, dtype=None, inplace=False):
         """transform a 3d point cloud to another coordinate frame
 
-        :param pc: point cloud in the form Nx% (x,y,z,intensity, ring)
+        :param pc: point cloud in the form Nx5 (x,y,z,intensity, ring)
         :type pc: np.array
         :param M: transformation matrix
         :type M: np.array
+        :param dtype: dtype of the output (e.g. np.float32), None keeps the dtype of pc
+        :type dtype: np.dtype
+        :param inplace: whether to overwrite the x,y,z columns of pc instead of copying it
+        :type inplace: bool
         :return: transformed point cloud
         :rtype: np.array
         """
-        new_pc = []
-        for point in pc:
-            # new_object = object
-            xx = point[0]
-            yy = point[1]
-            zz = point[2]
-            pos = np.array([xx, yy, zz, 1])
-            new_pos = np.matmul(M, pos)
-            new_pos = new_pos/new_pos[3]
-            new_pc.append([pos[0], pos[1], pos[2], point[3], point[4]])
-        new_pc = np.array(new_pc)
-        return new_pc
+        return transform_point_cloud(pc, M, dtype=dtype, inplace=inplace)
 
     def get_annotation_from_id(self, annotation_id):
         """ get the annotation from an id
@@ -620,56 +996,40 @@ class Sequence:
         :return: list of annotations for the id given as parameter
         :rtype: list
         """
-        raw_annotations = []
-        for object in self.annotations:
-            if (object['bboxes'][annotation_id]):
-                obj = {}
-                obj['id'] = object['id']
-                obj['class_name'] = object['class_name']
-                obj['bbox'] = object['bboxes'][annotation_id]
-                raw_annotations.append(obj)
-        return raw_annotations
-
-    def __inner_lidar_bev_image(self, lidar,
-                                image,
-                                i,
-                                cell_res_x,
-                                cell_res_y,
-                                h_width,
-                                h_height):
-        xyzi = lidar[i]
-        x = xyzi[0]/cell_res_x + h_width
-        y = h_height - xyzi[1]/cell_res_y
-        if self.config['lidar_bev_image']['use_ring']:
-            c = int(xyzi[4]) * 8
-        else:
-            c = int(xyzi[3])
-        image = cv2.circle(image, (int(x), int(y)), 1, (c, c, c))
-        return image
+        return self.annotation_index.get_dicts(annotation_id)
+
+    def get_annotation_array_from_id(self, annotation_id):
+        """ get the annotation from an id as a structured array
+
+        :param annotation_id: frame id
+        :type annotation_id: int
+        :return: structured array with the fields id, class_id, x, y, w, h, rotation. The class
+            name of each object is self.annotation_index.class_names[class_id]
+        :rtype: np.array
+        """
+        return self.annotation_index.get(annotation_id)
 
-    def lidar_to_image(self, lidar):
+    def lidar_to_image(self, lidar, channels=None):
         """Convert an lidar point cloud to an 2d bird's eye view image
 
         :param lidar: lidar point cloud Nx5 (x,y,z, intensity, ring)
         :type lidar: np.array
-        :return: 2d bird's eye image with the lidar information
+        :param channels: extra channels computed in the same pass ('max_height', 'density',
+            'max_intensity'), defaults to None
+        :type channels: list, optional
+        :return: 2d bird's eye image with the lidar information. If channels is given,
+            returns a tuple (image, dict) where the dict maps each channel to its image
         :rtype: np.array
         """
-        image = np.zeros((self.config['lidar_bev_image']['res']
-                          [0], self.config['lidar_bev_image']['res'][1], 3))
-        h_width = self.config['lidar_bev_image']['res'][0]/2.0
-        h_height = self.config['lidar_bev_image']['res'][1]/2.0
-        cell_res_x = 100.0/h_width
-        cell_res_y = 100.0/h_height
-        for i in range(lidar.shape[0]):
-            if self.config['lidar_bev_image']['remove_ground']:
-                if lidar[i, 2] > -self.config['lidar_bev_image']['ground_thresh']:
-                    image = self.__inner_lidar_bev_image(
-                        lidar, image, i, cell_res_x, cell_res_y, h_width, h_height)
-            else:
-                image = self.__inner_lidar_bev_image(
-                    lidar, image, i, cell_res_x, cell_res_y, h_width, h_height)
-        return image.astype(np.uint8)
+        cfg = self.config['lidar_bev_image']
+        image, extra = bev_image(lidar, cfg['res'],
+                                 remove_ground=cfg['remove_ground'],
+                                 ground_thresh=cfg['ground_thresh'],
+                                 use_ring=cfg['use_ring'],
+                                 channels=channels or ())
+        if channels is None:
+            return image
+        return image, extra
 
     def __get_correct_radar_id_from_raw_ind(self, id):
         return id-1
@@ -677,38 +1037,63 @@ class Sequence:
     def __get_correct_lidar_id_from_raw_ind(self, id):
         return id-1
 
-    def vis(self, sensor, objects, color=None, mode='rot'):
+    def vis(self, sensor, objects, color=None, mode='rot', thickness=3, inplace=False):
         """ visualise the sensor and its annotation
 
         :param sensor: 
         :type sensor: the given sensor
         :param objects: np.array
         :type objects: list of objects
+        :param thickness: line thickness in pixels
+        :type thickness: int
+        :param inplace: whether to draw into sensor instead of a copy
+        :type inplace: bool
         :return: image with the objects overlayed
         :rtype: np.array
         """
-        sensor_vis = np.copy(sensor)
-        for object in objects:
-            bbox = object['bbox']['position']
-            angle = object['bbox']['rotation']
-
-            class_name = object['class_name']
-            color = self.colors[class_name]
-            if mode == 'rot':
-                sensor_vis = self.draw_boundingbox_rot(
-                    sensor_vis, bbox, angle, color)
+        sensor_vis = sensor if inplace else np.copy(sensor)
+        if mode == 'rot' and len(objects) > 0:
+            corners = rotated_box_corners(
+                boxes_from_annotations(objects)).astype(int)
+            draw_polylines(sensor_vis, corners, [obj['class_name'] for obj in objects],
+                           self.colors_bgr, closed=True, thickness=thickness)
 
         return sensor_vis
 
     def read_lidar(self, lidar_path):
-        """given a lidar raw path returns it lidar point cloud
+        """given a lidar raw path returns it lidar point cloud. If the sequence was converted with
+        utils.lidar_cache or packed with utils.shard, the point cloud is a read-only view of the
+        memory-mapped file, with the dtype (float64) and values of the csv file and without any
+        copy. Otherwise the csv file is parsed
 
         :param lidar_path: path to lidar raw point
         :type lidar_path: string
         :return: lidar point cloud Nx5 (x,y,z,intensity,ring)
         :rtype: np.array
         """
-        return pd.read_csv(lidar_path, delimiter=',').values
+        if ((self.shard is not None or self.lidar_cache is not None) and
+                os.path.dirname(os.path.abspath(lidar_path)) == self.lidar_folder):
+            frame = int(os.path.splitext(os.path.basename(lidar_path))[0])
+            if self.shard is not None and ('velo_lidar', frame) in self.shard:
+                return self.shard.read_lidar(frame)
+            if self.lidar_cache is not None and frame in self.lidar_cache:
+                return self.lidar_cache.read(frame)
+        return read_csv(lidar_path)
+
+    def read_image(self, sensor, frame):
+        """read one image of a sensor, from the packed shard if there is one
+
+        :param sensor: sensor folder name ('zed_left', 'zed_right', 'Navtech_Cartesian'
+            or 'Navtech_Polar')
+        :type sensor: string
+        :param frame: frame number
+        :type frame: int
+        :return: image as read by cv2.imread (None if it does not exist)
+        :rtype: np.array
+        """
+        if self.shard is not None and (sensor, frame) in self.shard:
+            return self.shard.read_image(sensor, frame)
+        return cv2.imread(os.path.join(self.sequence_path, sensor, '{:06d}.png'.format(frame)))
 
     def get_id(self, t, all_timestamps, time_offset=0.0):
         """get the closest id given the timestamp
@@ -722,103 +1107,95 @@ class Sequence:
         :return: the closest id
         :rtype: int
         """
-        ind = np.argmin(np.abs(all_timestamps['time'] - t + time_offset))
-        return all_timestamps['frame'][ind], all_timestamps['time'][ind]
+        times = all_timestamps['time']
+        ind = int(np.searchsorted(times, t - time_offset))
+        if ind == times.shape[0] or (ind > 0 and
+                                     abs(times[ind - 1] - t + time_offset) <= abs(times[ind] - t + time_offset)):
+            ind -= 1
+        # first of repeated timestamps, as np.argmin would return
+        ind = int(np.searchsorted(times, times[ind]))
+        return all_timestamps['frame'][ind], times[ind]
+
+    def get_ids(self, ts, all_timestamps, time_offset=0.0):
+        """get the closest ids of many timestamps at once with a binary search
+
+        :param ts: timestamps in seconds
+        :type ts: np.array
+        :param all_timestamps: sorted timestamps from self.load_timestamp
+        :type all_timestamps: dict
+        :param time_offset: offset in case there is some unsynchronoised sensor, defaults to 0.0
+        :type time_offset: float, optional
+        :return: tuple (frames, times) with the closest frame ids and their timestamps
+        :rtype: tuple
+        """
+        times = all_timestamps['time']
+        right = np.clip(np.searchsorted(times, ts - time_offset),
+                        1, times.shape[0] - 1)
+        left = right - 1
+        d_left = np.abs(times[left] - ts + time_offset)
+        d_right = np.abs(times[right] - ts + time_offset)
+        ind = np.where(d_right < d_left, right, left)
+        # first of repeated timestamps, as np.argmin would return
+        ind = np.searchsorted(times, times[ind])
+        return all_timestamps['frame'][ind], times[ind]
+
+    def sync_table(self, dt, start=None, end=None):
+        """precompute the camera, lidar and radar frames for every timestamp from start to end
+        with step dt. A row can be given to self.get_from_timestamp to skip the search
+
+        :param dt: time step in seconds
+        :type dt: float
+        :param start: first timestamp, defaults to self.init_timestamp
+        :type start: float, optional
+        :param end: end timestamp (not included), defaults to self.end_timestamp
+        :type end: float, optional
+        :return: structured array with the fields 't', 'camera_frame', 'camera_time',
+            'lidar_frame', 'lidar_time', 'radar_frame' and 'radar_time'
+        :rtype: np.array
+        """
+        if start is None:
+            start = self.init_timestamp
+        if end is None:
+            end = self.end_timestamp
+        ts = np.arange(start, end, dt)
+        table = np.zeros(ts.shape[0], dtype=[('t', np.float64),
+                                             ('camera_frame', np.int64),
+                                             ('camera_time', np.float64),
+                                             ('lidar_frame', np.int64),
+                                             ('lidar_time', np.float64),
+                                             ('radar_frame', np.int64),
+                                             ('radar_time', np.float64)])
+        table['t'] = ts
+        for sensor, timestamps in [('camera', self.timestamp_camera),
+                                   ('lidar', self.timestamp_lidar),
+                                   ('radar', self.timestamp_radar)]:
+            table[sensor + '_frame'], table[sensor + '_time'] = self.get_ids(
+                ts, timestamps, self.config['sync'][sensor])
+        return table
 
     def load_timestamp(self, timestamp_path):
         """load all timestamps from a sensor
 
         :param timestamp_path: path to text file with all timestamps
         :type timestamp_path: string
-        :return: list of all timestamps
+        :return: sorted arrays with all frames ('frame') and timestamps ('time')
         :rtype: dict
         """
-        genfromtxt = np.genfromtxt(
-            timestamp_path, dtype=(str, int, str, float))
-        timestamps = {'frame': [], 'time': []}
-        for line in genfromtxt:
-            timestamps['frame'].append(line[1])
-            timestamps['time'].append(line[3])
+        name = os.path.basename(timestamp_path)
+        if (self.shard is not None and name in self.shard.tables and
+                os.path.dirname(os.path.abspath(timestamp_path)) == os.path.abspath(self.sequence_path)):
+            values = self.shard.timestamps(name)
+        else:
+            values = np.loadtxt(timestamp_path, usecols=(1, 3), ndmin=2)
+        order = np.argsort(values[:, 1], kind='stable')
+        timestamps = {'frame': values[order, 0].astype(np.int64),
+                      'time': values[order, 1]}
         return timestamps
 
-    def __get_projected_bbox(self, bb, rotation, cameraMatrix, extrinsic, obj_height=2):
-        """get the projected boundinb box to some camera sensor
-        """
-        rotation = np.deg2rad(-rotation)
-        res = self.config['radar_calib']['range_res']
-        cx = bb[0] + bb[2] / 2
-        cy = bb[1] + bb[3] / 2
-        T = np.array([[cx], [cy]])
-        pc = 0.2
-        bb = [bb[0]+bb[2]*pc, bb[1]+bb[3]*pc, bb[2]-bb[2]*pc, bb[3]-bb[3]*pc]
-
-        R = np.array([[np.cos(rotation), -np.sin(rotation)],
-                      [np.sin(rotation), np.cos(rotation)]])
-
-        points = np.array([[bb[0], bb[1]],
-                           [bb[0] + bb[2], bb[1]],
-                           [bb[0] + bb[2], bb[1] + bb[3]],
-                           [bb[0], bb[1] + bb[3]],
-                           [bb[0], bb[1]],
-                           [bb[0] + bb[2], bb[1] + bb[3]]]).T
-
-        points = points - T
-        points = np.matmul(R, points) + T
-        points = points.T
-
-        points[:, 0] = points[:, 0] - self.config['radar_calib']['range_cells']
-        points[:, 1] = self.config['radar_calib']['range_cells'] - points[:, 1]
-        points = points * res
-
-        points = np.append(points, np.ones(
-            (points.shape[0], 1)) * -1.7, axis=1)
-        p1 = points[0, :]
-        p2 = points[1, :]
-        p3 = points[2, :]
-        p4 = points[3, :]
-
-        p5 = np.array([p1[0], p1[1], p1[2] + obj_height])
-        p6 = np.array([p2[0], p2[1], p2[2] + obj_height])
-        p7 = np.array([p3[0], p3[1], p3[2] + obj_height])
-        p8 = np.array([p4[0], p4[1], p4[2] + obj_height])
-        points = np.array([p1, p2, p3, p4, p1, p5, p6, p2, p6,
-                           p7, p3, p7, p8, p4, p8, p5, p4, p3, p2, p6, p3, p1])
-
-        points = np.matmul(np.append(points, np.ones(
-            (points.shape[0], 1)), axis=1), extrinsic.T)
-
-        points = (points / points[:, 3, None])[:, 0:3]
-
-        filtered_indices = []
-        for i in range(points.shape[0]):
-            if (points[i, 2] > 0 and points[i, 2] < self.config['max_range_bbox_camera']):
-                filtered_indices.append(i)
-
-        points = points[filtered_indices]
-
-        fx = cameraMatrix[0, 0]
-        fy = cameraMatrix[1, 1]
-        cx = cameraMatrix[0, 2]
-        cy = cameraMatrix[1, 2]
-
-        xIm = np.round((fx * points[:, 0] / points[:, 2]) + cx).astype(np.int)
-        yIm = np.round((fy * points[:, 1] / points[:, 2]) + cy).astype(np.int)
-
-        proj_bbox_3d = []
-        for ii in range(1, xIm.shape[0]):
-            proj_bbox_3d.append([xIm[ii], yIm[ii]])
-        proj_bbox_3d = np.array(proj_bbox_3d)
-        return proj_bbox_3d
-
     def draw_boundingbox_rot(self, im, bbox, angle, color):
         points = self.gen_boundingbox_rot(bbox, angle)
 
-        color = (np.array(color) * 255).tolist()
-
-        cv2.line(im, tuple(points[:, 0]), tuple(points[:, 1]), color, 3)
-        cv2.line(im, tuple(points[:, 1]), tuple(points[:, 2]), color, 3)
-        cv2.line(im, tuple(points[:, 2]), tuple(points[:, 3]), color, 3)
-        cv2.line(im, tuple(points[:, 3]), tuple(points[:, 0]), color, 3)
+        cv2.polylines(im, [points.T.astype(np.int32)], True, color_to_bgr(color), 3)
 
         return im
 
@@ -829,20 +1206,193 @@ class Sequence:
         """
         generate a list of 2D points from bbox and angle 
         """
-        theta = np.deg2rad(-angle)
-        R = np.array([[np.cos(theta), -np.sin(theta)],
-                      [np.sin(theta), np.cos(theta)]])
-        points = np.array([[bbox[0], bbox[1]],
-                           [bbox[0] + bbox[2], bbox[1]],
-                           [bbox[0] + bbox[2], bbox[1] + bbox[3]],
-                           [bbox[0], bbox[1] + bbox[3]]]).T
+        return rotated_box_corners([bbox[0], bbox[1], bbox[2], bbox[3], angle])[0].T.astype(int)
 
-        cx = bbox[0] + bbox[2] / 2
-        cy = bbox[1] + bbox[3] / 2
-        T = np.array([[cx], [cy]])
 
-        points = points - T
-        points = np.matmul(R, points) + T
-        points = points.astype(int)
+class Dataset:
+    """
+    This class gives access to all the sequences of the RADIATE dataset through a
+    global index of (sequence, radar frame). The index is cached on disk, so the
+    root folder is only scanned again when sequences are added or modified
+
+    | Example:
+    | >>> import radiate
+    | >>> dataset = radiate.Dataset('path/to/radiate/', sets=['test'], weathers=['fog'])
+    | >>> sequence_name, t, output = dataset[0]
+    | >>> for sequence_name, t, output in dataset.iter_shard(rank, world_size, shuffle=True, epoch=epoch):
+    | >>>     radar = output['sensors']['radar_cartesian']
+    """
+
+    def __init__(self, root_path, sets=None, weathers=None, config_file='config/config.yaml',
+                 index_path=None, workers=8, rebuild_index=False):
+        """
+        Initialise the class Dataset
+
+        :type root_path: string
+        :param root_path: path/to/radiate, with one folder (or packed .shard file) per sequence
+
+        :type sets: list
+        :param sets: keep only the sequences whose meta.json 'set' is in this list
+            (e.g. 'train_good_weather', 'train_good_and_bad_weather', 'test'), None keeps all
+
+        :type weathers: list
+        :param weathers: keep only the sequences whose meta.json 'type' is in this list
+            (e.g. 'fog', 'snow', 'night'), None keeps all
+
+        :type config_file: string
+        :param config_file: the path to the configuration file used by every Sequence
 
-        return points
+        :type index_path: string
+        :param index_path: file where the index is cached, defaults to root_path/radiate_index.npz
+
+        :type workers: int
+        :param workers: number of threads used to read and open the sequences
+
+        :type rebuild_index: bool
+        :param rebuild_index: whether to ignore the cached index
+        """
+        self.root_path = root_path
+        self.config_file = config_file
+        self.workers = workers
+        config = read_yaml(config_file)
+        index = load_index(root_path, index_path, config['radar_timestamp_file'],
+                           workers, rebuild_index)
+
+        self.sequence_names = [name for name, info in index.items()
+                               if (sets is None or info['meta'].get('set') in sets) and
+                               (weathers is None or info['meta'].get('type') in weathers)]
+        self.sequence_paths = {name: index[name]['path'] for name in self.sequence_names}
+        self.meta = {name: index[name]['meta'] for name in self.sequence_names}
+
+        # global index: sequence id, radar frame and timestamp of every entry
+        lengths = [len(index[name]['frames']) for name in self.sequence_names]
+        self.offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.offsets[1:])
+        self.sequence_ids = np.repeat(np.arange(len(lengths)), lengths)
+        self.frames = np.concatenate(
+            [index[name]['frames'] for name in self.sequence_names] + [np.zeros(0, dtype=np.int64)])
+        self.times = np.concatenate(
+            [index[name]['times'] for name in self.sequence_names] + [np.zeros(0)])
+
+        self.__sequences = {}
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.frames)
+
+    def sequence(self, name):
+        """get a sequence, which is opened on first use
+
+        :param name: sequence name
+        :type name: string
+        :return: the sequence
+        :rtype: Sequence
+        """
+        with self.__lock:
+            seq = self.__sequences.get(name)
+        if seq is None:
+            seq = Sequence(self.sequence_paths[name], self.config_file)
+            with self.__lock:
+                seq = self.__sequences.setdefault(name, seq)
+        return seq
+
+    def open_sequences(self, workers=None):
+        """open all the sequences in parallel
+
+        :param workers: number of threads, defaults to the value given to the constructor
+        :type workers: int
+        :return: dictionary with all the sequences
+        :rtype: dict
+        """
+        workers = self.workers if workers is None else workers
+        with ThreadPoolExecutor(max(1, workers)) as executor:
+            sequences = list(executor.map(self.sequence, self.sequence_names))
+        return dict(zip(self.sequence_names, sequences))
+
+    def locate(self, index):
+        """get the sequence and radar frame of an entry of the global index
+
+        :param index: entry of the global index
+        :type index: int
+        :return: tuple (sequence_name, frame, t)
+            WHERE
+            string sequence_name is the name of the sequence
+            int frame is the radar frame
+            float t is the timestamp of the radar frame
+        :rtype: tuple
+        """
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError('dataset index out of range')
+        return (self.sequence_names[self.sequence_ids[index]],
+                int(self.frames[index]), float(self.times[index]))
+
+    def get(self, index, get_sensors=True, get_annotations=True):
+        """get the sensors and annotations of an entry of the global index
+
+        :param index: entry of the global index
+        :type index: int
+        :param get_sensors: whether to load the sensors
+        :type get_sensors: bool
+        :param get_annotations: whether to load the annotations
+        :type get_annotations: bool
+        :return: tuple (sequence_name, t, output) where output is given by
+            Sequence.get_from_timestamp at the timestamp t of the radar frame
+        :rtype: tuple
+        """
+        name, _, t = self.locate(index)
+        output = self.sequence(name).get_from_timestamp(t, get_sensors, get_annotations)
+        return name, t, output
+
+    def __getitem__(self, index):
+        return self.get(index)
+
+    def indices(self, shard_id=0, num_shards=1, shuffle=False, seed=0, epoch=0):
+        """entries of the global index assigned to one shard. Every entry is assigned to
+        exactly one shard and the split only depends on the arguments, so several workers
+        can split the dataset without communicating
+
+        :param shard_id: shard of this worker [0 num_shards-1]
+        :type shard_id: int
+        :param num_shards: number of shards (workers)
+        :type num_shards: int
+        :param shuffle: whether to shuffle the entries before splitting them
+        :type shuffle: bool
+        :param seed: random seed of the shuffle
+        :type seed: int
+        :param epoch: epoch number, added to the seed so every epoch has a different order
+        :type epoch: int
+        :return: entries of the shard
+        :rtype: np.array
+        """
+        if num_shards < 1 or shard_id < 0 or shard_id >= num_shards:
+            raise ValueError('invalid shard {} of {}'.format(shard_id, num_shards))
+        order = np.arange(len(self))
+        if shuffle:
+            order = np.random.RandomState(seed + epoch).permutation(len(self))
+        return order[shard_id::num_shards]
+
+    def iter_shard(self, shard_id=0, num_shards=1, shuffle=False, seed=0, epoch=0,
+                   get_sensors=True, get_annotations=True):
+        """iterate over the entries of one shard (see self.indices)
+
+        :param shard_id: shard of this worker [0 num_shards-1]
+        :type shard_id: int
+        :param num_shards: number of shards (workers)
+        :type num_shards: int
+        :param shuffle: whether to shuffle the entries before splitting them
+        :type shuffle: bool
+        :param seed: random seed of the shuffle
+        :type seed: int
+        :param epoch: epoch number, added to the seed
+        :type epoch: int
+        :param get_sensors: whether to load the sensors
+        :type get_sensors: bool
+        :param get_annotations: whether to load the annotations
+        :type get_annotations: bool
+        :return: iterator of tuples (sequence_name, t, output), see self.get
+        :rtype: iterator
+        """
+        for index in self.indices(shard_id, num_shards, shuffle, seed, epoch):
+            yield self.get(index, get_sensors, get_annotations)
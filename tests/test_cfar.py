@@ -0,0 +1,58 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from utils.cfar import cfar2d_detect
+
+
+def reference_threshold(x, num_train, num_guard, rate_fa, method, window):
+    """
+    Threshold of every cell computed cell by cell from the training cells inside the image
+    """
+    h, w = x.shape
+    side = num_train + num_guard
+    threshold = np.zeros(x.shape)
+    for r in range(h):
+        for c in range(w):
+            lead, lag = [], []
+            for dr in range(-side, side + 1):
+                for dc in range(-side, side + 1):
+                    if max(abs(dr), abs(dc)) <= num_guard:
+                        continue
+                    if window == 'cross' and dr != 0 and dc != 0:
+                        continue
+                    if not (0 <= r + dr < h and 0 <= c + dc < w):
+                        continue
+                    (lead if dr < 0 or (dr == 0 and dc < 0) else lag).append(x[r + dr, c + dc])
+            if method == 'ca':
+                cells = lead + lag
+            elif not lag or (lead and (np.mean(lead) >= np.mean(lag)) == (method == 'go')):
+                cells = lead
+            else:
+                cells = lag
+            n = len(cells)
+            threshold[r, c] = n * (rate_fa**(-1 / n) - 1) * np.mean(cells)
+    return threshold
+
+
+@pytest.mark.parametrize('method', ['ca', 'go', 'so'])
+@pytest.mark.parametrize('window', ['2d', 'cross'])
+def test_matches_reference(method, window):
+    rng = np.random.RandomState(0)
+    x = rng.exponential(1.0, (19, 23))
+    mask, peaks = cfar2d_detect(x, 3, 1, 0.05, method=method, window=window)
+    threshold = reference_threshold(x, 3, 1, 0.05, method, window)
+    decided = np.abs(x - threshold) > 1e-9
+    assert np.array_equal(mask[decided], (x > threshold)[decided])
+    assert len(peaks) == mask.sum()
+
+
+@pytest.mark.parametrize('method', ['ca', 'go', 'so'])
+@pytest.mark.parametrize('window', ['2d', 'cross'])
+def test_border_rows_not_flagged(method, window):
+    rng = np.random.RandomState(0)
+    x = rng.uniform(1, 2, (100, 100))
+    mask, _ = cfar2d_detect(x, 8, 2, 1e-3, method=method, window=window)
+    assert mask[0].sum() == 0 and mask[-1].sum() == 0
@@ -0,0 +1,25 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+import radiate
+
+SEQUENCE = os.path.join(ROOT, 'data', 'radiate', 'tiny_foggy')
+CONFIG = os.path.join(ROOT, 'config', 'config.yaml')
+
+
+@pytest.mark.skipif(not os.path.isdir(SEQUENCE), reason='tiny_foggy is not available')
+@pytest.mark.parametrize('workers', [0, 2])
+def test_iter_frames_with_ego_pose(workers):
+    seq = radiate.Sequence(SEQUENCE, config_file=CONFIG)
+    seq.config['use_ego_pose'] = True
+    # the frames after the last radar image are empty
+    frames = [output for _, output in seq.iter_frames(0.25, workers=workers) if output]
+    assert len(frames) > 0
+    for output in frames:
+        assert output['ego_pose']['position'].shape == (3,)
+        assert isinstance(output['ego_pose']['valid'], (bool, np.bool_))
+        assert 'radar_cartesian' in output['sensors']
@@ -0,0 +1,35 @@
+import os
+import sys
+import warnings
+import numpy as np
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+import radiate
+
+SEQUENCE = os.path.join(ROOT, 'data', 'radiate', 'tiny_foggy')
+CONFIG = os.path.join(ROOT, 'config', 'config.yaml')
+
+
+@pytest.mark.skipif(not os.path.isdir(SEQUENCE), reason='tiny_foggy is not available')
+def test_uncovered_sweeps_are_stacked_from_the_buffer():
+    # the GPS/IMU records of tiny_foggy do not cover its lidar timestamps
+    seq = radiate.Sequence(SEQUENCE, config_file=CONFIG)
+    seq.config['lidar_accumulation'].update(
+        n_sweeps=3, ego_motion=True, lidar_to_imu={'T': [0, 0, 0], 'R': [0, 0, -90]})
+    accumulator = seq.get_sweep_accumulator()
+    read_sweep = accumulator.read_sweep
+    reads = []
+    accumulator.read_sweep = lambda frame: reads.append(frame) or read_sweep(frame)
+
+    times = seq.timestamp_lidar['time'][2:12]
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        clouds = [seq.get_lidar_accumulated(float(t)) for t in times]
+    assert len(caught) == 1
+    # each sweep is read once, the previous ones come from the buffer
+    assert len(reads) == len(set(reads)) <= len(times) + 2
+
+    plain = seq.get_lidar_accumulated(float(times[-1]), ego_motion=False)
+    assert np.array_equal(clouds[-1], plain)
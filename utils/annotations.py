@@ -0,0 +1,171 @@
+import numpy as np
+
+ANNOTATION_DTYPE = np.dtype([('id', np.int64),
+                             ('class_id', np.int32),
+                             ('x', np.float64),
+                             ('y', np.float64),
+                             ('w', np.float64),
+                             ('h', np.float64),
+                             ('rotation', np.float64)])
+
+# detections: annotation fields plus the frame and the confidence score
+DETECTION_DTYPE = np.dtype(ANNOTATION_DTYPE.descr + [('frame', np.int64),
+                                                     ('score', np.float32)])
+
+
+class AnnotationIndex:
+    """
+    Frame-indexed columnar store of the annotations of a sequence.
+
+    All bounding boxes are kept in one structured array sorted by frame,
+    with per-frame offsets, so the boxes of a frame are a slice.
+
+    | Example:
+    | >>> index = AnnotationIndex(json.load(open('annotations.json')))
+    | >>> boxes = index.get(10)  # structured array
+    | >>> objects = index.get_dicts(10)  # list of dicts
+    """
+
+    def __init__(self, annotations):
+        """
+        :param annotations: annotations as loaded from annotations.json
+        :type annotations: list
+        """
+        self.class_names = []
+        class_ids = {}
+        self.num_frames = max([len(track['bboxes']) for track in annotations] + [0])
+
+        frames = []
+        rows = []
+        for track in annotations:
+            class_name = track['class_name']
+            if class_name not in class_ids:
+                class_ids[class_name] = len(self.class_names)
+                self.class_names.append(class_name)
+            class_id = class_ids[class_name]
+            for frame, bbox in enumerate(track['bboxes']):
+                if bbox:
+                    position = bbox['position']
+                    frames.append(frame)
+                    rows.append((track['id'], class_id, position[0], position[1],
+                                 position[2], position[3], bbox['rotation']))
+
+        self.__index(np.array(frames, dtype=np.int64),
+                     np.array(rows, dtype=ANNOTATION_DTYPE))
+
+    @classmethod
+    def from_array(cls, boxes, class_names, num_frames=None):
+        """
+        Build the index from a structured array with a 'frame' field, e.g. detections
+        with DETECTION_DTYPE
+
+        :param boxes: structured array with the fields of ANNOTATION_DTYPE and 'frame'
+        :type boxes: np.array
+        :param class_names: name of each class_id
+        :type class_names: list
+        :param num_frames: number of frames, defaults to the last frame + 1
+        :type num_frames: int
+
+        :return: the index
+        :rtype: AnnotationIndex
+        """
+        index = cls([])
+        index.class_names = list(class_names)
+        frames = boxes['frame'].astype(np.int64)
+        if num_frames is None:
+            num_frames = int(frames.max()) + 1 if len(frames) > 0 else 0
+        index.num_frames = num_frames
+        index.__index(frames, boxes)
+        return index
+
+    def __index(self, frames, boxes):
+        # stable sort keeps the track order inside each frame
+        order = np.argsort(frames, kind='stable')
+        self.boxes = boxes[order]
+        self.offsets = np.zeros(self.num_frames + 1, dtype=np.int64)
+        np.cumsum(np.bincount(frames, minlength=self.num_frames)[:self.num_frames],
+                  out=self.offsets[1:])
+
+    def __len__(self):
+        return self.num_frames
+
+    def __frame_slice(self, frame):
+        if frame < 0:
+            frame += self.num_frames
+        if frame < 0 or frame >= self.num_frames:
+            return slice(0, 0)
+        return slice(self.offsets[frame], self.offsets[frame + 1])
+
+    def get(self, frame):
+        """
+        Boxes of one frame
+
+        :param frame: annotation frame id
+        :type frame: int
+
+        :return: structured array (view) with the fields id, class_id, x, y, w, h, rotation
+        :rtype: np.array
+        """
+        return self.boxes[self.__frame_slice(frame)]
+
+    def get_dicts(self, frame):
+        """
+        Boxes of one frame in the annotations.json format
+
+        :param frame: annotation frame id
+        :type frame: int
+
+        :return: list of dicts with 'id', 'class_name' and 'bbox' ('position', 'rotation'),
+            plus 'score' for detections
+        :rtype: list
+        """
+        boxes = self.get(frame)
+        scores = boxes['score'].tolist() if 'score' in boxes.dtype.names else None
+        objects = []
+        for ii, box in enumerate(boxes[list(ANNOTATION_DTYPE.names)].tolist()):
+            obj = {'id': box[0],
+                   'class_name': self.class_names[box[1]],
+                   'bbox': {'position': [box[2], box[3], box[4], box[5]],
+                            'rotation': box[6]}}
+            if scores is not None:
+                obj['score'] = scores[ii]
+            objects.append(obj)
+        return objects
+
+
+def save_detections(path, detections, class_names, num_frames=None):
+    """
+    Save detections in a compressed npz file
+
+    :param path: output file (.npz)
+    :type path: string
+    :param detections: structured array with DETECTION_DTYPE
+    :type detections: np.array
+    :param class_names: name of each class_id
+    :type class_names: list
+    :param num_frames: number of frames of the sequence, defaults to the last frame with
+        detections + 1
+    :type num_frames: int
+    """
+    detections = np.asarray(detections, dtype=DETECTION_DTYPE)
+    if num_frames is None:
+        num_frames = int(detections['frame'].max()) + 1 if len(detections) > 0 else 0
+    np.savez_compressed(path, detections=detections,
+                        class_names=np.array(class_names, dtype=str),
+                        num_frames=num_frames)
+
+
+def load_detections(path):
+    """
+    Load detections saved with save_detections
+
+    :param path: npz file
+    :type path: string
+
+    :return: index of the detections (frames are the annotation frames)
+    :rtype: AnnotationIndex
+    """
+    with np.load(path) as data:
+        return AnnotationIndex.from_array(data['detections'],
+                                          data['class_names'].tolist(),
+                                          int(data['num_frames']))
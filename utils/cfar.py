@@ -1,4 +1,5 @@
 import numpy as np
+import cv2
 
 
 def cfar2d(x, num_train, num_guard, rate_fa):
@@ -17,9 +18,27 @@ def cfar2d(x, num_train, num_guard, rate_fa):
     :return: detected points
     :rtype: np.array
     """
+    num_train_half = round(num_train / 2)
+    num_guard_half = round(num_guard / 2)
+    num_side = num_train_half + num_guard_half
+
+    alpha = num_train * (rate_fa**(-1 / num_train) - 1)  # threshold factor
+
+    # same mask as cfar, built once and applied to all columns
+    mask = np.ones(num_side * 2)
+    mask[num_train_half:num_guard] = 0
+    mask /= num_train
+
+    # np.convolve(x[:, c], mask, 'same') for every column at once
+    size = mask.shape[0]
+    noise = cv2.filter2D(np.asarray(x, dtype=np.float64), -1,
+                         mask[::-1].reshape(-1, 1).copy(),
+                         anchor=(0, size - 1 - (size - 1) // 2),
+                         borderType=cv2.BORDER_CONSTANT)
+
+    threshold = alpha * noise
     out = np.zeros_like(x)
-    for c in range(x.shape[1]):
-        out[:, c] = cfar(x[:, c], num_train, num_guard, rate_fa).T
+    out[:] = np.greater(x, threshold) * 255
 
     return out
 
@@ -59,3 +78,193 @@ def cfar(x, num_train, num_guard, rate_fa):
     out = np.greater(x, threshold) * 255
 
     return out
+
+
+def _window_parts(num_train, num_guard, window):
+    """
+    Rectangles (sign, row0, row1, col0, col1) of all the training cells
+    ('all'), of the ones before the cell under test along the rows ('lead')
+    and of the ones after it ('lag'), relative to the cell under test. The
+    training cells in the row of the cell under test are split between lead
+    (left) and lag (right), so lead and lag together are all the cells.
+    """
+    g = num_guard
+    w = num_guard + num_train
+    if window == '2d':
+        return {'all': [(1, -w, w, -w, w), (-1, -g, g, -g, g)],
+                'lead': [(1, -w, -1, -w, w), (-1, -g, -1, -g, g), (1, 0, 0, -w, -g - 1)],
+                'lag': [(1, 1, w, -w, w), (-1, 1, g, -g, g), (1, 0, 0, g + 1, w)]}
+    elif window == 'cross':
+        lead = [(1, -w, -g - 1, 0, 0), (1, 0, 0, -w, -g - 1)]
+        lag = [(1, g + 1, w, 0, 0), (1, 0, 0, g + 1, w)]
+        return {'all': lead + lag, 'lead': lead, 'lag': lag}
+    raise ValueError('Unknown CFAR window: ' + window)
+
+
+def _box_sums(sat, pad, shape, rects):
+    """
+    Sum of the rectangles around every cell from the summed-area table of
+    the zero padded image
+    """
+    h, w = shape
+    out = np.zeros(shape)
+    for sign, r0, r1, c0, c1 in rects:
+        top, bottom = pad + r0, pad + r1 + 1
+        left, right = pad + c0, pad + c1 + 1
+        box = sat[bottom:bottom + h, right:right + w] - sat[top:top + h, right:right + w]
+        box -= sat[bottom:bottom + h, left:left + w]
+        box += sat[top:top + h, left:left + w]
+        if sign > 0:
+            out += box
+        else:
+            out -= box
+    return out
+
+
+def _box_counts(shape, rects):
+    """
+    Number of cells inside the image of the rectangles around every cell
+    """
+    h, w = shape
+    rows = np.arange(h)
+    cols = np.arange(w)
+    out = np.zeros(shape)
+    for sign, r0, r1, c0, c1 in rects:
+        num_rows = np.minimum(rows + r1, h - 1) - np.maximum(rows + r0, 0) + 1
+        num_cols = np.minimum(cols + c1, w - 1) - np.maximum(cols + c0, 0) + 1
+        out += sign * np.outer(np.maximum(num_rows, 0), np.maximum(num_cols, 0))
+    return out
+
+
+def _ca_alpha(count, rate_fa):
+    """
+    Threshold factor of CA-CFAR for an array with the number of averaged cells
+    """
+    count = np.maximum(count, 1).astype(np.int64)
+    n = np.arange(1, count.max() + 1)
+    lut = np.concatenate([[0.0], n * (rate_fa**(-1 / n) - 1)])
+    return lut[count]
+
+
+def _os_alpha(num_cells, k, rate_fa):
+    """
+    Threshold factor of OS-CFAR, solving
+    rate_fa = prod_{i=0}^{k-1} (num_cells - i) / (num_cells - i + alpha)
+    """
+    i = np.arange(k)
+
+    def pfa(alpha):
+        return np.prod((num_cells - i) / (num_cells - i + alpha))
+
+    low, high = 0.0, 1.0
+    while pfa(high) > rate_fa:
+        high *= 2
+    for _ in range(100):
+        mid = (low + high) / 2
+        if pfa(mid) > rate_fa:
+            low = mid
+        else:
+            high = mid
+    return high
+
+
+def _os_noise(x, rects, pad, k, rows_per_chunk=32):
+    """
+    k-th smallest training cell around every cell (zero outside the image)
+    """
+    h, w = x.shape
+    padded = np.pad(x, pad, mode='constant')
+    kernel = np.zeros((2 * pad + 1, 2 * pad + 1), dtype=np.int64)
+    for sign, r0, r1, c0, c1 in rects:
+        kernel[pad + r0:pad + r1 + 1, pad + c0:pad + c1 + 1] += sign
+    offsets = np.argwhere(kernel > 0) - pad
+
+    noise = np.zeros((h, w), dtype=x.dtype)
+    cells = np.empty((rows_per_chunk, w, offsets.shape[0]), dtype=x.dtype)
+    for r in range(0, h, rows_per_chunk):
+        rows = min(rows_per_chunk, h - r)
+        for n, (dr, dc) in enumerate(offsets):
+            cells[:rows, :, n] = padded[pad + r + dr:pad + r + dr + rows,
+                                        pad + dc:pad + dc + w]
+        noise[r:r + rows] = np.partition(cells[:rows], k - 1, axis=-1)[..., k - 1]
+    return noise
+
+
+def cfar2d_detect(x, num_train, num_guard, rate_fa, method='ca', window='2d', k=None):
+    """
+    Detect peaks with a 2D CFAR applied to the whole image at once.
+
+    The training cells are the cells at most num_train + num_guard away from
+    the cell under test, excluding the ones at most num_guard away. With
+    window='2d' they form a square ring, with window='cross' they are only the
+    row and column segments (separable window). Averages are computed with a
+    summed-area table and cells outside the image are ignored.
+
+    method:
+        'ca' cell-averaging, mean of all training cells
+        'go' greatest-of, maximum of the means before and after the cell along the rows
+        'so' smallest-of, minimum of the means before and after the cell along the rows
+        (at the image borders a side without cells is not used)
+        'os' ordered-statistic, k-th smallest training cell (zero outside the image).
+        It sorts the training cells, so it is much slower than the others,
+        especially with window='2d'
+
+    :param x: input 2d array
+    :type x: np.array
+    :param num_train: Number of training cells on each side.
+    :type num_train: int
+    :param num_guard: Number of guard cells on each side.
+    :type num_guard: int
+    :param rate_fa: False alarm rate.
+    :type rate_fa: float
+    :param method: 'ca', 'go', 'so' or 'os'
+    :type method: string
+    :param window: '2d' or 'cross'
+    :type window: string
+    :param k: rank used by OS-CFAR, defaults to 3/4 of the training cells
+    :type k: int
+
+    :return: tuple (mask, peaks)
+        WHERE
+        np.array mask is a boolean array with the detected cells
+        np.array peaks is a Kx3 array with the (row, column, value) of each detection
+    :rtype: tuple
+    """
+    x = np.asarray(x)
+    parts = _window_parts(num_train, num_guard, window)
+    pad = num_train + num_guard
+
+    if method == 'os':
+        num_cells = sum(sign * (r1 - r0 + 1) * (c1 - c0 + 1)
+                        for sign, r0, r1, c0, c1 in parts['all'])
+        if k is None:
+            k = max(1, int(round(0.75 * num_cells)))
+        noise = _os_noise(x, parts['all'], pad, k)
+        threshold = _os_alpha(num_cells, k, rate_fa) * noise
+    else:
+        src = x if x.dtype in (np.uint8, np.float32, np.float64) else x.astype(np.float64)
+        padded = cv2.copyMakeBorder(src, pad, pad, pad, pad,
+                                    cv2.BORDER_CONSTANT, value=0)
+        sat = cv2.integral(padded, sdepth=cv2.CV_64F)
+        if method == 'ca':
+            count = _box_counts(x.shape, parts['all'])
+            noise = _box_sums(sat, pad, x.shape, parts['all']) / np.maximum(count, 1)
+        elif method == 'go' or method == 'so':
+            count_lead = _box_counts(x.shape, parts['lead'])
+            count_lag = _box_counts(x.shape, parts['lag'])
+            lead = _box_sums(sat, pad, x.shape, parts['lead']) / np.maximum(count_lead, 1)
+            lag = _box_sums(sat, pad, x.shape, parts['lag']) / np.maximum(count_lag, 1)
+            use_lead = lead >= lag if method == 'go' else lead <= lag
+            # a side with no cells inside the image has no mean, the other one is used
+            use_lead = np.where(count_lag == 0, True, np.where(count_lead == 0, False, use_lead))
+            noise = np.where(use_lead, lead, lag)
+            count = np.where(use_lead, count_lead, count_lag)
+        else:
+            raise ValueError('Unknown CFAR method: ' + method)
+        # threshold factor for the number of cells averaged around each cell
+        threshold = _ca_alpha(count, rate_fa) * noise
+
+    mask = np.greater(x, threshold)
+    rows, cols = np.nonzero(mask)
+    peaks = np.stack([rows, cols, x[rows, cols]], axis=1)
+    return mask, peaks
@@ -0,0 +1,141 @@
+import os
+import copy
+import json
+import threading
+from utils.calibration import Calibration
+
+# parsed files and calibration objects of this process, keyed by file path and stat
+_yaml_cache = {}
+_calib_cache = {}
+_lock = threading.Lock()
+
+
+def file_key(path):
+    """
+    Key of a file which changes when the file is modified
+
+    :param path: file path
+    :type path: string
+
+    :return: tuple (absolute path, modification time, size)
+    :rtype: tuple
+    """
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+
+def parsed_path(path):
+    """
+    File where the parsed content of a YAML file is stored
+
+    :param path: YAML file
+    :type path: string
+
+    :return: path/to/.<name>.json
+    :rtype: string
+    """
+    folder, name = os.path.split(path)
+    return os.path.join(folder, '.' + name + '.json')
+
+
+def _read_parsed(path, key):
+    try:
+        with open(parsed_path(path), 'r') as file:
+            parsed = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if parsed.get('key') != list(key[1:]):
+        return None
+    return parsed['content']
+
+
+def _write_parsed(path, key, content):
+    # only content which json keeps unchanged (string keys, no dates, ...) is stored
+    try:
+        data = json.dumps({'key': list(key[1:]), 'content': content})
+        if json.loads(data)['content'] != content:
+            return
+        tmp_path = '{}.{}.tmp'.format(parsed_path(path), os.getpid())
+        with open(tmp_path, 'w') as file:
+            file.write(data)
+        os.replace(tmp_path, parsed_path(path))
+    except (OSError, TypeError, ValueError):
+        pass
+
+
+def read_yaml(path, use_parsed=True):
+    """
+    Parse a YAML file with the libyaml loader when available. Results are memoised
+    per process until the file changes, so the returned dictionary must not be modified.
+    The parsed content is also stored as json next to the file (.<name>.json), so new
+    processes neither import yaml nor parse the file again
+
+    :param path: YAML file
+    :type path: string
+    :param use_parsed: whether to read and write the parsed json file
+    :type use_parsed: bool
+
+    :return: parsed content
+    :rtype: dict
+    """
+    key = file_key(path)
+    with _lock:
+        if key in _yaml_cache:
+            return _yaml_cache[key]
+    content = _read_parsed(path, key) if use_parsed else None
+    if content is None:
+        import yaml
+        loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+        with open(path, 'r') as file:
+            content = yaml.load(file, Loader=loader)
+        if use_parsed:
+            _write_parsed(path, key, content)
+    with _lock:
+        return _yaml_cache.setdefault(key, content)
+
+
+def calib_path(config_file, calib_file):
+    """
+    Locate the calibration file of a configuration file. Relative paths are looked up
+    from the working directory and then from the folder above the configuration folder
+    (the repository root for config/config.yaml), so scripts can run from subfolders
+
+    :param config_file: configuration file
+    :type config_file: string
+    :param calib_file: 'calib_file' of the configuration
+    :type calib_file: string
+
+    :return: path to the calibration file
+    :rtype: string
+    """
+    if os.path.isabs(calib_file) or os.path.exists(calib_file):
+        return calib_file
+    root = os.path.dirname(os.path.dirname(os.path.abspath(config_file)))
+    candidate = os.path.join(root, calib_file)
+    return candidate if os.path.exists(candidate) else calib_file
+
+
+def load_config(config_file):
+    """
+    Read the configuration file merged with its calibration file ('calib_file') and the
+    calibration matrices. The calibration object is shared by all the sequences which use
+    the same files and must not be modified
+
+    :param config_file: configuration file
+    :type config_file: string
+
+    :return: tuple (config, calib) with a new configuration dictionary and the
+        Calibration object
+    :rtype: tuple
+    """
+    config = read_yaml(config_file)
+    calib_file = calib_path(config_file, config['calib_file'])
+    config = dict(config, **read_yaml(calib_file))
+    key = (file_key(config_file), file_key(calib_file))
+    with _lock:
+        calib = _calib_cache.get(key)
+    if calib is None:
+        calib = Calibration(config)
+        with _lock:
+            calib = _calib_cache.setdefault(key, calib)
+    return copy.deepcopy(config), calib
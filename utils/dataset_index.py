@@ -0,0 +1,197 @@
+"""
+Global (sequence, radar frame) index of a RADIATE root folder.
+
+The meta.json and radar timestamps of every sequence are read once and cached
+in an npz file. On the next runs only the sequences whose files changed are
+read again.
+"""
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from utils.shard import ShardReader, EXTENSION as SHARD_EXTENSION, read_timestamp_table
+
+INDEX_FILE = 'radiate_index.npz'
+
+
+def find_sequences(root_path):
+    """
+    Find the sequences inside a dataset root folder. A sequence folder is preferred
+    to a packed shard with the same name.
+
+    :param root_path: path/to/radiate
+    :type root_path: string
+
+    :return: dictionary with the path of each sequence name
+    :rtype: dict
+    """
+    sequences = {}
+    for name in sorted(os.listdir(root_path)):
+        path = os.path.join(root_path, name)
+        if os.path.isdir(path) and os.path.isfile(os.path.join(path, 'meta.json')):
+            sequences[name] = path
+        elif os.path.isfile(path) and name.endswith(SHARD_EXTENSION):
+            sequences.setdefault(name[:-len(SHARD_EXTENSION)], path)
+    return sequences
+
+
+def sequence_key(path, radar_timestamp_file):
+    """
+    Signature of the files read by read_sequence_info, used to invalidate the cache
+
+    :param path: sequence folder or shard file
+    :type path: string
+    :param radar_timestamp_file: name of the radar timestamp file
+    :type radar_timestamp_file: string
+
+    :return: signature
+    :rtype: string
+    """
+    if os.path.isfile(path):
+        files = [path]
+    else:
+        files = [os.path.join(path, 'meta.json'), os.path.join(path, radar_timestamp_file)]
+    signature = []
+    for file_path in files:
+        try:
+            stat = os.stat(file_path)
+            signature.append('{}:{}'.format(stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append('-')
+    return '|'.join(signature)
+
+
+def read_sequence_info(path, radar_timestamp_file):
+    """
+    Read the meta data and the radar timestamps of a sequence
+
+    :param path: sequence folder or shard file
+    :type path: string
+    :param radar_timestamp_file: name of the radar timestamp file
+    :type radar_timestamp_file: string
+
+    :return: tuple (meta, frames, times)
+        WHERE
+        dict meta is the content of meta.json
+        np.array frames are the radar frames sorted by time
+        np.array times are their timestamps
+    :rtype: tuple
+    """
+    if os.path.isfile(path):
+        shard = ShardReader(path)
+        try:
+            meta_data = shard.read_file('meta.json')
+            meta = json.loads(meta_data) if meta_data is not None else {}
+            values = shard.timestamps(radar_timestamp_file)
+        finally:
+            shard.close()
+    else:
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        timestamp_path = os.path.join(path, radar_timestamp_file)
+        if os.path.isfile(timestamp_path):
+            with open(timestamp_path, 'rb') as f:
+                values = read_timestamp_table(f.read())
+        else:
+            values = np.zeros((0, 2))
+    order = np.argsort(values[:, 1], kind='stable')
+    return meta, values[order, 0].astype(np.int64), values[order, 1]
+
+
+def load_index(root_path, index_path=None, radar_timestamp_file='Navtech_Cartesian.txt',
+               workers=8, rebuild=False):
+    """
+    Load the index of all the sequences of a dataset, updating the cached file when
+    sequences were added, removed or modified
+
+    :param root_path: path/to/radiate
+    :type root_path: string
+    :param index_path: cache file, defaults to root_path/radiate_index.npz. The cache is
+        not written if the folder is read-only
+    :type index_path: string
+    :param radar_timestamp_file: name of the radar timestamp file
+    :type radar_timestamp_file: string
+    :param workers: number of threads reading the sequences
+    :type workers: int
+    :param rebuild: whether to ignore the cached file
+    :type rebuild: bool
+
+    :return: dictionary with the 'path', 'meta', 'frames' and 'times' of each sequence name
+    :rtype: dict
+    """
+    if index_path is None:
+        index_path = os.path.join(root_path, INDEX_FILE)
+    sequences = find_sequences(root_path)
+    keys = {name: sequence_key(path, radar_timestamp_file)
+            for name, path in sequences.items()}
+
+    cached = {}
+    num_stored = -1
+    if not rebuild and os.path.isfile(index_path):
+        try:
+            # every data[...] access reads the array from the file again, so read them once
+            with np.load(index_path) as data:
+                names = data['names'].tolist()
+                stored_keys = data['keys'].tolist()
+                stored_meta = data['meta'].tolist()
+                offsets = data['offsets']
+                frames = data['frames']
+                times = data['times']
+            num_stored = len(names)
+            for ii, name in enumerate(names):
+                if keys.get(name) == stored_keys[ii]:
+                    cached[name] = {'meta': json.loads(stored_meta[ii]),
+                                    'frames': frames[offsets[ii]:offsets[ii + 1]],
+                                    'times': times[offsets[ii]:offsets[ii + 1]]}
+        except (OSError, KeyError, ValueError):
+            cached = {}
+            num_stored = -1
+
+    missing = [name for name in sequences if name not in cached]
+    if missing:
+        with ThreadPoolExecutor(max(1, workers)) as executor:
+            infos = executor.map(
+                lambda name: read_sequence_info(sequences[name], radar_timestamp_file), missing)
+            for name, (meta, frames, times) in zip(missing, infos):
+                cached[name] = {'meta': meta, 'frames': frames, 'times': times}
+
+    index = {}
+    for name, path in sequences.items():
+        index[name] = dict(cached[name], path=path)
+
+    if missing or num_stored != len(sequences):
+        save_index(index_path, index, keys)
+    return index
+
+
+def save_index(index_path, index, keys):
+    """
+    Write the index cache (nothing is written if the folder is read-only)
+
+    :param index_path: cache file
+    :type index_path: string
+    :param index: index as returned by load_index
+    :type index: dict
+    :param keys: signature of each sequence, see sequence_key
+    :type keys: dict
+    """
+    names = list(index)
+    lengths = [len(index[name]['frames']) for name in names]
+    offsets = np.zeros(len(names) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    frames = [index[name]['frames'] for name in names]
+    times = [index[name]['times'] for name in names]
+    # np.savez appends .npz to names without it, so keep the suffix on the temp file
+    tmp_path = '{}.{}.tmp.npz'.format(index_path, os.getpid())
+    try:
+        np.savez(tmp_path,
+                 names=np.array(names, dtype=str),
+                 keys=np.array([keys[name] for name in names], dtype=str),
+                 meta=np.array([json.dumps(index[name]['meta']) for name in names], dtype=str),
+                 offsets=offsets,
+                 frames=np.concatenate(frames) if frames else np.zeros(0, dtype=np.int64),
+                 times=np.concatenate(times) if times else np.zeros(0))
+        os.replace(tmp_path, index_path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
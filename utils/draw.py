@@ -0,0 +1,45 @@
+import numpy as np
+import cv2
+
+
+def color_to_bgr(color):
+    """
+    Convert a colour in [0, 1] into the integer tuple expected by OpenCV
+
+    :param color: colour with 3 values in [0, 1] (in OpenCV channel order)
+    :type color: tuple
+
+    :return: colour with 3 integers in [0, 255]
+    :rtype: tuple
+    """
+    return tuple(int(c) for c in np.array(color) * 255)
+
+
+def draw_polylines(image, polylines, classes, colors, closed=True, thickness=1):
+    """
+    Draw many polylines with one cv2.polylines call per class
+
+    :param image: image, modified in place
+    :type image: np.array
+    :param polylines: list of polylines, each with shape Kx2 (x, y)
+    :type polylines: list
+    :param classes: class of each polyline
+    :type classes: list
+    :param colors: dictionary with the colour (see color_to_bgr) of each class
+    :type colors: dict
+    :param closed: whether to join the last point of each polyline to the first one
+    :type closed: bool
+    :param thickness: line thickness in pixels
+    :type thickness: int
+
+    :return: image with the polylines drawn
+    :rtype: np.array
+    """
+    groups = {}
+    for points, class_name in zip(polylines, classes):
+        if len(points) > 0:
+            groups.setdefault(class_name, []).append(
+                np.ascontiguousarray(points, dtype=np.int32).reshape(-1, 1, 2))
+    for class_name, group in groups.items():
+        cv2.polylines(image, group, closed, colors[class_name], thickness)
+    return image
@@ -0,0 +1,466 @@
+"""
+Standalone evaluation of radar detections.
+
+Detections and ground truth use the annotations.json format (lists of dicts with
+'class_name' and 'bbox' {'position', 'rotation'}, plus 'score' for detections), as
+returned by Sequence.get_annotation_from_id and utils.annotations.load_detections.
+IoUs of rotated boxes are exact polygon intersections computed for all the pairs
+of a frame at once, detections are matched greedily by score, and the average
+precision is the area under the interpolated precision/recall curve (all points,
+as PASCAL VOC 2010+ and DOTA) per class, range bin and weather.
+
+| Example (detections written by vehicle_detection/inference.py):
+| $ python -m utils.evaluation data/radiate/ vehicle_detection/detections/ --sets test --vehicle
+"""
+import os
+import json
+import argparse
+import numpy as np
+from utils.geometry import boxes_from_annotations, rotated_box_corners
+from utils.annotations import AnnotationIndex, load_detections
+from utils.dataset_index import find_sequences, read_sequence_info
+from utils.shard import ShardReader
+
+# ground truth classes merged into 'vehicle' by the radar vehicle detection models
+# (the other classes are ignored)
+VEHICLE_CLASS_MAP = {'car': 'vehicle',
+                     'van': 'vehicle',
+                     'truck': 'vehicle',
+                     'bus': 'vehicle',
+                     'motorbike': 'vehicle',
+                     'bicycle': 'vehicle',
+                     'vehicle': 'vehicle'}
+
+RANGE_BINS = (0, 25, 50, 75, 100)
+
+
+def _cross(a, b):
+    return a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+
+
+def _inside(points, corners, eps=1e-9):
+    # points Nx K x2 inside the rectangles Nx4x2 (corners in order)
+    origin = corners[:, None, 0]
+    e1 = (corners[:, 1] - corners[:, 0])[:, None]
+    e2 = (corners[:, 3] - corners[:, 0])[:, None]
+    d = points - origin
+    p1 = np.sum(d * e1, axis=-1)
+    p2 = np.sum(d * e2, axis=-1)
+    l1 = np.sum(e1 * e1, axis=-1)
+    l2 = np.sum(e2 * e2, axis=-1)
+    return ((p1 >= -eps * l1) & (p1 <= l1 * (1 + eps)) &
+            (p2 >= -eps * l2) & (p2 <= l2 * (1 + eps)))
+
+
+def intersection_area(corners_a, corners_b):
+    """
+    Intersection area of pairs of rectangles
+
+    :param corners_a: corners with shape Nx4x2, in order around each rectangle
+    :type corners_a: np.array
+    :param corners_b: corners with shape Nx4x2
+    :type corners_b: np.array
+
+    :return: N intersection areas
+    :rtype: np.array
+    """
+    n = corners_a.shape[0]
+    # corners of each rectangle inside the other one
+    in_a = _inside(corners_b, corners_a)
+    in_b = _inside(corners_a, corners_b)
+
+    # intersections of the 4x4 pairs of edges
+    a0 = corners_a[:, :, None]
+    r = (np.roll(corners_a, -1, axis=1) - corners_a)[:, :, None]
+    b0 = corners_b[:, None]
+    s = (np.roll(corners_b, -1, axis=1) - corners_b)[:, None]
+    denom = _cross(r, s)
+    parallel = np.abs(denom) < 1e-12
+    denom = np.where(parallel, 1.0, denom)
+    t = _cross(b0 - a0, s) / denom
+    u = _cross(b0 - a0, r) / denom
+    on_edges = ~parallel & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+    crossings = a0 + t[..., None] * r
+
+    points = np.concatenate([corners_a, corners_b, crossings.reshape(n, 16, 2)], axis=1)
+    valid = np.concatenate([in_b, in_a, on_edges.reshape(n, 16)], axis=1)
+    count = valid.sum(axis=1)
+
+    # the intersection is convex: sort its vertices by angle around their centroid
+    centroid = (np.sum(points * valid[..., None], axis=1) /
+                np.maximum(count, 1)[:, None])
+    d = points - centroid[:, None]
+    angles = np.where(valid, np.arctan2(d[..., 1], d[..., 0]), np.inf)
+    order = np.argsort(angles, axis=1)
+    points = np.take_along_axis(points, order[..., None], axis=1)
+    valid = np.take_along_axis(valid, order, axis=1)
+    # the unused slots repeat the first vertex, which adds no area
+    points = np.where(valid[..., None], points, points[:, :1])
+
+    x, y = points[..., 0], points[..., 1]
+    area = 0.5 * np.abs(np.sum(x * np.roll(y, -1, axis=1) - np.roll(x, -1, axis=1) * y, axis=1))
+    return np.where(count >= 3, area, 0.0)
+
+
+def rotated_iou(boxes_a, boxes_b):
+    """
+    IoU of all the pairs of two sets of rotated boxes
+
+    :param boxes_a: boxes with shape Nx5 (x, y, width, height, angle in degrees), see
+        utils.geometry.rotated_box_corners
+    :type boxes_a: np.array
+    :param boxes_b: boxes with shape Mx5
+    :type boxes_b: np.array
+
+    :return: IoU matrix with shape NxM
+    :rtype: np.array
+    """
+    boxes_a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 5)
+    boxes_b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 5)
+    iou = np.zeros((len(boxes_a), len(boxes_b)))
+    if iou.size == 0:
+        return iou
+
+    # only the pairs whose circumscribed circles overlap can intersect
+    center_a = boxes_a[:, :2] + boxes_a[:, 2:4] / 2
+    center_b = boxes_b[:, :2] + boxes_b[:, 2:4] / 2
+    radius_a = np.hypot(boxes_a[:, 2], boxes_a[:, 3]) / 2
+    radius_b = np.hypot(boxes_b[:, 2], boxes_b[:, 3]) / 2
+    distance = np.hypot(center_a[:, None, 0] - center_b[None, :, 0],
+                        center_a[:, None, 1] - center_b[None, :, 1])
+    ii, jj = np.nonzero(distance < radius_a[:, None] + radius_b[None, :])
+    if len(ii) == 0:
+        return iou
+
+    inter = intersection_area(rotated_box_corners(boxes_a)[ii], rotated_box_corners(boxes_b)[jj])
+    area_a = boxes_a[ii, 2] * boxes_a[ii, 3]
+    area_b = boxes_b[jj, 2] * boxes_b[jj, 3]
+    union = area_a + area_b - inter
+    iou[ii, jj] = np.where(union > 0, inter / np.where(union > 0, union, 1.0), 0.0)
+    return iou
+
+
+def greedy_match(iou, scores, iou_threshold=0.5):
+    """
+    Match detections to ground truth boxes by decreasing score. Each detection takes the
+    unmatched ground truth box with the highest IoU above the threshold.
+
+    :param iou: IoU matrix with shape NxM (detections x ground truth)
+    :type iou: np.array
+    :param scores: N detection scores
+    :type scores: np.array
+    :param iou_threshold: minimum IoU of a match
+    :type iou_threshold: float
+
+    :return: N indices of the matched ground truth boxes (-1 for false positives)
+    :rtype: np.array
+    """
+    matches = np.full(iou.shape[0], -1, dtype=np.int64)
+    if iou.shape[1] == 0:
+        return matches
+    available = np.ones(iou.shape[1], dtype=bool)
+    for det in np.argsort(-np.asarray(scores), kind='stable'):
+        candidates = np.where(available, iou[det], -1.0)
+        best = int(np.argmax(candidates))
+        if candidates[best] >= iou_threshold:
+            matches[det] = best
+            available[best] = False
+    return matches
+
+
+def average_precision(tp, scores, num_gt):
+    """
+    Area under the interpolated precision/recall curve
+
+    :param tp: whether each detection is a true positive
+    :type tp: np.array
+    :param scores: detection scores
+    :type scores: np.array
+    :param num_gt: number of ground truth boxes
+    :type num_gt: int
+
+    :return: tuple (ap, recall, precision) where recall and precision are the values
+        with all the detections (nan without ground truth)
+    :rtype: tuple
+    """
+    if num_gt == 0:
+        return float('nan'), float('nan'), float('nan')
+    if len(tp) == 0:
+        return 0.0, 0.0, 0.0
+    order = np.argsort(-np.asarray(scores), kind='stable')
+    tp = np.asarray(tp, dtype=bool)[order]
+    ctp = np.cumsum(tp)
+    recall = ctp / num_gt
+    precision = ctp / np.arange(1, len(tp) + 1)
+    mrec = np.concatenate([[0.0], recall, [1.0]])
+    mpre = np.concatenate([[0.0], precision, [0.0]])
+    mpre = np.maximum.accumulate(mpre[::-1])[::-1]
+    steps = np.nonzero(mrec[1:] != mrec[:-1])[0]
+    ap = float(np.sum((mrec[steps + 1] - mrec[steps]) * mpre[steps + 1]))
+    return ap, float(recall[-1]), float(precision[-1])
+
+
+class DetectionEvaluator:
+    """
+    Accumulates the matches of many frames and computes AP/recall per class, range bin
+    and weather
+
+    | Example:
+    | >>> evaluator = DetectionEvaluator(class_map=VEHICLE_CLASS_MAP)
+    | >>> for frame in frames:
+    | >>>     evaluator.add(seq.get_annotation_from_id(frame), detections.get_dicts(frame), 'fog')
+    | >>> results = evaluator.summarize()
+    """
+
+    def __init__(self, iou_threshold=0.5, class_map=None, range_bins=RANGE_BINS,
+                 range_res=0.173611, range_cells=576):
+        """
+        :param iou_threshold: minimum IoU of a true positive
+        :type iou_threshold: float
+        :param class_map: class name -> evaluated class name, applied to the ground truth
+            and to the detections. The classes that are not in the map are ignored (None
+            keeps all the classes)
+        :type class_map: dict
+        :param range_bins: edges of the range bins in meters
+        :type range_bins: tuple
+        :param range_res: meters per pixel of the radar cartesian images
+        :type range_res: float
+        :param range_cells: the radar is at pixel (range_cells, range_cells)
+        :type range_cells: int
+        """
+        self.iou_threshold = iou_threshold
+        self.class_map = class_map
+        self.range_bins = np.asarray(range_bins, dtype=np.float64)
+        self.range_res = range_res
+        self.range_cells = range_cells
+        self.classes = []
+        self.weathers = []
+        # one entry per detection and per ground truth box
+        self.det = {'score': [], 'tp': [], 'class': [], 'range': [], 'weather': []}
+        self.gt = {'class': [], 'range': [], 'weather': []}
+        self.num_frames = 0
+
+    def __id(self, names, name):
+        if name not in names:
+            names.append(name)
+        return names.index(name)
+
+    def __map_classes(self, objects):
+        if self.class_map is None:
+            return objects, [obj['class_name'] for obj in objects]
+        objects = [obj for obj in objects if obj['class_name'] in self.class_map]
+        return objects, [self.class_map[obj['class_name']] for obj in objects]
+
+    def __range_bin(self, boxes):
+        centers = boxes[:, :2] + boxes[:, 2:4] / 2
+        ranges = np.hypot(centers[:, 0] - self.range_cells,
+                          centers[:, 1] - self.range_cells) * self.range_res
+        bins = np.searchsorted(self.range_bins, ranges, side='right') - 1
+        return np.where(bins < len(self.range_bins) - 1, bins, -1)
+
+    def add(self, ground_truth, detections, weather=None):
+        """
+        Match the detections of one frame
+
+        :param ground_truth: objects of the frame in the annotations.json format
+        :type ground_truth: list
+        :param detections: detections of the frame in the same format, with a 'score'
+            (1 when missing), e.g. the objects of vehicle_detection.py
+        :type detections: list
+        :param weather: weather of the frame (e.g. meta.json 'type')
+        :type weather: string
+        """
+        self.num_frames += 1
+        weather_id = self.__id(self.weathers, weather)
+        ground_truth, gt_classes = self.__map_classes(ground_truth)
+        detections, det_classes = self.__map_classes(detections)
+        gt_classes = np.array([self.__id(self.classes, name) for name in gt_classes],
+                              dtype=np.int64)
+        det_classes = np.array([self.__id(self.classes, name) for name in det_classes],
+                               dtype=np.int64)
+        gt_boxes = boxes_from_annotations(ground_truth)
+        det_boxes = boxes_from_annotations(detections)
+        scores = np.array([obj.get('score', 1.0) for obj in detections], dtype=np.float64)
+        gt_bins = self.__range_bin(gt_boxes)
+        det_bins = self.__range_bin(det_boxes)
+
+        iou = rotated_iou(det_boxes, gt_boxes)
+        # boxes of different classes never match
+        iou[det_classes[:, None] != gt_classes[None, :]] = 0
+        matches = greedy_match(iou, scores, self.iou_threshold)
+        tp = matches >= 0
+        # a true positive is counted in the range bin of its ground truth box
+        det_bins = np.where(tp, gt_bins[np.maximum(matches, 0)] if len(gt_bins) else det_bins,
+                            det_bins)
+
+        self.det['score'].append(scores)
+        self.det['tp'].append(tp)
+        self.det['class'].append(det_classes)
+        self.det['range'].append(det_bins)
+        self.det['weather'].append(np.full(len(scores), weather_id, dtype=np.int64))
+        self.gt['class'].append(gt_classes)
+        self.gt['range'].append(gt_bins)
+        self.gt['weather'].append(np.full(len(gt_classes), weather_id, dtype=np.int64))
+
+    def __arrays(self):
+        det = {key: np.concatenate(values) if values else np.zeros(0)
+               for key, values in self.det.items()}
+        gt = {key: np.concatenate(values) if values else np.zeros(0, dtype=np.int64)
+              for key, values in self.gt.items()}
+        return det, gt
+
+    def __metrics(self, det, gt, det_mask, gt_mask):
+        classes = {}
+        for class_id, name in enumerate(self.classes):
+            d = det_mask & (det['class'] == class_id)
+            num_gt = int(np.sum(gt_mask & (gt['class'] == class_id)))
+            ap, recall, precision = average_precision(det['tp'][d], det['score'][d], num_gt)
+            classes[name] = {'AP': ap, 'recall': recall, 'precision': precision,
+                             'num_gt': num_gt, 'num_det': int(np.sum(d))}
+        aps = [values['AP'] for values in classes.values() if not np.isnan(values['AP'])]
+        return {'mAP': float(np.mean(aps)) if aps else float('nan'), 'classes': classes}
+
+    def summarize(self):
+        """
+        Compute the metrics of all the added frames
+
+        :return: dictionary with the 'mAP' and the 'classes' metrics ('AP', 'recall',
+            'precision', 'num_gt', 'num_det') overall, per 'range' bin ('0-25', ...) and
+            per 'weather'
+        :rtype: dict
+        """
+        det, gt = self.__arrays()
+        all_det = np.ones(len(det['score']), dtype=bool)
+        all_gt = np.ones(len(gt['class']), dtype=bool)
+        results = self.__metrics(det, gt, all_det, all_gt)
+        results['iou_threshold'] = self.iou_threshold
+        results['num_frames'] = self.num_frames
+        results['range'] = {}
+        for ii in range(len(self.range_bins) - 1):
+            name = '{:g}-{:g}'.format(self.range_bins[ii], self.range_bins[ii + 1])
+            results['range'][name] = self.__metrics(det, gt, det['range'] == ii,
+                                                    gt['range'] == ii)
+        results['weather'] = {}
+        for ii, name in enumerate(self.weathers):
+            results['weather'][str(name)] = self.__metrics(det, gt, det['weather'] == ii,
+                                                           gt['weather'] == ii)
+        return results
+
+    def operating_points(self, thresholds, class_name=None):
+        """
+        Precision and recall when only the detections above each score threshold are kept
+
+        :param thresholds: score thresholds
+        :type thresholds: np.array
+        :param class_name: evaluated class, None for all the classes together
+        :type class_name: string
+
+        :return: dictionary with the 'threshold', 'precision', 'recall' and 'f1' arrays
+        :rtype: dict
+        """
+        det, gt = self.__arrays()
+        d = np.ones(len(det['score']), dtype=bool)
+        num_gt = len(gt['class'])
+        if class_name is not None:
+            class_id = self.classes.index(class_name)
+            d = det['class'] == class_id
+            num_gt = int(np.sum(gt['class'] == class_id))
+        order = np.argsort(-det['score'][d], kind='stable')
+        scores = det['score'][d][order]
+        ctp = np.concatenate([[0], np.cumsum(det['tp'][d][order])])
+        thresholds = np.asarray(thresholds, dtype=np.float64)
+        # number of detections with score >= threshold
+        kept = np.searchsorted(-scores, -thresholds, side='right')
+        tp = ctp[kept]
+        precision = np.divide(tp, kept, out=np.ones(len(kept)), where=kept > 0)
+        recall = tp / num_gt if num_gt > 0 else np.full(len(kept), np.nan)
+        f1 = np.divide(2 * precision * recall, precision + recall,
+                       out=np.zeros(len(kept)), where=(precision + recall) > 0)
+        return {'threshold': thresholds, 'precision': precision, 'recall': recall, 'f1': f1}
+
+
+def read_ground_truth(sequence_path):
+    """
+    Read the annotations of a sequence folder or packed shard
+
+    :param sequence_path: path/to/sequence_root or .shard file
+    :type sequence_path: string
+
+    :return: the annotation index, or None if the sequence is not annotated
+    :rtype: utils.annotations.AnnotationIndex
+    """
+    if os.path.isfile(sequence_path):
+        shard = ShardReader(sequence_path)
+        try:
+            data = shard.read_file('annotations/annotations.json')
+        finally:
+            shard.close()
+        return AnnotationIndex(json.loads(data)) if data is not None else None
+    annotation_path = os.path.join(sequence_path, 'annotations', 'annotations.json')
+    if not os.path.isfile(annotation_path):
+        return None
+    with open(annotation_path) as f:
+        return AnnotationIndex(json.load(f))
+
+
+def evaluate_folder(root_path, detections_folder, sets=None, weathers=None, evaluator=None,
+                    radar_timestamp_file='Navtech_Cartesian.txt'):
+    """
+    Evaluate the detection files <detections_folder>/<sequence>.npz (see
+    utils.annotations.save_detections) against the annotations of the dataset
+
+    :param root_path: path/to/radiate
+    :type root_path: string
+    :param detections_folder: folder with one npz file per sequence
+    :type detections_folder: string
+    :param sets: keep only the sequences whose meta.json 'set' is in this list
+    :type sets: list
+    :param weathers: keep only the sequences whose meta.json 'type' is in this list
+    :type weathers: list
+    :param evaluator: evaluator to fill, defaults to a DetectionEvaluator
+    :type evaluator: DetectionEvaluator
+    :param radar_timestamp_file: name of the radar timestamp file
+    :type radar_timestamp_file: string
+
+    :return: the evaluator with all the frames of the evaluated sequences
+    :rtype: DetectionEvaluator
+    """
+    if evaluator is None:
+        evaluator = DetectionEvaluator()
+    for name, path in find_sequences(root_path).items():
+        detection_path = os.path.join(detections_folder, name + '.npz')
+        if not os.path.isfile(detection_path):
+            continue
+        meta, frames, _ = read_sequence_info(path, radar_timestamp_file)
+        if sets is not None and meta.get('set') not in sets:
+            continue
+        if weathers is not None and meta.get('type') not in weathers:
+            continue
+        ground_truth = read_ground_truth(path)
+        if ground_truth is None:
+            continue
+        detections = load_detections(detection_path)
+        # annotation frames start at 0 for the radar frame 1
+        for frame in (frames - 1).tolist():
+            evaluator.add(ground_truth.get_dicts(frame), detections.get_dicts(frame),
+                          meta.get('type'))
+    return evaluator
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("root_folder", help="root folder with radiate dataset", type=str)
+    parser.add_argument("detections_folder", help="folder with one <sequence>.npz per sequence",
+                        type=str)
+    parser.add_argument("--sets", help="keep only these meta.json sets (e.g. test)",
+                        nargs='*', default=None)
+    parser.add_argument("--weathers", help="keep only these meta.json types (e.g. fog snow)",
+                        nargs='*', default=None)
+    parser.add_argument("--iou", help="IoU threshold", type=float, default=0.5)
+    parser.add_argument("--vehicle", help="merge the vehicle classes into 'vehicle' and "
+                        "ignore the others", action='store_true')
+    args = parser.parse_args()
+
+    evaluator = DetectionEvaluator(args.iou, VEHICLE_CLASS_MAP if args.vehicle else None)
+    evaluate_folder(args.root_folder, args.detections_folder, args.sets, args.weathers, evaluator)
+    print(json.dumps(evaluator.summarize(), indent=2))
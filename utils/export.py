@@ -0,0 +1,221 @@
+"""
+Headless export of rendered frames.
+
+Frames are encoded and written by a background thread pool while the caller
+keeps loading and rendering the next ones. The number of frames in flight is
+bounded, so a slow disk blocks the producer instead of filling the memory.
+
+| Outputs:
+| 'png' / 'jpg': one folder per timestamp with one image per view
+| 'png' / 'jpg' with archive=True: a single zip file with the same layout
+| 'avi': one MJPEG video per view (cv2.VideoWriter, no ffmpeg needed)
+"""
+import os
+import time
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import cv2
+
+FORMATS = ('png', 'jpg', 'avi')
+
+
+def to_uint8(image):
+    """
+    Convert an image to uint8, clipping the values to [0, 255]
+
+    :param image: image
+    :type image: np.array
+
+    :return: uint8 image
+    :rtype: np.array
+    """
+    if image.dtype == np.uint8:
+        return image
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+class FrameExporter:
+    """
+    Write rendered frames with a background thread pool
+
+    | Example:
+    | >>> with FrameExporter('exports/city_3_7', 'jpg') as exporter:
+    | >>>     for t, output in seq.iter_frames(0.25):
+    | >>>         exporter.write(t, seq.render_all(output))
+    | >>> print(exporter.stats())
+    """
+
+    def __init__(self, output_path, format='png', archive=False, workers=2, max_pending=16,
+                 png_compression=3, jpeg_quality=95, fps=4.0, fourcc='MJPG'):
+        """
+        :param output_path: output folder, or path of the zip file (without extension) when
+            archive is True
+        :type output_path: string
+        :param format: 'png', 'jpg' or 'avi'
+        :type format: string
+        :param archive: whether to store the png/jpg images in a single zip file
+        :type archive: bool
+        :param workers: number of encoding threads
+        :type workers: int
+        :param max_pending: maximum number of frames queued before write blocks
+        :type max_pending: int
+        :param png_compression: png compression level [0 9]
+        :type png_compression: int
+        :param jpeg_quality: jpeg quality [0 100]
+        :type jpeg_quality: int
+        :param fps: frame rate of the videos
+        :type fps: float
+        :param fourcc: four character code of the video codec
+        :type fourcc: string
+        """
+        if format not in FORMATS:
+            raise ValueError('unknown export format: {}'.format(format))
+        if archive and format == 'avi':
+            raise ValueError('videos cannot be archived')
+        self.output_path = output_path
+        self.format = format
+        self.archive = archive
+        self.fps = fps
+        self.fourcc = fourcc
+        if format == 'png':
+            self.encode_params = [cv2.IMWRITE_PNG_COMPRESSION, int(png_compression)]
+        elif format == 'jpg':
+            self.encode_params = [cv2.IMWRITE_JPEG_QUALITY, int(jpeg_quality)]
+        else:
+            self.encode_params = []
+
+        if archive:
+            os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+            # images are already compressed, so they are stored as they are
+            self.zip_file = zipfile.ZipFile(output_path + '.zip', 'w', zipfile.ZIP_STORED)
+        else:
+            self.zip_file = None
+            os.makedirs(output_path, exist_ok=True)
+        self.videos = {}
+
+        # a video has to receive its frames in order, so they go through a single thread
+        self.executor = ThreadPoolExecutor(1 if format == 'avi' else max(1, workers))
+        self.slots = threading.BoundedSemaphore(max(1, max_pending))
+        self.lock = threading.Lock()
+        self.futures = []
+        self.closed = False
+
+        self.queued = 0
+        self.frames = 0
+        self.images = 0
+        self.bytes = 0
+        self.blocked_time = 0.0
+        self.start_time = time.perf_counter()
+        self.end_time = None
+
+    def write(self, t, images):
+        """
+        Queue the images of one frame. Blocks while max_pending frames are in flight.
+
+        :param t: timestamp of the frame
+        :type t: float
+        :param images: dictionary with the image of each view (e.g. from Sequence.render_all)
+        :type images: dict
+        """
+        if self.closed:
+            raise RuntimeError('exporter is closed')
+        t0 = time.perf_counter()
+        self.slots.acquire()
+        self.blocked_time += time.perf_counter() - t0
+        future = self.executor.submit(self.__write_frame, str(t), dict(images))
+        future.add_done_callback(lambda _: self.slots.release())
+        self.futures.append(future)
+        self.queued += 1
+        # raise the errors of the finished frames without waiting for the others
+        while self.futures and self.futures[0].done():
+            self.futures.pop(0).result()
+
+    def __write_frame(self, name, images):
+        written = 0
+        for view, image in images.items():
+            image = to_uint8(image)
+            if self.format == 'avi':
+                written += self.__write_video(view, image)
+                continue
+            ok, data = cv2.imencode('.' + self.format, image, self.encode_params)
+            if not ok:
+                raise RuntimeError('could not encode {}/{}'.format(name, view))
+            file_name = view + '.' + self.format
+            if self.zip_file is not None:
+                with self.lock:
+                    self.zip_file.writestr(name + '/' + file_name, data.tobytes())
+            else:
+                os.makedirs(os.path.join(self.output_path, name), exist_ok=True)
+                data.tofile(os.path.join(self.output_path, name, file_name))
+            written += data.nbytes
+        with self.lock:
+            self.frames += 1
+            self.images += len(images)
+            self.bytes += written
+
+    def __write_video(self, view, image):
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        if view not in self.videos:
+            self.videos[view] = cv2.VideoWriter(
+                os.path.join(self.output_path, view + '.avi'),
+                cv2.VideoWriter_fourcc(*self.fourcc), self.fps,
+                (image.shape[1], image.shape[0]))
+        self.videos[view].write(image)
+        return image.nbytes
+
+    def close(self):
+        """
+        Wait for the queued frames and close the files
+
+        :return: statistics, see stats
+        :rtype: dict
+        """
+        if not self.closed:
+            self.closed = True
+            try:
+                for future in self.futures:
+                    future.result()
+            finally:
+                self.futures = []
+                self.executor.shutdown(wait=True)
+                for video in self.videos.values():
+                    video.release()
+                if self.zip_file is not None:
+                    self.zip_file.close()
+                self.end_time = time.perf_counter()
+        return self.stats()
+
+    def stats(self):
+        """
+        Throughput statistics
+
+        :return: dictionary with 'queued' frames, 'frames', 'images' and 'bytes' written
+            (encoded bytes, or raw frame bytes for videos), 'elapsed' seconds, written 'fps'
+            and 'mb_per_s', 'pending' frames and 'blocked' seconds the producer waited
+            because of backpressure
+        :rtype: dict
+        """
+        end_time = self.end_time if self.end_time is not None else time.perf_counter()
+        elapsed = end_time - self.start_time
+        with self.lock:
+            frames = self.frames
+            images = self.images
+            written = self.bytes
+        return {'queued': self.queued,
+                'frames': frames,
+                'images': images,
+                'bytes': written,
+                'elapsed': elapsed,
+                'fps': frames / elapsed if elapsed > 0 else 0.0,
+                'mb_per_s': written / elapsed / 1e6 if elapsed > 0 else 0.0,
+                'pending': sum(not future.done() for future in self.futures),
+                'blocked': self.blocked_time}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
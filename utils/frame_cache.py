@@ -0,0 +1,152 @@
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+def nbytes(value):
+    """
+    Approximate memory used by a value
+
+    :param value: np.array, or lists/tuples/dicts of them
+    :return: size in bytes
+    :rtype: int
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(nbytes(k) + nbytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(nbytes(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def freeze(value):
+    """
+    Hashable version of a config value (dicts and lists become tuples)
+
+    :param value: config value
+    :return: hashable value
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def _set_readonly(value):
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            _set_readonly(v)
+    elif isinstance(value, dict):
+        for v in value.values():
+            _set_readonly(v)
+
+
+class FrameCache:
+    """
+    Thread-safe LRU cache with a memory budget in bytes.
+    Cached arrays are shared between callers, so all the returned arrays are read-only.
+
+    | Example:
+    | >>> cache = FrameCache(512 * 1024**2)
+    | >>> radar = cache.get(('radar_cartesian', 10), lambda: cv2.imread(path))
+    | >>> cache.stats()
+    """
+
+    def __init__(self, max_bytes):
+        """
+        :param max_bytes: memory budget in bytes
+        :type max_bytes: int
+        """
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, fn):
+        """
+        Get the value of key, computing it with fn when it is not cached
+
+        :param key: hashable key, e.g. (sensor, frame id)
+        :param fn: function without arguments which computes the value
+        :type fn: callable
+        :return: the value
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+
+        value = fn()
+        # values are read-only even when too big to be cached, so callers get the same
+        # behaviour on hits and misses
+        _set_readonly(value)
+        size = nbytes(value)
+        if size > self.max_bytes:
+            return value
+
+        with self._lock:
+            if key in self._entries:
+                # computed meanwhile by another thread
+                return self._entries[key][0]
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        """
+        Remove all entries (statistics are kept)
+        """
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def stats(self):
+        """
+        Cache statistics
+
+        :return: dictionary with 'hits', 'misses', 'evictions', 'entries', 'bytes' and 'max_bytes'
+        :rtype: dict
+        """
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'entries': len(self._entries),
+                    'bytes': self.bytes,
+                    'max_bytes': self.max_bytes}
+
+
+def cached(cache, key, fn):
+    """
+    cache.get(key, fn), or fn() when cache is None
+
+    :param cache: cache or None
+    :type cache: FrameCache
+    :param key: hashable key
+    :param fn: function without arguments which computes the value
+    :type fn: callable
+    :return: the value
+    """
+    if cache is None:
+        return fn()
+    return cache.get(key, fn)
@@ -0,0 +1,182 @@
+import numpy as np
+
+
+def transform_points(points, M):
+    """
+    Apply a 4x4 homogeneous transformation to a batch of 3d points with a single
+    matrix multiply. The homogeneous division is only done when M is not affine.
+
+    :param points: points with shape Nx3 (x,y,z)
+    :type points: np.array
+    :param M: 4x4 transformation matrix
+    :type M: np.array
+
+    :return: transformed points with shape Nx3, with the dtype of points when it is
+        floating point (float64 otherwise)
+    :rtype: np.array
+    """
+    dtype = points.dtype if np.issubdtype(points.dtype, np.floating) else np.float64
+    M = np.asarray(M, dtype=dtype)
+    new_points = np.dot(points, M[:3, :3].T)
+    new_points += M[:3, 3]
+    if not np.array_equal(M[3], [0, 0, 0, 1]):
+        w = np.dot(points, M[3, :3]) + M[3, 3]
+        new_points /= w[:, None]
+    return new_points
+
+
+def transform_point_cloud(pc, M, dtype=None, inplace=False):
+    """
+    Transform a point cloud to another coordinate frame. Only the x,y,z columns
+    are transformed, the remaining ones (e.g. intensity and ring) are kept.
+
+    :param pc: point cloud with shape NxC (x,y,z,...), e.g. Nx5 (x,y,z,intensity,ring)
+    :type pc: np.array
+    :param M: 4x4 transformation matrix
+    :type M: np.array
+    :param dtype: dtype of the output (e.g. np.float32), None keeps the dtype of pc
+        when it is floating point and uses float64 otherwise. Ignored when inplace is True
+    :type dtype: np.dtype
+    :param inplace: whether to overwrite the x,y,z columns of pc (which must be a
+        writeable floating point array) instead of returning a copy
+    :type inplace: bool
+
+    :return: transformed point cloud with shape NxC
+    :rtype: np.array
+    """
+    if inplace:
+        if not np.issubdtype(pc.dtype, np.floating):
+            raise ValueError('inplace transform needs a floating point cloud')
+        new_pc = pc
+    else:
+        if dtype is None:
+            dtype = pc.dtype if np.issubdtype(pc.dtype, np.floating) else np.float64
+        new_pc = np.array(pc, dtype=dtype)
+    new_pc[:, :3] = transform_points(new_pc[:, :3], M)
+    return new_pc
+
+
+# order in which the 8 vertices of a pseudo 3d box are visited to draw all its edges
+# as a single polyline (bottom face 0-3, top face 4-7)
+BOX_3D_PATH = np.array([0, 1, 2, 3, 0, 4, 5, 1, 5, 6, 2, 6,
+                        7, 3, 7, 4, 3, 2, 1, 5, 2, 0])
+
+
+def boxes_from_annotations(annotations):
+    """
+    Stack the bounding boxes of a list of annotations into an array
+
+    :param annotations: list of objects in the annotations.json format, or structured
+        array from utils.annotations.AnnotationIndex.get
+    :type annotations: list
+
+    :return: boxes with shape Nx5 (x, y, width, height, angle in degrees)
+    :rtype: np.array
+    """
+    if isinstance(annotations, np.ndarray):
+        return np.stack([annotations['x'], annotations['y'], annotations['w'],
+                         annotations['h'], annotations['rotation']], axis=1).astype(np.float64)
+    boxes = np.empty((len(annotations), 5), dtype=np.float64)
+    for ii, obj in enumerate(annotations):
+        boxes[ii, :4] = obj['bbox']['position']
+        boxes[ii, 4] = obj['bbox']['rotation']
+    return boxes
+
+
+def rotated_box_corners(boxes, shrink=0.0):
+    """
+    Corners of rotated bounding boxes. Each box is rotated by -angle around its centre.
+
+    :param boxes: boxes with shape Nx5 (x, y, width, height, angle in degrees), where
+        (x, y) is the top-left corner of the unrotated box
+    :type boxes: np.array
+    :param shrink: fraction of the width/height removed from the top-left side of the
+        box before rotating it (the centre of rotation is not changed)
+    :type shrink: float
+
+    :return: corners with shape Nx4x2 (x, y) in the order top-left, top-right,
+        bottom-right, bottom-left of the unrotated box
+    :rtype: np.array
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 5)
+    x, y, w, h = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    theta = np.deg2rad(-boxes[:, 4])
+    cos = np.cos(theta)[:, None]
+    sin = np.sin(theta)[:, None]
+    cx = (x + w / 2)[:, None]
+    cy = (y + h / 2)[:, None]
+
+    x0 = x + w * shrink
+    y0 = y + h * shrink
+    x1 = x0 + (w - w * shrink)
+    y1 = y0 + (h - h * shrink)
+    dx = np.stack([x0, x1, x1, x0], axis=1) - cx
+    dy = np.stack([y0, y0, y1, y1], axis=1) - cy
+
+    corners = np.empty((boxes.shape[0], 4, 2))
+    corners[:, :, 0] = cos * dx - sin * dy + cx
+    corners[:, :, 1] = sin * dx + cos * dy + cy
+    return corners
+
+
+def pseudo_box_vertices(boxes, heights, range_res, range_cells, ground=-1.7, shrink=0.2):
+    """
+    Vertices of the pseudo 3d boxes of radar annotations, in meters in the radar frame
+
+    :param boxes: boxes in radar cartesian pixels with shape Nx5 (x, y, width, height, angle)
+    :type boxes: np.array
+    :param heights: height in meters of each object, shape N (or a scalar)
+    :type heights: np.array
+    :param range_res: radar range resolution in meters per pixel
+    :type range_res: float
+    :param range_cells: number of range cells (the radar is at pixel (range_cells, range_cells))
+    :type range_cells: int
+    :param ground: height of the bottom face in meters
+    :type ground: float
+    :param shrink: see rotated_box_corners
+    :type shrink: float
+
+    :return: vertices with shape Nx8x3, bottom face first, then the top face
+    :rtype: np.array
+    """
+    corners = rotated_box_corners(boxes, shrink)
+    vertices = np.empty((corners.shape[0], 8, 3))
+    vertices[:, :4, 0] = (corners[:, :, 0] - range_cells) * range_res
+    vertices[:, :4, 1] = (range_cells - corners[:, :, 1]) * range_res
+    vertices[:, :4, 2] = ground
+    vertices[:, 4:, :2] = vertices[:, :4, :2]
+    vertices[:, 4:, 2] = ground + np.broadcast_to(heights, corners.shape[:1])[:, None]
+    return vertices
+
+
+def project_points(points, cam_mat, extrinsic, max_dist):
+    """
+    Project 3d points into a camera
+
+    :param points: points with shape ...x3
+    :type points: np.array
+    :param cam_mat: 3x3 camera intrinsic matrix
+    :type cam_mat: np.array
+    :param extrinsic: 4x4 matrix from the points frame to the camera frame
+    :type extrinsic: np.array
+    :param max_dist: maximum depth in meters of the valid points
+    :type max_dist: float
+
+    :return: tuple (uv, depth, mask)
+        WHERE
+        np.array uv has shape ...x2 with the rounded pixel coordinates (int)
+        np.array depth has shape ... with the depth of each point in the camera frame
+        np.array mask has shape ... and is True for the points with 0 < depth < max_dist
+    :rtype: tuple
+    """
+    shape = points.shape[:-1]
+    cam_points = transform_points(points.reshape(-1, 3), extrinsic)
+    depth = cam_points[:, 2]
+    mask = (depth > 0) & (depth < max_dist)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        u = cam_mat[0, 0] * cam_points[:, 0] / depth + cam_mat[0, 2]
+        v = cam_mat[1, 1] * cam_points[:, 1] / depth + cam_mat[1, 2]
+    uv = np.zeros((cam_points.shape[0], 2), dtype=int)
+    uv[mask, 0] = np.round(u[mask])
+    uv[mask, 1] = np.round(v[mask])
+    return uv.reshape(shape + (2,)), depth.reshape(shape), mask.reshape(shape)
@@ -0,0 +1,103 @@
+import threading
+from collections.abc import MutableMapping
+
+
+class Lazy:
+    """
+    Value computed on the first call and memoised
+
+    | Example:
+    | >>> lidar = Lazy(lambda: seq.read_lidar(lidar_path))
+    | >>> lidar()  # reads the file
+    | >>> lidar()  # returns the same array
+    """
+
+    def __init__(self, fn):
+        """
+        :param fn: function without arguments which computes the value
+        :type fn: callable
+        """
+        self._fn = fn
+        self._value = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._fn is None
+
+    def __call__(self):
+        if self._fn is not None:
+            with self._lock:
+                if self._fn is not None:
+                    self._value = self._fn()
+                    self._fn = None
+        return self._value
+
+
+class LazyDict(MutableMapping):
+    """
+    Dictionary whose values are computed on first access and memoised.
+    Keys are known in advance, so iterating over keys does not compute
+    anything, while iterating over values or items does.
+
+    | Example:
+    | >>> sensors = LazyDict()
+    | >>> sensors.set_lazy('radar_cartesian', lambda: cv2.imread(path))
+    | >>> radar = sensors['radar_cartesian']  # reads the image
+    """
+
+    def __init__(self):
+        self._items = {}
+
+    def set_lazy(self, key, fn):
+        """
+        Set a value which is computed by fn on first access
+
+        :param key: key
+        :type key: string
+        :param fn: function without arguments or Lazy object
+        :type fn: callable
+        """
+        self._items[key] = fn if isinstance(fn, Lazy) else Lazy(fn)
+
+    def is_loaded(self, key):
+        """
+        Whether the value of key has already been computed
+
+        :param key: key
+        :type key: string
+        :rtype: bool
+        """
+        return self._items[key].loaded
+
+    def load(self):
+        """
+        Compute all the values
+
+        :return: self
+        :rtype: LazyDict
+        """
+        for item in self._items.values():
+            item()
+        return self
+
+    def __getitem__(self, key):
+        return self._items[key]()
+
+    def __setitem__(self, key, value):
+        item = Lazy(None)
+        item._value = value
+        self._items[key] = item
+
+    def __delitem__(self, key):
+        del self._items[key]
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __repr__(self):
+        return '{' + ', '.join('{!r}: {}'.format(key, repr(item()) if item.loaded else '<not loaded>')
+                               for key, item in self._items.items()) + '}'
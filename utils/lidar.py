@@ -0,0 +1,211 @@
+import numpy as np
+import cv2
+from utils.geometry import transform_points
+
+_circle_offsets_cache = {}
+_colormap_lut_cache = {}
+
+
+def circle_offsets(radius):
+    """
+    Pixel offsets drawn by cv2.circle for a given radius.
+
+    The stencil is obtained by drawing a single circle with OpenCV, so points
+    splatted with these offsets are identical to the ones drawn by cv2.circle.
+
+    :param radius: circle radius in pixels
+    :type radius: int
+
+    :return: offsets with shape Kx2 (dy, dx)
+    :rtype: np.array
+    """
+    radius = int(radius)
+    if radius not in _circle_offsets_cache:
+        size = 2 * radius + 3
+        canvas = np.zeros((size, size), dtype=np.uint8)
+        cv2.circle(canvas, (radius + 1, radius + 1), radius, 1)
+        dy, dx = np.nonzero(canvas)
+        _circle_offsets_cache[radius] = np.stack(
+            [dy - radius - 1, dx - radius - 1], axis=1)
+    return _circle_offsets_cache[radius]
+
+
+def colormap_lut(name='viridis'):
+    """
+    Lookup table with the 256 colours of a matplotlib colormap in BGR [0, 255]
+
+    :param name: matplotlib colormap name
+    :type name: string
+
+    :return: lookup table with shape 256x3
+    :rtype: np.array
+    """
+    if name not in _colormap_lut_cache:
+        import matplotlib.pyplot as plt
+        lut = np.array(plt.get_cmap(name)(np.arange(256))) * 255
+        _colormap_lut_cache[name] = lut[:, :3][:, ::-1].copy()
+    return _colormap_lut_cache[name]
+
+
+def splat(image, xx, yy, values, radius=1):
+    """
+    Draw all points at once in the image using the cv2.circle stencil.
+    When points overlap, the last one in the list wins, as when drawing
+    them one by one.
+
+    :param image: image with shape HxW or HxWxC, modified in place
+    :type image: np.array
+    :param xx: column of each point
+    :type xx: np.array
+    :param yy: row of each point
+    :type yy: np.array
+    :param values: value of each point, shape N or NxC
+    :type values: np.array
+    :param radius: circle radius in pixels, 0 draws a single pixel
+    :type radius: int
+
+    :return: image with the points drawn
+    :rtype: np.array
+    """
+    height, width = image.shape[:2]
+    offsets = circle_offsets(radius)
+    py = yy[:, None] + offsets[None, :, 0]
+    px = xx[:, None] + offsets[None, :, 1]
+    valid = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+    ind = np.broadcast_to(np.arange(xx.shape[0])[:, None], px.shape)[valid]
+    flat = py[valid] * width + px[valid]
+    image.reshape((height * width,) + image.shape[2:])[flat] = values[ind]
+    return image
+
+
+def project_to_camera(lidar, lidar_extrinsics, cam_intrinsic, res, max_dist,
+                      color_mode='same', point_radius=1):
+    """
+    Project a lidar point cloud into a camera image with vectorised operations
+
+    :param lidar: lidar point cloud with shape Nx5 (x,y,z,intensity,ring)
+    :type lidar: np.array
+    :param lidar_extrinsics: 4x4 matrix with lidar extrinsic parameters
+    :type lidar_extrinsics: np.array
+    :param cam_intrinsic: 3x3 matrix with camera intrinsic parameters
+    :type cam_intrinsic: np.array
+    :param res: image resolution (width, height)
+    :type res: list
+    :param max_dist: maximum depth of the projected points in meters
+    :type max_dist: float
+    :param color_mode: 'same', 'pseudo_distance' or 'distance'
+    :type color_mode: string
+    :param point_radius: radius of the drawn points in pixels for the 'same'
+        and 'pseudo_distance' modes
+    :type point_radius: int
+
+    :return: projected lidar with the same size as the camera
+    :rtype: np.array
+    """
+    fx = cam_intrinsic[0, 0]
+    fy = cam_intrinsic[1, 1]
+    cx = cam_intrinsic[0, 2]
+    cy = cam_intrinsic[1, 2]
+    width, height = res[0], res[1]
+    if color_mode == 'same' or color_mode == 'pseudo_distance':
+        im_lidar = np.zeros((height, width, 3))
+    else:
+        im_lidar = np.zeros((height, width))
+
+    points = transform_points(lidar[:, :3], lidar_extrinsics)
+
+    # keep points in front of the camera and inside the image
+    points = points[(points[:, 2] > 0) & (points[:, 2] < max_dist)]
+    xx = ((points[:, 0] * fx) / points[:, 2] + cx).astype(int)
+    yy = ((points[:, 1] * fy) / points[:, 2] + cy).astype(int)
+    in_image = (xx > 0) & (xx < width) & (yy > 0) & (yy < height)
+    points = points[in_image]
+    xx = xx[in_image]
+    yy = yy[in_image]
+
+    if color_mode == 'same':
+        colors = np.broadcast_to(np.array([0.0, 255.0, 0.0]), points.shape)
+        splat(im_lidar, xx, yy, colors, point_radius)
+    else:
+        dist = np.sqrt(points[:, 0]*points[:, 0] +
+                       points[:, 1]*points[:, 1] +
+                       points[:, 2]*points[:, 2])
+        if color_mode == 'pseudo_distance':
+            norm_dist = ((dist/max_dist)*255).astype(np.uint8)
+            splat(im_lidar, xx, yy, colormap_lut('viridis')[norm_dist],
+                  point_radius)
+        elif color_mode == 'distance':
+            im_lidar[yy, xx] = dist
+
+    return im_lidar
+
+
+def bev_image(lidar, res, remove_ground=True, ground_thresh=1.5, use_ring=True,
+              channels=(), point_radius=1, max_range=100.0):
+    """
+    Rasterise a lidar point cloud into a bird's eye view image with vectorised
+    operations. Optional per-cell channels are computed in the same pass.
+
+    :param lidar: lidar point cloud with shape Nx5 (x,y,z,intensity,ring)
+    :type lidar: np.array
+    :param res: image resolution (rows, columns)
+    :type res: list
+    :param remove_ground: whether to discard points below -ground_thresh
+    :type remove_ground: bool
+    :param ground_thresh: ground height threshold in meters
+    :type ground_thresh: float
+    :param use_ring: whether to encode the ring (True) or the intensity (False)
+    :type use_ring: bool
+    :param channels: extra channels to compute, any of 'max_height', 'density'
+        and 'max_intensity'
+    :type channels: list
+    :param point_radius: radius in pixels of each drawn point
+    :type point_radius: int
+    :param max_range: distance in meters from the centre to the image border
+    :type max_range: float
+
+    :return: tuple (image, extra)
+        WHERE
+        np.array image is the uint8 bird's eye view image with shape res[0]xres[1]x3
+        dict extra maps each requested channel to a float32 array with shape res[0]xres[1]
+    :rtype: tuple
+    """
+    h_width = res[0]/2.0
+    h_height = res[1]/2.0
+    cell_res_x = max_range/h_width
+    cell_res_y = max_range/h_height
+
+    if remove_ground:
+        lidar = lidar[lidar[:, 2] > -ground_thresh]
+
+    xx = (lidar[:, 0]/cell_res_x + h_width).astype(int)
+    yy = (h_height - lidar[:, 1]/cell_res_y).astype(int)
+    if use_ring:
+        values = lidar[:, 4].astype(int) * 8
+    else:
+        values = lidar[:, 3].astype(int)
+
+    gray = np.zeros((res[0], res[1]), dtype=np.uint8)
+    splat(gray, xx, yy, values.astype(np.uint8), point_radius)
+    image = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+
+    extra = {}
+    if len(channels) > 0:
+        in_image = (xx >= 0) & (xx < res[1]) & (yy >= 0) & (yy < res[0])
+        cells = yy[in_image] * res[1] + xx[in_image]
+        for channel in channels:
+            if channel == 'density':
+                counts = np.bincount(cells, minlength=res[0] * res[1])
+                extra[channel] = counts.reshape(res[0], res[1]).astype(np.float32)
+            elif channel == 'max_height' or channel == 'max_intensity':
+                column = 2 if channel == 'max_height' else 3
+                feature = lidar[in_image, column]
+                # assigning in ascending order leaves the maximum in each cell
+                order = np.argsort(feature, kind='stable')
+                out = np.zeros(res[0] * res[1], dtype=np.float32)
+                out[cells[order]] = feature[order]
+                extra[channel] = out.reshape(res[0], res[1])
+            else:
+                raise ValueError('Unknown bird\'s eye view channel: ' + channel)
+
+    return image, extra
@@ -0,0 +1,192 @@
+"""
+Binary cache for the lidar point clouds of a sequence.
+
+The csv files in 'velo_lidar' are converted once into a flat binary file
+inside 'velo_lidar_cache': 'points.bin' (float64 x,y,z,intensity,ring, the values
+and dtype of the parsed csv files), plus 'index.npy' with one row (frame, start,
+count) per frame. Frames are read back as np.memmap views without parsing or copying.
+
+| Example (convert all sequences of the dataset):
+| $ python -m utils.lidar_cache data/radiate/
+"""
+import os
+import shutil
+import argparse
+import numpy as np
+
+CACHE_FOLDER = 'velo_lidar_cache'
+POINTS_FILE = 'points.bin'
+
+
+def read_csv(lidar_path):
+    """
+    Read a lidar csv file
+
+    :param lidar_path: path to lidar csv file
+    :type lidar_path: string
+
+    :return: lidar point cloud Nx5 (x,y,z,intensity,ring)
+    :rtype: np.array
+    """
+    import pandas as pd
+    return pd.read_csv(lidar_path, delimiter=',').values
+
+
+class LidarCache:
+    """
+    Memory-mapped access to the binary lidar cache of one sequence
+
+    | Example:
+    | >>> cache = LidarCache.open('path/to/radiate/city_3_7/')
+    | >>> lidar = cache.read(1)
+    | >>> xyzi, ring = cache.get(1)
+    """
+
+    def __init__(self, cache_path):
+        """
+        :param cache_path: path/to/sequence_root/velo_lidar_cache
+        :type cache_path: string
+        """
+        self.cache_path = cache_path
+        index = np.load(os.path.join(cache_path, 'index.npy'))
+        self.rows = {int(frame): (int(start), int(count))
+                     for frame, start, count in index}
+        num_points = int(index[:, 2].sum()) if index.shape[0] > 0 else 0
+        if num_points > 0:
+            self.points = np.memmap(os.path.join(cache_path, POINTS_FILE),
+                                    dtype=np.float64, mode='r', shape=(num_points, 5))
+        else:
+            self.points = np.zeros((0, 5))
+            self.points.flags.writeable = False
+
+    @classmethod
+    def open(cls, sequence_path):
+        """
+        Open the cache of a sequence
+
+        :param sequence_path: path/to/sequence_root
+        :type sequence_path: string
+
+        :return: the cache or None if the sequence was not converted (or was converted
+            to an older layout)
+        :rtype: LidarCache
+        """
+        cache_path = os.path.join(sequence_path, CACHE_FOLDER)
+        if is_current(cache_path):
+            return cls(cache_path)
+        return None
+
+    def __contains__(self, frame):
+        return frame in self.rows
+
+    def get(self, frame):
+        """
+        Zero-copy views of one frame
+
+        :param frame: lidar frame number
+        :type frame: int
+
+        :return: tuple (xyzi, ring)
+            WHERE
+            np.memmap xyzi is a read-only Nx4 float64 view with x,y,z,intensity
+            np.memmap ring is a read-only N float64 view with the ring of each point
+        :rtype: tuple
+        """
+        lidar = self.read(frame)
+        return lidar[:, :4], lidar[:, 4]
+
+    def read(self, frame):
+        """
+        Zero-copy view of one frame, with the layout, dtype and values of the csv file
+
+        :param frame: lidar frame number
+        :type frame: int
+
+        :return: read-only lidar point cloud Nx5 float64 (x,y,z,intensity,ring)
+        :rtype: np.memmap
+        """
+        start, count = self.rows[frame]
+        return self.points[start:start + count]
+
+
+def is_current(cache_path):
+    """
+    Whether a cache folder was written with the current layout
+
+    :param cache_path: path/to/sequence_root/velo_lidar_cache
+    :type cache_path: string
+
+    :rtype: bool
+    """
+    return (os.path.exists(os.path.join(cache_path, 'index.npy')) and
+            os.path.exists(os.path.join(cache_path, POINTS_FILE)))
+
+
+def convert_sequence(sequence_path, overwrite=False):
+    """
+    Convert all lidar csv files of a sequence into the binary cache
+
+    :param sequence_path: path/to/sequence_root
+    :type sequence_path: string
+    :param overwrite: whether to rebuild an existing cache
+    :type overwrite: bool
+
+    :return: path to the cache folder
+    :rtype: string
+    """
+    cache_path = os.path.join(sequence_path, CACHE_FOLDER)
+    if os.path.exists(cache_path):
+        # caches with an older layout are rebuilt
+        if not overwrite and is_current(cache_path):
+            return cache_path
+        shutil.rmtree(cache_path)
+
+    # write into a temporary folder so a partial cache is never opened
+    tmp_path = cache_path + '.tmp'
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    lidar_folder = os.path.join(sequence_path, 'velo_lidar')
+    lidar_files = sorted(f for f in os.listdir(lidar_folder)
+                         if f.endswith('.csv'))
+    index = []
+    start = 0
+    with open(os.path.join(tmp_path, POINTS_FILE), 'wb') as f_points:
+        for lidar_file in lidar_files:
+            lidar = read_csv(os.path.join(lidar_folder, lidar_file))
+            np.ascontiguousarray(lidar, dtype=np.float64).tofile(f_points)
+            frame = int(os.path.splitext(lidar_file)[0])
+            index.append([frame, start, lidar.shape[0]])
+            start += lidar.shape[0]
+    np.save(os.path.join(tmp_path, 'index.npy'),
+            np.array(index, dtype=np.int64).reshape(-1, 3))
+
+    os.rename(tmp_path, cache_path)
+    return cache_path
+
+
+def convert_dataset(root_path, overwrite=False):
+    """
+    Convert the lidar of every sequence inside the dataset root folder
+
+    :param root_path: path/to/radiate
+    :type root_path: string
+    :param overwrite: whether to rebuild existing caches
+    :type overwrite: bool
+    """
+    for sequence in sorted(os.listdir(root_path)):
+        sequence_path = os.path.join(root_path, sequence)
+        if os.path.isdir(os.path.join(sequence_path, 'velo_lidar')):
+            print('Converting', sequence)
+            convert_sequence(sequence_path, overwrite)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("root_folder", help="root folder with radiate dataset",
+                        type=str)
+    parser.add_argument("--overwrite", help="rebuild existing caches",
+                        action='store_true')
+    args = parser.parse_args()
+    convert_dataset(args.root_folder, args.overwrite)
@@ -0,0 +1,347 @@
+"""
+GPS/IMU odometry of a sequence.
+
+The per-frame files of 'GPS_IMU_Twist' are parsed once into contiguous arrays,
+which are cached in 'GPS_IMU_Twist.npz' inside the sequence folder (nothing is
+written for packed sequences or read-only folders). Poses at any batch of
+timestamps are then interpolated without touching the text files.
+
+| Example:
+| >>> odometry = Odometry.open('path/to/radiate/city_3_7/')
+| >>> poses = odometry.pose_at(np.linspace(t0, t1, 1000))
+| >>> poses['position']  # 1000x3 east, north, up in meters
+"""
+import os
+import numpy as np
+from utils.shard import read_timestamp_table
+
+FOLDER = 'GPS_IMU_Twist'
+TIMESTAMP_FILE = 'GPS_IMU_Twist.txt'
+CACHE_FILE = 'GPS_IMU_Twist.npz'
+
+# number of values of each field, in the order of the lines of the files
+FIELDS = (('lla', 3),
+          ('position_covariance', 9),
+          ('orientation', 4),
+          ('angular_velocity', 3),
+          ('linear_acceleration', 3),
+          ('orientation_covariance', 9),
+          ('angular_velocity_covariance', 9),
+          ('linear_acceleration_covariance', 9),
+          ('twist_linear', 3),
+          ('twist_angular', 3))
+NUM_VALUES = sum(size for _, size in FIELDS)
+
+# WGS84 ellipsoid
+EARTH_A = 6378137.0
+EARTH_E2 = 6.69437999014e-3
+
+
+def parse_record(data):
+    """
+    Parse the content of one GPS_IMU_Twist file
+
+    :param data: file content
+    :type data: bytes
+
+    :return: the NUM_VALUES values of the file, in file order
+    :rtype: np.array
+    """
+    values = [float(v) for v in data.replace(b'\n', b',').split(b',') if v.strip()]
+    if len(values) != NUM_VALUES:
+        raise ValueError('expected {} values in a GPS/IMU file, got {}'.format(
+            NUM_VALUES, len(values)))
+    return np.array(values)
+
+
+def lla_to_enu(lla, origin):
+    """
+    Convert latitude, longitude and altitude into a local east, north, up frame
+    (tangent plane at the origin, accurate for the extent of a sequence)
+
+    :param lla: Nx3 latitude, longitude (degrees) and altitude (meters)
+    :type lla: np.array
+    :param origin: latitude, longitude and altitude of the origin
+    :type origin: np.array
+
+    :return: Nx3 east, north, up in meters
+    :rtype: np.array
+    """
+    lat0 = np.deg2rad(origin[0])
+    sin_lat = np.sin(lat0)
+    # radii of curvature of the meridian and of the prime vertical
+    w = np.sqrt(1 - EARTH_E2 * sin_lat * sin_lat)
+    r_north = EARTH_A * (1 - EARTH_E2) / w ** 3
+    r_east = EARTH_A / w * np.cos(lat0)
+    enu = np.empty((len(lla), 3))
+    enu[:, 0] = np.deg2rad(lla[:, 1] - origin[1]) * r_east
+    enu[:, 1] = np.deg2rad(lla[:, 0] - origin[0]) * r_north
+    enu[:, 2] = lla[:, 2] - origin[2]
+    return enu
+
+
+def slerp(q0, q1, alpha):
+    """
+    Spherical linear interpolation of quaternions
+
+    :param q0: Nx4 quaternions (x, y, z, w)
+    :type q0: np.array
+    :param q1: Nx4 quaternions (x, y, z, w)
+    :type q1: np.array
+    :param alpha: N interpolation weights in [0 1]
+    :type alpha: np.array
+
+    :return: Nx4 unit quaternions
+    :rtype: np.array
+    """
+    dot = np.sum(q0 * q1, axis=1)
+    # take the shortest path
+    q1 = np.where(dot[:, None] < 0, -q1, q1)
+    dot = np.abs(dot)
+    theta = np.arccos(np.clip(dot, -1.0, 1.0))
+    sin_theta = np.sin(theta)
+    # nearly equal quaternions are linearly interpolated
+    near = sin_theta < 1e-6
+    safe = np.where(near, 1.0, sin_theta)
+    w0 = np.where(near, 1 - alpha, np.sin((1 - alpha) * theta) / safe)
+    w1 = np.where(near, alpha, np.sin(alpha * theta) / safe)
+    q = w0[:, None] * q0 + w1[:, None] * q1
+    return q / np.linalg.norm(q, axis=1, keepdims=True)
+
+
+def quaternion_to_matrix(q):
+    """
+    Rotation matrices of quaternions
+
+    :param q: Nx4 quaternions (x, y, z, w)
+    :type q: np.array
+
+    :return: Nx3x3 rotation matrices
+    :rtype: np.array
+    """
+    q = q / np.linalg.norm(q, axis=1, keepdims=True)
+    x, y, z, w = q[:, 0], q[:, 1], q[:, 2], q[:, 3]
+    R = np.empty((len(q), 3, 3))
+    R[:, 0, 0] = 1 - 2 * (y * y + z * z)
+    R[:, 0, 1] = 2 * (x * y - z * w)
+    R[:, 0, 2] = 2 * (x * z + y * w)
+    R[:, 1, 0] = 2 * (x * y + z * w)
+    R[:, 1, 1] = 1 - 2 * (x * x + z * z)
+    R[:, 1, 2] = 2 * (y * z - x * w)
+    R[:, 2, 0] = 2 * (x * z - y * w)
+    R[:, 2, 1] = 2 * (y * z + x * w)
+    R[:, 2, 2] = 1 - 2 * (x * x + y * y)
+    return R
+
+
+def pose_matrices(position, orientation):
+    """
+    Homogeneous transforms from the vehicle to the local frame
+
+    :param position: Nx3 positions
+    :type position: np.array
+    :param orientation: Nx4 quaternions (x, y, z, w)
+    :type orientation: np.array
+
+    :return: Nx4x4 transforms
+    :rtype: np.array
+    """
+    T = np.zeros((len(position), 4, 4))
+    T[:, :3, :3] = quaternion_to_matrix(orientation)
+    T[:, :3, 3] = position
+    T[:, 3, 3] = 1
+    return T
+
+
+class Odometry:
+    """
+    All the GPS/IMU records of a sequence, sorted by time
+
+    | Attributes:
+    | frames, times: frame number and timestamp of each record
+    | lla: Nx3 latitude, longitude, altitude; position: Nx3 east, north, up (meters)
+    |   relative to the first record
+    | orientation: Nx4 quaternions (x, y, z, w); angular_velocity, linear_acceleration,
+    |   twist_linear, twist_angular: Nx3; *_covariance: Nx3x3
+    """
+
+    def __init__(self, arrays):
+        """
+        :param arrays: dictionary with 'frames', 'times' and the fields of FIELDS
+        :type arrays: dict
+        """
+        order = np.argsort(arrays['times'], kind='stable')
+        self.frames = np.ascontiguousarray(arrays['frames'][order], dtype=np.int64)
+        self.times = np.ascontiguousarray(arrays['times'][order], dtype=np.float64)
+        for name, size in FIELDS:
+            values = np.ascontiguousarray(arrays[name][order], dtype=np.float64)
+            setattr(self, name, values.reshape(-1, 3, 3) if size == 9 else values)
+        self.origin = self.lla[0].copy() if len(self.lla) > 0 else np.zeros(3)
+        self.position = lla_to_enu(self.lla, self.origin)
+
+    @classmethod
+    def open(cls, sequence_path, shard=None, use_cache=True):
+        """
+        Load the odometry of a sequence, from the binary cache when it is up to date
+
+        :param sequence_path: path/to/sequence_root
+        :type sequence_path: string
+        :param shard: packed sequence to read the files from (None reads the folder)
+        :type shard: utils.shard.ShardReader
+        :param use_cache: whether to read and write the binary cache
+        :type use_cache: bool
+
+        :return: the odometry, or None if the sequence has no GPS/IMU data
+        :rtype: Odometry
+        """
+        if shard is not None:
+            if FOLDER not in shard.rows or TIMESTAMP_FILE not in shard.tables:
+                return None
+            return cls(read_records(shard.timestamps(TIMESTAMP_FILE),
+                                    lambda frame: shard.get(FOLDER, frame).tobytes()))
+
+        timestamp_path = os.path.join(sequence_path, TIMESTAMP_FILE)
+        folder = os.path.join(sequence_path, FOLDER)
+        if not os.path.isfile(timestamp_path) or not os.path.isdir(folder):
+            return None
+        cache_path = os.path.join(sequence_path, CACHE_FILE)
+        key = cache_key(timestamp_path, folder)
+        if use_cache and os.path.isfile(cache_path):
+            try:
+                with np.load(cache_path) as data:
+                    if str(data['key']) == key:
+                        return cls({name: data[name] for name in data.files})
+            except (OSError, KeyError, ValueError):
+                pass
+
+        with open(timestamp_path, 'rb') as f:
+            table = read_timestamp_table(f.read())
+
+        def read_file(frame):
+            with open(os.path.join(folder, '{:06d}.txt'.format(frame)), 'rb') as f:
+                return f.read()
+
+        arrays = read_records(table, read_file)
+        if use_cache:
+            save_cache(cache_path, arrays, key)
+        return cls(arrays)
+
+    def __len__(self):
+        return len(self.times)
+
+    def pose_at(self, ts):
+        """
+        Interpolate the pose at a batch of timestamps: positions and velocities are
+        linearly interpolated and orientations are slerped. Timestamps outside the
+        records get the first/last pose and are flagged in 'valid'.
+
+        :param ts: timestamps
+        :type ts: np.array
+
+        :return: dictionary with 't' (N), 'position' (Nx3 east, north, up in meters),
+            'lla' (Nx3), 'orientation' (Nx4 quaternions x, y, z, w), 'linear_velocity'
+            and 'angular_velocity' (Nx3, from the twist) and 'valid' (N, whether the
+            timestamp is inside the records)
+        :rtype: dict
+        """
+        ts = np.atleast_1d(np.asarray(ts, dtype=np.float64))
+        if len(self.times) == 0:
+            raise ValueError('no GPS/IMU records')
+        if len(self.times) == 1:
+            i0 = i1 = np.zeros(len(ts), dtype=np.int64)
+            alpha = np.zeros(len(ts))
+        else:
+            i0 = np.clip(np.searchsorted(self.times, ts, side='right') - 1,
+                         0, len(self.times) - 2)
+            i1 = i0 + 1
+            dt = self.times[i1] - self.times[i0]
+            # some consecutive records share the same timestamp
+            alpha = np.divide(ts - self.times[i0], dt, out=np.zeros(len(ts)), where=dt > 0)
+            alpha = np.clip(alpha, 0.0, 1.0)
+
+        def lerp(values):
+            return values[i0] + alpha[:, None] * (values[i1] - values[i0])
+
+        return {'t': ts,
+                'position': lerp(self.position),
+                'lla': lerp(self.lla),
+                'orientation': slerp(self.orientation[i0], self.orientation[i1], alpha),
+                'linear_velocity': lerp(self.twist_linear),
+                'angular_velocity': lerp(self.twist_angular),
+                'valid': (ts >= self.times[0]) & (ts <= self.times[-1])}
+
+    def transforms_at(self, ts):
+        """
+        Transforms from the vehicle to the local east, north, up frame
+
+        :param ts: timestamps
+        :type ts: np.array
+
+        :return: Nx4x4 transforms
+        :rtype: np.array
+        """
+        poses = self.pose_at(ts)
+        return pose_matrices(poses['position'], poses['orientation'])
+
+
+def read_records(table, read_file):
+    """
+    Parse all the GPS/IMU files of a sequence
+
+    :param table: Nx2 (frame, time) from the timestamp file
+    :type table: np.array
+    :param read_file: function returning the content of the file of a frame
+    :type read_file: function
+
+    :return: dictionary with 'frames', 'times' and the fields of FIELDS
+    :rtype: dict
+    """
+    values = np.empty((len(table), NUM_VALUES))
+    for ii, frame in enumerate(table[:, 0].astype(np.int64).tolist()):
+        values[ii] = parse_record(read_file(frame))
+    arrays = {'frames': table[:, 0].astype(np.int64), 'times': table[:, 1]}
+    start = 0
+    for name, size in FIELDS:
+        arrays[name] = values[:, start:start + size]
+        start += size
+    return arrays
+
+
+def cache_key(timestamp_path, folder):
+    """
+    Signature of the GPS/IMU files, used to invalidate the cache
+
+    :param timestamp_path: path to GPS_IMU_Twist.txt
+    :type timestamp_path: string
+    :param folder: path to the GPS_IMU_Twist folder
+    :type folder: string
+
+    :return: signature
+    :rtype: string
+    """
+    signature = []
+    for path in [timestamp_path, folder]:
+        stat = os.stat(path)
+        signature.append('{}:{}'.format(stat.st_mtime_ns, stat.st_size))
+    return '|'.join(signature)
+
+
+def save_cache(cache_path, arrays, key):
+    """
+    Write the binary cache (nothing is written if the folder is read-only)
+
+    :param cache_path: cache file
+    :type cache_path: string
+    :param arrays: arrays returned by read_records
+    :type arrays: dict
+    :param key: signature of the files, see cache_key
+    :type key: string
+    """
+    # np.savez appends .npz to names without it, so keep the suffix on the temp file
+    tmp_path = '{}.{}.tmp.npz'.format(cache_path[:-len('.npz')], os.getpid())
+    try:
+        np.savez(tmp_path, key=np.array(key), **arrays)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
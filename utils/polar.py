@@ -0,0 +1,151 @@
+import numpy as np
+import cv2
+
+INTERPOLATIONS = {'nearest': cv2.INTER_NEAREST,
+                  'linear': cv2.INTER_LINEAR,
+                  'cubic': cv2.INTER_CUBIC}
+
+
+def polar_to_cartesian_maps(range_res, range_cells, azimuth_cells, cart_res=None,
+                            max_range=None, fixed_point=True, nearest=False):
+    """
+    Compute the cv2.remap lookup tables from a polar radar image (one row per range cell,
+    one column per azimuth, clockwise from the front) to a cartesian image centred on the
+    radar, with the front of the vehicle upwards.
+
+    The polar image is expected with one wrapped column on each side (see
+    PolarToCartesian.pad), so the interpolation is continuous at azimuth 0.
+
+    :param range_res: range resolution in meters
+    :type range_res: float
+    :param range_cells: number of range cells (rows of the polar image)
+    :type range_cells: int
+    :param azimuth_cells: number of azimuths (columns of the polar image)
+    :type azimuth_cells: int
+    :param cart_res: meters per cartesian pixel, defaults to range_res
+    :type cart_res: float
+    :param max_range: half the side of the cartesian image in meters, defaults to the
+        range of the radar (range_res * range_cells)
+    :type max_range: float
+    :param fixed_point: whether to convert the maps to fixed-point (CV_16SC2),
+        which makes cv2.remap faster
+    :type fixed_point: bool
+    :param nearest: whether the maps are used with cv2.INTER_NEAREST (fixed-point maps
+        are then rounded instead of truncated)
+    :type nearest: bool
+
+    :return: tuple (map1, map2) for cv2.remap
+    :rtype: tuple
+    """
+    if cart_res is None:
+        cart_res = range_res
+    if max_range is None:
+        max_range = range_res * range_cells
+    size = int(round(2 * max_range / cart_res))
+
+    # metric position of the pixel centres, x to the right and y to the front
+    coords = (np.arange(size, dtype=np.float64) + 0.5 - size / 2) * cart_res
+    x = coords[None, :]
+    y = -coords[:, None]
+    rng = np.sqrt(x * x + y * y) / range_res
+    azimuth = np.mod(np.arctan2(x, y), 2 * np.pi) * (azimuth_cells / (2 * np.pi))
+    # azimuth cell k is centred at (k + 0.5) steps, +1 for the wrapped column
+    map_x = (azimuth + 0.5).astype(np.float32)
+    map_y = np.broadcast_to(rng, (size, size)).astype(np.float32)
+    if fixed_point:
+        return cv2.convertMaps(map_x, map_y, cv2.CV_16SC2, nninterpolation=nearest)
+    return map_x, map_y
+
+
+class PolarToCartesian:
+    """
+    Polar to cartesian conversion of radar images. The lookup tables are computed once
+    and reused for every frame.
+
+    | Example (images at 0.5 m per pixel up to 50 m):
+    | >>> converter = PolarToCartesian(0.173611, 576, 400, cart_res=0.5, max_range=50)
+    | >>> cartesian = converter(polar)  # 200x200
+    """
+
+    def __init__(self, range_res, range_cells, azimuth_cells, cart_res=None, max_range=None,
+                 interpolation='linear', fixed_point=True):
+        """
+        :param range_res: range resolution in meters
+        :type range_res: float
+        :param range_cells: number of range cells (rows of the polar image)
+        :type range_cells: int
+        :param azimuth_cells: number of azimuths (columns of the polar image)
+        :type azimuth_cells: int
+        :param cart_res: meters per cartesian pixel, defaults to range_res
+        :type cart_res: float
+        :param max_range: half the side of the cartesian image in meters, defaults to the
+            range of the radar
+        :type max_range: float
+        :param interpolation: 'nearest', 'linear' or 'cubic'
+        :type interpolation: string
+        :param fixed_point: whether to use fixed-point maps
+        :type fixed_point: bool
+        """
+        self.range_res = range_res
+        self.range_cells = range_cells
+        self.azimuth_cells = azimuth_cells
+        self.cart_res = range_res if cart_res is None else cart_res
+        self.max_range = range_res * range_cells if max_range is None else max_range
+        self.size = int(round(2 * self.max_range / self.cart_res))
+        self.interpolation = INTERPOLATIONS[interpolation]
+        self.map1, self.map2 = polar_to_cartesian_maps(
+            range_res, range_cells, azimuth_cells, self.cart_res, self.max_range, fixed_point,
+            self.interpolation == cv2.INTER_NEAREST)
+
+    def pad(self, polar):
+        """
+        Wrap one azimuth on each side of the polar image
+
+        :param polar: polar image (range x azimuth)
+        :type polar: np.array
+
+        :return: polar image with azimuth_cells + 2 columns
+        :rtype: np.array
+        """
+        return cv2.copyMakeBorder(polar, 0, 0, 1, 1, cv2.BORDER_WRAP)
+
+    def __call__(self, polar):
+        """
+        Convert a polar image
+
+        :param polar: polar image (range x azimuth), with any number of channels
+        :type polar: np.array
+
+        :return: cartesian image with shape size x size, 0 beyond the radar range
+        :rtype: np.array
+        """
+        if polar.shape[0] != self.range_cells or polar.shape[1] != self.azimuth_cells:
+            raise ValueError('expected a polar image with {}x{} cells, got {}x{}'.format(
+                self.range_cells, self.azimuth_cells, polar.shape[0], polar.shape[1]))
+        return cv2.remap(self.pad(polar), self.map1, self.map2, self.interpolation,
+                         borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+
+    def transform_annotations(self, annotations, res, size):
+        """
+        Move annotations from another cartesian grid centred on the radar (e.g. the
+        Navtech_Cartesian images) to the grid of this converter
+
+        :param annotations: annotations in the annotations.json format
+        :type annotations: list
+        :param res: meters per pixel of the grid of the annotations
+        :type res: float
+        :param size: side in pixels of the grid of the annotations
+        :type size: int
+
+        :return: new annotations (the input is not modified)
+        :rtype: list
+        """
+        scale = res / self.cart_res
+        offset = self.size / 2 - size / 2 * scale
+        transformed = []
+        for obj in annotations:
+            x, y, w, h = obj['bbox']['position']
+            transformed.append(dict(obj, bbox={
+                'position': [x * scale + offset, y * scale + offset, w * scale, h * scale],
+                'rotation': obj['bbox']['rotation']}))
+        return transformed
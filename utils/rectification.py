@@ -0,0 +1,108 @@
+import os
+import hashlib
+import numpy as np
+import cv2
+
+
+def calib_hash(calib, fixed_point=True):
+    """
+    Hash of the calibration parameters used by the stereo rectification
+
+    :param calib: calibration object
+    :type calib: Calibration
+    :param fixed_point: whether the maps are converted to fixed-point
+    :type fixed_point: bool
+
+    :return: hexadecimal hash
+    :rtype: string
+    """
+    h = hashlib.sha1()
+    for arr in [calib.left_cam_mat, calib.left_cam_dist,
+                calib.right_cam_mat, calib.right_cam_dist,
+                calib.left_cam_res, calib.stereoR, calib.stereoT]:
+        h.update(np.ascontiguousarray(arr, dtype=np.float64).tobytes())
+    h.update(b'fixed' if fixed_point else b'float')
+    return h.hexdigest()
+
+
+def compute_rectification_maps(calib, fixed_point=True):
+    """
+    Compute the stereo rectification maps
+
+    :param calib: calibration object
+    :type calib: Calibration
+    :param fixed_point: whether to convert the maps to fixed-point (CV_16SC2),
+        which makes cv2.remap faster
+    :type fixed_point: bool
+
+    :return: dictionary with 'left_map1', 'left_map2', 'right_map1', 'right_map2'
+        and 'disp_to_depth'
+    :rtype: dict
+    """
+    (leftRectification, rightRectification, leftProjection,
+     rightProjection, dispartityToDepthMap, leftROI, rightROI) = cv2.stereoRectify(
+        cameraMatrix1=calib.left_cam_mat,
+        distCoeffs1=calib.left_cam_dist,
+        cameraMatrix2=calib.right_cam_mat,
+        distCoeffs2=calib.right_cam_dist,
+        imageSize=tuple(calib.left_cam_res),
+        R=calib.stereoR,
+        T=calib.stereoT,
+        flags=cv2.CALIB_ZERO_DISPARITY,
+        alpha=0
+    )
+
+    leftMapX, leftMapY = cv2.initUndistortRectifyMap(
+        calib.left_cam_mat,
+        calib.left_cam_dist,
+        leftRectification,
+        leftProjection, tuple(calib.left_cam_res), cv2.CV_32FC1)
+
+    rightMapX, rightMapY = cv2.initUndistortRectifyMap(
+        calib.right_cam_mat,
+        calib.left_cam_dist,
+        rightRectification,
+        rightProjection, tuple(calib.left_cam_res), cv2.CV_32FC1)
+
+    if fixed_point:
+        leftMapX, leftMapY = cv2.convertMaps(
+            leftMapX, leftMapY, cv2.CV_16SC2)
+        rightMapX, rightMapY = cv2.convertMaps(
+            rightMapX, rightMapY, cv2.CV_16SC2)
+
+    return {'left_map1': leftMapX, 'left_map2': leftMapY,
+            'right_map1': rightMapX, 'right_map2': rightMapY,
+            'disp_to_depth': dispartityToDepthMap}
+
+
+def load_rectification_maps(calib, fixed_point=True, cache_folder=None):
+    """
+    Get the stereo rectification maps, using an on-disk cache keyed by the
+    calibration hash when cache_folder is given
+
+    :param calib: calibration object
+    :type calib: Calibration
+    :param fixed_point: whether to use fixed-point maps
+    :type fixed_point: bool
+    :param cache_folder: folder where the maps are cached, None disables the cache
+    :type cache_folder: string
+
+    :return: dictionary with the maps (see compute_rectification_maps)
+    :rtype: dict
+    """
+    if not cache_folder:
+        return compute_rectification_maps(calib, fixed_point)
+
+    cache_file = os.path.join(
+        cache_folder, 'rect_' + calib_hash(calib, fixed_point) + '.npz')
+    if os.path.exists(cache_file):
+        with np.load(cache_file) as data:
+            return {key: data[key] for key in data.files}
+
+    maps = compute_rectification_maps(calib, fixed_point)
+    os.makedirs(cache_folder, exist_ok=True)
+    # np.savez appends .npz to names without it, so keep the suffix on the temp file
+    tmp_file = '{}.{}.tmp.npz'.format(cache_file[:-len('.npz')], os.getpid())
+    np.savez(tmp_file, **maps)
+    os.replace(tmp_file, cache_file)
+    return maps
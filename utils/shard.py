@@ -0,0 +1,328 @@
+"""
+Packed single-file format for a whole sequence.
+
+A sequence folder (tens of thousands of small files) is packed into one
+'.shard' file, which is then read through mmap with random access:
+
+| header: magic (8 bytes)
+| data: the frames of every sensor folder, aligned to 64 bytes. Images keep their
+|       encoded bytes, lidar point clouds are stored as float64 Nx5 arrays (the
+|       values and dtype of the parsed csv files)
+| index: npz with (sensor, frame) -> (offset, length), the other files of the
+|        sequence (timestamps, annotations, meta.json) and the parsed timestamp tables
+| footer: index offset and length (uint64) and magic
+
+| Example (pack all sequences of the dataset):
+| $ python -m utils.shard data/radiate/
+| >>> seq = radiate.Sequence('data/radiate/city_3_7.shard')
+"""
+import io
+import os
+import mmap
+import argparse
+import numpy as np
+import cv2
+from utils.lidar_cache import read_csv
+
+MAGIC = b'RADSHRD2'
+# shards written with float32 point clouds
+OLD_MAGICS = [b'RADSHRD1']
+EXTENSION = '.shard'
+ALIGNMENT = 64
+
+# sensor folder -> (file extension, kind of data)
+SENSOR_FOLDERS = {'Navtech_Cartesian': ('.png', 'image'),
+                  'Navtech_Polar': ('.png', 'image'),
+                  'zed_left': ('.png', 'image'),
+                  'zed_right': ('.png', 'image'),
+                  'velo_lidar': ('.csv', 'lidar'),
+                  'GPS_IMU_Twist': ('.txt', 'file')}
+
+ENTRY_DTYPE = np.dtype([('sensor', np.int32),
+                        ('frame', np.int64),
+                        ('offset', np.int64),
+                        ('length', np.int64)])
+
+
+def shard_path(sequence_path):
+    """
+    Default path of the shard of a sequence folder (next to the folder)
+
+    :param sequence_path: path/to/sequence_root
+    :type sequence_path: string
+
+    :return: path/to/sequence_root.shard
+    :rtype: string
+    """
+    return os.path.normpath(sequence_path) + EXTENSION
+
+
+def read_timestamp_table(data):
+    """
+    Parse the content of a timestamp file
+
+    :param data: content of a file with lines 'Frame: 000001 Time: 1574859772.427742418'
+    :type data: bytes
+
+    :return: array with shape Nx2 (frame, time) in file order
+    :rtype: np.array
+    """
+    return np.loadtxt(io.BytesIO(data), usecols=(1, 3), ndmin=2)
+
+
+class ShardReader:
+    """
+    Memory-mapped random access to a packed sequence
+
+    | Example:
+    | >>> shard = ShardReader.open('path/to/radiate/city_3_7.shard')
+    | >>> radar = shard.read_image('Navtech_Cartesian', 1)
+    | >>> lidar = shard.read_lidar(1)
+    """
+
+    def __init__(self, path):
+        """
+        :param path: path to the .shard file
+        :type path: string
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mm[:len(MAGIC)] != MAGIC or self.mm[-len(MAGIC):] != MAGIC:
+            if self.mm[:len(MAGIC)] in OLD_MAGICS:
+                raise ValueError('sequence shard with an older format, pack it again with '
+                                 'python -m utils.shard path/to/radiate --overwrite: {}'.format(path))
+            raise ValueError('not a sequence shard: {}'.format(path))
+        footer = np.frombuffer(self.mm, dtype=np.uint64, count=2,
+                               offset=len(self.mm) - len(MAGIC) - 16)
+        index_offset, index_length = int(footer[0]), int(footer[1])
+        with np.load(io.BytesIO(self.mm[index_offset:index_offset + index_length])) as index:
+            self.sensors = [str(s) for s in index['sensors']]
+            entries = index['entries']
+            self.files = {str(name): (int(offset), int(length))
+                          for name, (offset, length) in zip(index['file_names'], index['files'])}
+            self.tables = {key[len('timestamps/'):]: index[key]
+                           for key in index.files if key.startswith('timestamps/')}
+
+        # (sensor, frame) -> (offset, length)
+        self.rows = {sensor: {} for sensor in self.sensors}
+        for sensor_id, frame, offset, length in entries.tolist():
+            self.rows[self.sensors[sensor_id]][frame] = (offset, length)
+
+    @classmethod
+    def open(cls, sequence_path):
+        """
+        Open the shard of a sequence
+
+        :param sequence_path: path to a .shard file, or path/to/sequence_root with a
+            shard next to it (path/to/sequence_root.shard)
+        :type sequence_path: string
+
+        :return: the reader or None if there is no shard
+        :rtype: ShardReader
+        """
+        if os.path.isfile(sequence_path) and sequence_path.endswith(EXTENSION):
+            return cls(sequence_path)
+        if os.path.isfile(shard_path(sequence_path)):
+            return cls(shard_path(sequence_path))
+        return None
+
+    def __contains__(self, key):
+        sensor, frame = key
+        return sensor in self.rows and frame in self.rows[sensor]
+
+    def frames(self, sensor):
+        """
+        Frames of a sensor
+
+        :param sensor: sensor folder name, e.g. 'zed_left'
+        :type sensor: string
+
+        :return: sorted frame numbers
+        :rtype: list
+        """
+        return sorted(self.rows[sensor])
+
+    def get(self, sensor, frame):
+        """
+        Zero-copy bytes of one frame
+
+        :param sensor: sensor folder name, e.g. 'zed_left'
+        :type sensor: string
+        :param frame: frame number
+        :type frame: int
+
+        :return: uint8 view of the stored bytes
+        :rtype: np.array
+        """
+        offset, length = self.rows[sensor][frame]
+        return np.frombuffer(self.mm, dtype=np.uint8, count=length, offset=offset)
+
+    def read_image(self, sensor, frame, flags=cv2.IMREAD_COLOR):
+        """
+        Decode one image
+
+        :param sensor: sensor folder name, e.g. 'Navtech_Cartesian'
+        :type sensor: string
+        :param frame: frame number
+        :type frame: int
+        :param flags: cv2.imdecode flags
+        :type flags: int
+
+        :return: image as read by cv2.imread
+        :rtype: np.array
+        """
+        return cv2.imdecode(self.get(sensor, frame), flags)
+
+    def read_lidar(self, frame):
+        """
+        Read one lidar point cloud
+
+        :param frame: lidar frame number
+        :type frame: int
+
+        :return: read-only lidar point cloud Nx5 float64 (x,y,z,intensity,ring), with the
+            values of the csv file and without any copy
+        :rtype: np.array
+        """
+        return self.get('velo_lidar', frame).view(np.float64).reshape(-1, 5)
+
+    def read_file(self, name):
+        """
+        Content of one of the other files of the sequence
+
+        :param name: path relative to the sequence root, e.g. 'annotations/annotations.json'
+        :type name: string
+
+        :return: file content or None if the file was not packed
+        :rtype: bytes
+        """
+        if name not in self.files:
+            return None
+        offset, length = self.files[name]
+        return self.mm[offset:offset + length]
+
+    def timestamps(self, name):
+        """
+        Parsed timestamp table
+
+        :param name: timestamp file name, e.g. 'zed_left.txt'
+        :type name: string
+
+        :return: array with shape Nx2 (frame, time) in file order
+        :rtype: np.array
+        """
+        return self.tables[name]
+
+    def close(self):
+        self.mm.close()
+
+
+def pack_sequence(sequence_path, output_path=None, overwrite=False):
+    """
+    Pack all the sensors, timestamps and annotations of a sequence into one file
+
+    :param sequence_path: path/to/sequence_root
+    :type sequence_path: string
+    :param output_path: path of the .shard file, defaults to path/to/sequence_root.shard
+    :type output_path: string
+    :param overwrite: whether to rebuild an existing shard
+    :type overwrite: bool
+
+    :return: path to the shard
+    :rtype: string
+    """
+    if output_path is None:
+        output_path = shard_path(sequence_path)
+    if os.path.exists(output_path) and not overwrite:
+        return output_path
+
+    sensors = []
+    entries = []
+    file_names = []
+    files = []
+    tables = {}
+    # write into a temporary file so a partial shard is never opened
+    tmp_path = '{}.{}.tmp'.format(output_path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+
+        def write_blob(data):
+            padding = -f.tell() % ALIGNMENT
+            f.write(b'\0' * padding)
+            offset = f.tell()
+            f.write(data)
+            return offset, len(data)
+
+        for sensor, (extension, kind) in SENSOR_FOLDERS.items():
+            folder = os.path.join(sequence_path, sensor)
+            if not os.path.isdir(folder):
+                continue
+            sensor_id = len(sensors)
+            sensors.append(sensor)
+            for file_name in sorted(os.listdir(folder)):
+                name, ext = os.path.splitext(file_name)
+                if ext != extension:
+                    continue
+                path = os.path.join(folder, file_name)
+                if kind == 'lidar':
+                    data = np.ascontiguousarray(read_csv(path), dtype=np.float64).tobytes()
+                else:
+                    with open(path, 'rb') as sensor_file:
+                        data = sensor_file.read()
+                offset, length = write_blob(data)
+                entries.append((sensor_id, int(name), offset, length))
+
+        other_files = [f_name for f_name in sorted(os.listdir(sequence_path))
+                       if os.path.isfile(os.path.join(sequence_path, f_name))]
+        other_files.append(os.path.join('annotations', 'annotations.json'))
+        for name in other_files:
+            path = os.path.join(sequence_path, name)
+            if not os.path.isfile(path):
+                continue
+            with open(path, 'rb') as other_file:
+                data = other_file.read()
+            name = name.replace(os.sep, '/')
+            file_names.append(name)
+            files.append(write_blob(data))
+            if name.endswith('.txt'):
+                tables['timestamps/' + name] = read_timestamp_table(data)
+
+        index = io.BytesIO()
+        np.savez(index, sensors=np.array(sensors, dtype=str),
+                 entries=np.array(entries, dtype=ENTRY_DTYPE),
+                 file_names=np.array(file_names, dtype=str),
+                 files=np.array(files, dtype=np.int64).reshape(-1, 2),
+                 **tables)
+        index_offset, index_length = write_blob(index.getvalue())
+        f.write(np.array([index_offset, index_length], dtype=np.uint64).tobytes())
+        f.write(MAGIC)
+
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def pack_dataset(root_path, overwrite=False):
+    """
+    Pack every sequence inside the dataset root folder
+
+    :param root_path: path/to/radiate
+    :type root_path: string
+    :param overwrite: whether to rebuild existing shards
+    :type overwrite: bool
+    """
+    for sequence in sorted(os.listdir(root_path)):
+        sequence_path = os.path.join(root_path, sequence)
+        if os.path.isdir(os.path.join(sequence_path, 'Navtech_Cartesian')):
+            print('Packing', sequence)
+            pack_sequence(sequence_path, overwrite=overwrite)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("root_folder", help="root folder with radiate dataset",
+                        type=str)
+    parser.add_argument("--overwrite", help="rebuild existing shards",
+                        action='store_true')
+    args = parser.parse_args()
+    pack_dataset(args.root_folder, args.overwrite)
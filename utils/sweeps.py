@@ -0,0 +1,217 @@
+"""
+Accumulation of consecutive lidar sweeps with ego-motion compensation.
+
+Each sweep is moved once into the local east, north, up frame of the GPS/IMU
+odometry and kept in a ring buffer. Consecutive frames therefore only read and
+transform their newest sweep, and the merged cloud is brought into the frame of
+the current sweep with a single transform. When the odometry does not cover
+the requested sweeps, they are stacked without being moved (from a second ring
+buffer of unmoved sweeps) and a warning is issued once per uncovered interval.
+
+| Example:
+| >>> accumulator = SweepAccumulator(read_sweep, odometry, lidar_to_imu)
+| >>> cloud = accumulator.accumulate(frames, times)  # Nx6 x,y,z,intensity,ring,dt
+"""
+import threading
+import warnings
+from collections import OrderedDict
+import numpy as np
+from utils.odometry import pose_matrices
+
+
+def euler_transform(R, T):
+    """
+    Homogeneous transform from a rotation (roll, pitch, yaw in degrees, applied in this
+    order about the fixed x, y and z axes) and a translation
+
+    :param R: roll, pitch, yaw in degrees
+    :type R: list
+    :param T: translation in meters
+    :type T: list
+
+    :return: 4x4 transform
+    :rtype: np.array
+    """
+    roll, pitch, yaw = np.deg2rad(np.asarray(R, dtype=np.float64))
+    Rx = np.array([[1, 0, 0],
+                   [0, np.cos(roll), -np.sin(roll)],
+                   [0, np.sin(roll), np.cos(roll)]])
+    Ry = np.array([[np.cos(pitch), 0, np.sin(pitch)],
+                   [0, 1, 0],
+                   [-np.sin(pitch), 0, np.cos(pitch)]])
+    Rz = np.array([[np.cos(yaw), -np.sin(yaw), 0],
+                   [np.sin(yaw), np.cos(yaw), 0],
+                   [0, 0, 1]])
+    M = np.eye(4)
+    M[:3, :3] = Rz @ Ry @ Rx
+    M[:3, 3] = T
+    return M
+
+
+class SweepAccumulator:
+    """
+    Ring buffers of recent lidar sweeps, in the odometry frame and unmoved
+    """
+
+    def __init__(self, read_sweep, odometry=None, lidar_to_imu=None, buffer_size=10):
+        """
+        :param read_sweep: function returning the Nx5 (x,y,z,intensity,ring) point cloud
+            of a lidar frame
+        :type read_sweep: function
+        :param odometry: GPS/IMU poses, None stacks the sweeps without moving them
+        :type odometry: utils.odometry.Odometry
+        :param lidar_to_imu: 4x4 transform from the lidar to the IMU frame, required with
+            the odometry
+        :type lidar_to_imu: np.array
+        :param buffer_size: number of sweeps kept in each buffer
+        :type buffer_size: int
+        """
+        if odometry is not None and lidar_to_imu is None:
+            raise ValueError('ego-motion compensation needs the lidar to IMU transform')
+        self.read_sweep = read_sweep
+        self.odometry = odometry
+        self.lidar_to_imu = None if lidar_to_imu is None else np.asarray(lidar_to_imu)
+        self.buffer_size = max(1, buffer_size)
+        self.sweeps = OrderedDict()
+        self.raw_sweeps = OrderedDict()
+        # uncovered intervals already reported (index of the gap in the odometry times)
+        self.reported = set()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def covers(self, times):
+        """
+        Whether the odometry has poses for all the timestamps
+
+        :param times: timestamps
+        :type times: list
+
+        :rtype: bool
+        """
+        return self.odometry is not None and bool(np.all(self.odometry.pose_at(times)['valid']))
+
+    def report_uncovered(self, times):
+        """
+        Warn that the sweeps are stacked without being moved, once per interval of
+        timestamps without poses (before the first or after the last record)
+
+        :param times: timestamps of the sweeps
+        :type times: list
+        """
+        times = np.asarray(times, dtype=np.float64)
+        uncovered = times[~self.odometry.pose_at(times)['valid']]
+        gaps = set(np.searchsorted(self.odometry.times, uncovered).tolist())
+        with self.lock:
+            gaps -= self.reported
+            self.reported |= gaps
+        if gaps:
+            warnings.warn('the GPS/IMU records do not cover the lidar timestamps '
+                          '[{:.3f} {:.3f}], the sweeps are stacked without ego-motion '
+                          'compensation'.format(uncovered.min(), uncovered.max()))
+
+    def lidar_poses(self, times):
+        """
+        Transforms from the lidar to the odometry frame
+
+        :param times: timestamps
+        :type times: np.array
+
+        :return: Nx4x4 transforms
+        :rtype: np.array
+        """
+        poses = self.odometry.pose_at(times)
+        if not np.all(poses['valid']):
+            raise ValueError('the GPS/IMU records do not cover the lidar timestamps '
+                             '[{:.3f} {:.3f}]'.format(np.min(times), np.max(times)))
+        return pose_matrices(poses['position'], poses['orientation']) @ self.lidar_to_imu
+
+    def sweep(self, frame, t, ego_motion=None):
+        """
+        Sweep of a lidar frame, moved into the odometry frame when ego_motion is set, from
+        the ring buffer when possible
+
+        :param frame: lidar frame
+        :type frame: int
+        :param t: timestamp of the frame
+        :type t: float
+        :param ego_motion: whether to move the sweep into the odometry frame, defaults to
+            whether the accumulator has odometry
+        :type ego_motion: bool
+
+        :return: tuple (xyz, attributes) with the Nx3 float64 points and the Nx2
+            (intensity, ring) float32 attributes
+        :rtype: tuple
+        """
+        if ego_motion is None:
+            ego_motion = self.odometry is not None
+        sweeps = self.sweeps if ego_motion else self.raw_sweeps
+        with self.lock:
+            if frame in sweeps:
+                sweeps.move_to_end(frame)
+                self.hits += 1
+                return sweeps[frame]
+            self.misses += 1
+
+        lidar = self.read_sweep(frame)
+        xyz = np.asarray(lidar[:, :3], dtype=np.float64)
+        if ego_motion:
+            M = self.lidar_poses([t])[0]
+            xyz = xyz @ M[:3, :3].T + M[:3, 3]
+        value = (xyz, np.asarray(lidar[:, 3:5], dtype=np.float32))
+        for array in value:
+            array.flags.writeable = False
+
+        with self.lock:
+            value = sweeps.setdefault(frame, value)
+            while len(sweeps) > self.buffer_size:
+                sweeps.popitem(last=False)
+        return value
+
+    def accumulate(self, frames, times):
+        """
+        Merge sweeps into the frame of the last one
+
+        :param frames: lidar frames, the last one is the current sweep
+        :type frames: list
+        :param times: timestamps of the frames
+        :type times: list
+
+        :return: Nx6 point cloud (x,y,z,intensity,ring,dt) where dt is the time of the
+            sweep of each point minus the time of the current sweep (<= 0)
+        :rtype: np.array
+        """
+        ego_motion = self.odometry is not None
+        if ego_motion and not self.covers(times):
+            self.report_uncovered(times)
+            ego_motion = False
+        sweeps = [self.sweep(frame, t, ego_motion) for frame, t in zip(frames, times)]
+        counts = [len(xyz) for xyz, _ in sweeps]
+        cloud = np.empty((sum(counts), 6))
+        start = 0
+        for (xyz, attributes), t, count in zip(sweeps, times, counts):
+            cloud[start:start + count, :3] = xyz
+            cloud[start:start + count, 3:5] = attributes
+            cloud[start:start + count, 5] = t - times[-1]
+            start += count
+        if ego_motion:
+            M = np.linalg.inv(self.lidar_poses([times[-1]])[0])
+            cloud[:, :3] = cloud[:, :3] @ M[:3, :3].T + M[:3, 3]
+        return cloud
+
+    def clear(self):
+        """
+        Remove all the buffered sweeps
+        """
+        with self.lock:
+            self.sweeps.clear()
+            self.raw_sweeps.clear()
+
+    def stats(self):
+        """
+        :return: dictionary with the 'hits', 'misses' and buffered 'sweeps'
+        :rtype: dict
+        """
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'sweeps': len(self.sweeps) + len(self.raw_sweeps)}
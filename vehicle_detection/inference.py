@@ -0,0 +1,467 @@
+"""
+Headless batched radar vehicle detection over whole sequences.
+
+Three stages run at the same time:
+
+| loading: a thread pool reads, decodes and resizes the radar images ahead of the model
+| forward: the images go through the model in batches of N images per call
+| post-processing: a background thread converts the predictions into annotation boxes
+|              and writes the detections of each finished sequence
+
+The detections of each sequence are written to <output>/<sequence>.npz with the
+annotation schema (x, y, width, height, rotation of the top left corner, plus the
+score), indexed by annotation frame. They are read back with
+utils.annotations.load_detections.
+
+| Example (test set, batches of 4 images):
+| $ python inference.py --root_folder ../data/radiate/ --sets test --batch_size 4
+| Example (one sequence):
+| $ python inference.py --root_folder ../data/radiate/ --sequences tiny_foggy
+| Example (check the pipeline without torch, the annotations are written as detections):
+| $ python inference.py --root_folder ../data/radiate/ --sequences tiny_foggy --replay_annotations
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# radiate sdk
+sys.path.insert(0, '..')
+import radiate
+from utils.annotations import DETECTION_DTYPE, save_detections
+from utils.evaluation import VEHICLE_CLASS_MAP
+
+
+class LatencyStats:
+    """
+    Thread-safe latency samples of the pipeline stages
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def add(self, stage, seconds, frames=1):
+        """
+        Record one call of a stage
+
+        :param stage: stage name
+        :type stage: string
+        :param seconds: duration of the call
+        :type seconds: float
+        :param frames: number of frames processed by the call
+        :type frames: int
+        """
+        with self.lock:
+            self.samples.setdefault(stage, []).append((seconds, frames))
+
+    def summary(self):
+        """
+        :return: dictionary with the 'calls', 'frames', 'mean_ms', 'p50_ms', 'p95_ms' (per
+            call) and 'ms_per_frame' of each stage
+        :rtype: dict
+        """
+        with self.lock:
+            samples = {stage: np.array(values) for stage, values in self.samples.items()}
+        summary = {}
+        for stage, values in samples.items():
+            seconds, frames = values[:, 0] * 1000, values[:, 1]
+            summary[stage] = {'calls': len(values),
+                              'frames': int(frames.sum()),
+                              'mean_ms': float(seconds.mean()),
+                              'p50_ms': float(np.percentile(seconds, 50)),
+                              'p95_ms': float(np.percentile(seconds, 95)),
+                              'ms_per_frame': float(seconds.sum() / max(frames.sum(), 1))}
+        return summary
+
+
+def radar_frames(source):
+    """
+    Radar frames of a sequence, of all the sequences of a dataset or of a list of them
+
+    :param source: a radiate.Sequence, a radiate.Dataset or a list of them
+    :type source: radiate.Sequence
+
+    :return: iterator of tuples (sequence_name, sequence, frame, t)
+    :rtype: iterator
+    """
+    if isinstance(source, (list, tuple)):
+        for item in source:
+            yield from radar_frames(item)
+    elif isinstance(source, radiate.Dataset):
+        for ii, name in enumerate(source.sequence_names):
+            seq = source.sequence(name)
+            start, end = source.offsets[ii], source.offsets[ii + 1]
+            for frame, t in zip(source.frames[start:end].tolist(),
+                                source.times[start:end].tolist()):
+                yield name, seq, frame, t
+    else:
+        name = os.path.basename(source.output_folder)
+        for frame, t in zip(source.timestamp_radar['frame'].tolist(),
+                            source.timestamp_radar['time'].tolist()):
+            yield name, source, frame, t
+
+
+def predictions_to_detections(instances, frame, rotated):
+    """
+    Convert the predictions of one image into the annotation schema
+
+    :param instances: detectron2 Instances on the cpu
+    :type instances: detectron2.structures.Instances
+    :param frame: annotation frame (radar frame - 1)
+    :type frame: int
+    :param rotated: whether the boxes are rotated (XYWHA_ABS) instead of XYXY_ABS
+    :type rotated: bool
+
+    :return: detections with DETECTION_DTYPE
+    :rtype: np.array
+    """
+    boxes = instances.pred_boxes.tensor.numpy().astype(np.float64)
+    detections = np.zeros(len(boxes), dtype=DETECTION_DTYPE)
+    if rotated:
+        # (center x, center y, width, height, angle) as in the training dicts
+        detections['x'] = boxes[:, 0] - boxes[:, 2] / 2
+        detections['y'] = boxes[:, 1] - boxes[:, 3] / 2
+        detections['w'] = boxes[:, 2]
+        detections['h'] = boxes[:, 3]
+        detections['rotation'] = boxes[:, 4]
+    else:
+        detections['x'] = boxes[:, 0]
+        detections['y'] = boxes[:, 1]
+        detections['w'] = boxes[:, 2] - boxes[:, 0]
+        detections['h'] = boxes[:, 3] - boxes[:, 1]
+    detections['id'] = np.arange(len(boxes))
+    detections['class_id'] = instances.pred_classes.numpy()
+    detections['frame'] = frame
+    detections['score'] = instances.scores.numpy()
+    return detections
+
+
+class Detectron2Model:
+    """
+    detectron2 model with the preprocessing of DefaultPredictor. torch and detectron2
+    are imported when the model is built
+    """
+
+    def __init__(self, cfg, class_names=('vehicle',)):
+        """
+        :param cfg: detectron2 config, with the weights in cfg.MODEL.WEIGHTS
+        :type cfg: detectron2.config.CfgNode
+        :param class_names: name of each class id of the model
+        :type class_names: tuple
+        """
+        import torch
+        from detectron2.modeling import build_model
+        from detectron2.checkpoint import DetectionCheckpointer
+        import detectron2.data.transforms as T
+        self.torch = torch
+        self.model = build_model(cfg)
+        self.model.eval()
+        DetectionCheckpointer(self.model).load(cfg.MODEL.WEIGHTS)
+        self.aug = T.ResizeShortestEdge([cfg.INPUT.MIN_SIZE_TEST, cfg.INPUT.MIN_SIZE_TEST],
+                                        cfg.INPUT.MAX_SIZE_TEST)
+        self.input_format = cfg.INPUT.FORMAT
+        self.rotated = cfg.MODEL.PROPOSAL_GENERATOR.NAME == 'RRPN'
+        self.class_names = list(class_names)
+
+    def load(self, seq, frame):
+        """
+        Read and preprocess one radar image
+
+        :param seq: sequence of the image
+        :type seq: radiate.Sequence
+        :param frame: radar frame
+        :type frame: int
+
+        :return: model input dict ('image', 'height', 'width') or None if the image is missing
+        :rtype: dict
+        """
+        image = seq.read_image('Navtech_Cartesian', frame)
+        if image is None:
+            return None
+        if self.input_format == 'RGB':
+            image = image[:, :, ::-1]
+        height, width = image.shape[:2]
+        transformed = self.aug.get_transform(image).apply_image(image)
+        return {'image': self.torch.as_tensor(
+                    np.ascontiguousarray(transformed.transpose(2, 0, 1)),
+                    dtype=self.torch.float32),
+                'height': height,
+                'width': width}
+
+    def forward(self, inputs):
+        """
+        :param inputs: model inputs of a batch
+        :type inputs: list
+
+        :return: one output dict with the 'instances' per input
+        :rtype: list
+        """
+        with self.torch.no_grad():
+            return self.model(inputs)
+
+    def to_detections(self, output, frame):
+        """
+        :param output: output of one image
+        :type output: dict
+        :param frame: annotation frame
+        :type frame: int
+
+        :return: detections with DETECTION_DTYPE
+        :rtype: np.array
+        """
+        return predictions_to_detections(output['instances'].to('cpu'), frame, self.rotated)
+
+
+class AnnotationReplay:
+    """
+    Stand-in for a model which returns the annotations of each radar image as detections
+    with score 1. It runs the whole pipeline (loading, batching, annotation frames, writing)
+    without torch, and its detections get an AP of 1 with utils.evaluation
+    """
+
+    def __init__(self, class_map=VEHICLE_CLASS_MAP, class_names=('vehicle',)):
+        """
+        :param class_map: annotation class name -> detected class name, the other classes
+            are not detected
+        :type class_map: dict
+        :param class_names: name of each class id of the detections
+        :type class_names: tuple
+        """
+        self.class_map = class_map
+        self.class_names = list(class_names)
+
+    def load(self, seq, frame):
+        """
+        Read the radar image (as the models do) and the annotations of one frame
+
+        :param seq: sequence of the image
+        :type seq: radiate.Sequence
+        :param frame: radar frame
+        :type frame: int
+
+        :return: list of annotations or None if the image is missing
+        :rtype: list
+        """
+        if seq.read_image('Navtech_Cartesian', frame) is None:
+            return None
+        # the annotations of the radar frame N are at index N - 1
+        return [obj for obj in seq.get_annotation_from_id(frame - 1)
+                if obj['class_name'] in self.class_map]
+
+    def forward(self, inputs):
+        return inputs
+
+    def to_detections(self, output, frame):
+        detections = np.zeros(len(output), dtype=DETECTION_DTYPE)
+        for ii, obj in enumerate(output):
+            x, y, w, h = obj['bbox']['position']
+            detections[ii] = (obj['id'], self.class_names.index(self.class_map[obj['class_name']]),
+                              x, y, w, h, obj['bbox']['rotation'], frame, 1.0)
+        return detections
+
+
+class InferenceRunner:
+    """
+    Pipelined batched inference of a model on radar images
+
+    | Example:
+    | >>> runner = InferenceRunner(Detectron2Model(cfg), batch_size=4)
+    | >>> stats = runner.run(radiate.Dataset('../data/radiate/', sets=['test'],
+    | >>>                                    config_file='../config/config.yaml'), 'detections')
+    """
+
+    def __init__(self, model, batch_size=4, load_workers=4, prefetch=16):
+        """
+        :param model: model with load(seq, frame) (called in the loading threads),
+            forward(inputs) for a batch, to_detections(output, annotation_frame) and
+            class_names, e.g. Detectron2Model
+        :type model: Detectron2Model
+        :param batch_size: number of images per forward pass
+        :type batch_size: int
+        :param load_workers: number of threads loading the images
+        :type load_workers: int
+        :param prefetch: maximum number of images loaded ahead of the model
+        :type prefetch: int
+        """
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.load_workers = max(1, load_workers)
+        self.prefetch = max(self.batch_size, prefetch)
+        self.class_names = list(model.class_names)
+        self.latency = LatencyStats()
+
+    def load(self, seq, frame):
+        """
+        Read and preprocess one radar image (runs in the loading threads)
+
+        :param seq: sequence of the image
+        :type seq: radiate.Sequence
+        :param frame: radar frame
+        :type frame: int
+
+        :return: model input or None if the image is missing
+        """
+        t0 = time.perf_counter()
+        inputs = self.model.load(seq, frame)
+        if inputs is not None:
+            self.latency.add('load', time.perf_counter() - t0)
+        return inputs
+
+    def run(self, source, output_folder):
+        """
+        Detect the vehicles of every radar frame and write the detections of each sequence
+        to output_folder/<sequence>.npz
+
+        :param source: a radiate.Sequence, a radiate.Dataset or a list of them
+        :type source: radiate.Sequence
+        :param output_folder: output folder
+        :type output_folder: string
+
+        :return: statistics with the number of 'frames', 'detections' and 'sequences', the
+            'elapsed' seconds, the 'fps' and the 'latency' of each stage (see LatencyStats)
+        :rtype: dict
+        """
+        os.makedirs(output_folder, exist_ok=True)
+        self.latency = LatencyStats()
+        # the post-processing state is only touched by the post-processing thread
+        state = {'name': None, 'detections': [], 'last_frame': 0, 'frames': 0,
+                 'num_detections': 0, 'sequences': 0}
+
+        def flush():
+            if state['name'] is None:
+                return
+            t0 = time.perf_counter()
+            detections = (np.concatenate(state['detections']) if state['detections']
+                          else np.zeros(0, dtype=DETECTION_DTYPE))
+            save_detections(os.path.join(output_folder, state['name'] + '.npz'),
+                            detections, self.class_names, state['last_frame'])
+            self.latency.add('write', time.perf_counter() - t0)
+            state['num_detections'] += len(detections)
+            state['sequences'] += 1
+            state['detections'] = []
+
+        def postprocess(keys, outputs):
+            t0 = time.perf_counter()
+            for (name, frame), output in zip(keys, outputs):
+                if name != state['name']:
+                    flush()
+                    state['name'] = name
+                    state['last_frame'] = 0
+                state['last_frame'] = max(state['last_frame'], frame)
+                # annotation frames start at 0 for the radar frame 1
+                state['detections'].append(self.model.to_detections(output, frame - 1))
+            state['frames'] += len(keys)
+            self.latency.add('postprocess', time.perf_counter() - t0, len(keys))
+
+        start_time = time.perf_counter()
+        post_futures = deque()
+        with ThreadPoolExecutor(self.load_workers) as loader, \
+                ThreadPoolExecutor(1) as post:
+
+            def forward(batch):
+                keys = [key for key, _ in batch]
+                t0 = time.perf_counter()
+                outputs = self.model.forward([inputs for _, inputs in batch])
+                self.latency.add('forward', time.perf_counter() - t0, len(batch))
+                # a single thread keeps the frames in order
+                post_futures.append(post.submit(postprocess, keys, outputs))
+                while post_futures and post_futures[0].done():
+                    post_futures.popleft().result()
+
+            pending = deque()
+            batch = []
+            frames = radar_frames(source)
+            while True:
+                # keep the loading threads busy while the model runs
+                while len(pending) < self.prefetch:
+                    item = next(frames, None)
+                    if item is None:
+                        break
+                    name, seq, frame, _ = item
+                    pending.append(((name, frame), loader.submit(self.load, seq, frame)))
+                if not pending:
+                    break
+                key, future = pending.popleft()
+                t0 = time.perf_counter()
+                inputs = future.result()
+                self.latency.add('wait', time.perf_counter() - t0)
+                if inputs is None:
+                    continue
+                batch.append((key, inputs))
+                if len(batch) == self.batch_size:
+                    forward(batch)
+                    batch = []
+            if batch:
+                forward(batch)
+            for future in post_futures:
+                future.result()
+            post.submit(flush).result()
+
+        elapsed = time.perf_counter() - start_time
+        return {'frames': state['frames'],
+                'detections': state['num_detections'],
+                'sequences': state['sequences'],
+                'elapsed': elapsed,
+                'fps': state['frames'] / elapsed if elapsed > 0 else 0.0,
+                'latency': self.latency.summary()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root_folder", help="root folder with radiate dataset",
+                        default='../data/radiate/', type=str)
+    parser.add_argument("--sequences", help="sequences to process (default: all)",
+                        nargs='*', default=None)
+    parser.add_argument("--sets", help="keep only these meta.json sets (e.g. test)",
+                        nargs='*', default=None)
+    parser.add_argument("--weathers", help="keep only these meta.json types (e.g. fog snow)",
+                        nargs='*', default=None)
+    parser.add_argument("--model_name", help="Model Name (Ex: faster_rcnn_R_101_FPN_3x)",
+                        default='faster_rcnn_R_101_FPN_3x', type=str)
+    parser.add_argument("--setting", help="training setting of the weights",
+                        default='good_and_bad_weather_radar', type=str)
+    parser.add_argument("--weights", help="weights file (default: weights/<model_name>_<setting>.pth)",
+                        default=None, type=str)
+    parser.add_argument("--device", help="'cpu' or 'cuda'", default='cpu', type=str)
+    parser.add_argument("--batch_size", help="number of images per forward pass",
+                        default=4, type=int)
+    parser.add_argument("--workers", help="number of threads loading the images",
+                        default=4, type=int)
+    parser.add_argument("--output", help="output folder", default='detections', type=str)
+    parser.add_argument("--replay_annotations", help="write the vehicle annotations as "
+                        "detections instead of running a model (no torch needed)",
+                        action='store_true')
+    args = parser.parse_args()
+
+    if args.replay_annotations:
+        model = AnnotationReplay()
+    else:
+        from detectron2.config import get_cfg
+        cfg = get_cfg()
+        cfg.merge_from_file(os.path.join('test', 'config', args.model_name + '.yaml'))
+        cfg.MODEL.DEVICE = args.device
+        cfg.MODEL.WEIGHTS = args.weights or os.path.join(
+            'weights', args.model_name + '_' + args.setting + '.pth')
+        cfg.MODEL.ROI_HEADS.NUM_CLASSES = 1  # only has one class (vehicle)
+        cfg.MODEL.ROI_HEADS.NMS_THRESH_TEST = 0.2
+        cfg.MODEL.ROI_HEADS.SCORE_THRESH_TEST = 0.5
+        cfg.MODEL.ANCHOR_GENERATOR.SIZES = [[8, 16, 32, 64, 128]]
+        model = Detectron2Model(cfg)
+
+    if args.sequences:
+        source = [radiate.Sequence(os.path.join(args.root_folder, name),
+                                   config_file='../config/config.yaml')
+                  for name in args.sequences]
+    else:
+        source = radiate.Dataset(args.root_folder, sets=args.sets, weathers=args.weathers,
+                                 config_file='../config/config.yaml')
+
+    runner = InferenceRunner(model, batch_size=args.batch_size, load_workers=args.workers)
+    stats = runner.run(source, args.output)
+    print(json.dumps(stats, indent=2))
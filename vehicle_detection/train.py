@@ -9,6 +9,7 @@ import random
 from detectron2.engine import DefaultTrainer, hooks
 from utils.trainer import Trainer
 from utils.rotated_trainer import RotatedTrainer
+from utils import radar_dicts
 from detectron2.config import get_cfg
 from detectron2.utils.visualizer import ColorMode
 from detectron2.engine import DefaultPredictor
@@ -42,6 +43,17 @@ parser.add_argument("--dataset_mode", help="dataset mode ('good_weather', 'good_
                     default='good_weather',
                     type=str)
 
+parser.add_argument("--workers", help="Number of processes building the dataset dicts",
+                    default=8,
+                    type=int)
+
+parser.add_argument("--cache_dir", help="Folder where the dataset dicts are cached ('' disables the cache)",
+                    default='dataset_cache',
+                    type=str)
+
+parser.add_argument("--cache_images", help="Keep the decoded radar images in memory (small datasets only)",
+                    action='store_true')
+
 # parse arguments
 args = parser.parse_args()
 model_name = args.model_name
@@ -49,6 +61,9 @@ root_dir = args.root_folder
 resume = args.resume
 dataset_mode = args.dataset_mode
 max_iter = args.max_iter
+workers = args.workers
+cache_dir = args.cache_dir
+cache_images = args.cache_images
 
 
 def train(model_name, root_dir, dataset_mode, max_iter):
@@ -70,102 +85,20 @@ def train(model_name, root_dir, dataset_mode, max_iter):
         elif meta["set"] == "test":
             folders_test.append(curr_dir)
 
-    def gen_boundingbox(bbox, angle):
-        theta = np.deg2rad(-angle)
-        R = np.array([[np.cos(theta), -np.sin(theta)],
-                      [np.sin(theta), np.cos(theta)]])
-        points = np.array([[bbox[0], bbox[1]],
-                           [bbox[0] + bbox[2], bbox[1]],
-                           [bbox[0] + bbox[2], bbox[1] + bbox[3]],
-                           [bbox[0], bbox[1] + bbox[3]]]).T
-
-        cx = bbox[0] + bbox[2] / 2
-        cy = bbox[1] + bbox[3] / 2
-        T = np.array([[cx], [cy]])
-
-        points = points - T
-        points = np.matmul(R, points) + T
-        points = points.astype(int)
-
-        min_x = np.min(points[0, :])
-        min_y = np.min(points[1, :])
-        max_x = np.max(points[0, :])
-        max_y = np.max(points[1, :])
-
-        return min_x, min_y, max_x, max_y
-
-    def get_radar_dicts(folders):
-        dataset_dicts = []
-        idd = 0
-        folder_size = len(folders)
-        for folder in folders:
-            radar_folder = os.path.join(root_dir, folder, 'Navtech_Cartesian')
-            annotation_path = os.path.join(root_dir,
-                                           folder, 'annotations', 'annotations.json')
-            with open(annotation_path, 'r') as f_annotation:
-                annotation = json.load(f_annotation)
-
-            radar_files = os.listdir(radar_folder)
-            radar_files.sort()
-            for frame_number in range(len(radar_files)):
-                record = {}
-                objs = []
-                bb_created = False
-                idd += 1
-                filename = os.path.join(
-                    radar_folder, radar_files[frame_number])
-
-                if (not os.path.isfile(filename)):
-                    print(filename)
-                    continue
-                record["file_name"] = filename
-                record["image_id"] = idd
-                record["height"] = 1152
-                record["width"] = 1152
-
-                for object in annotation:
-                    if (object['bboxes'][frame_number]):
-                        class_obj = object['class_name']
-                        if (class_obj != 'pedestrian' and class_obj != 'group_of_pedestrians'):
-                            bbox = object['bboxes'][frame_number]['position']
-                            angle = object['bboxes'][frame_number]['rotation']
-                            bb_created = True
-                            if cfg.MODEL.PROPOSAL_GENERATOR.NAME == "RRPN":
-                                cx = bbox[0] + bbox[2] / 2
-                                cy = bbox[1] + bbox[3] / 2
-                                wid = bbox[2]
-                                hei = bbox[3]
-                                obj = {
-                                    "bbox": [cx, cy, wid, hei, angle],
-                                    "bbox_mode": BoxMode.XYWHA_ABS,
-                                    "category_id": 0,
-                                    "iscrowd": 0
-                                }
-                            else:
-                                xmin, ymin, xmax, ymax = gen_boundingbox(
-                                    bbox, angle)
-                                obj = {
-                                    "bbox": [xmin, ymin, xmax, ymax],
-                                    "bbox_mode": BoxMode.XYXY_ABS,
-                                    "category_id": 0,
-                                    "iscrowd": 0
-                                }
-
-                            objs.append(obj)
-                if bb_created:
-                    record["annotations"] = objs
-                    dataset_dicts.append(record)
-        return dataset_dicts
-
     dataset_train_name = dataset_mode + '_train'
     dataset_test_name = dataset_mode + '_test'
 
+    # the dicts are built in parallel and cached, so registering them again is cheap
+    def get_radar_dicts(folders, name):
+        return radar_dicts.get_radar_dicts(root_dir, folders, cfg.MODEL.PROPOSAL_GENERATOR.NAME,
+                                           name=name, cache_dir=cache_dir, workers=workers)
+
     DatasetCatalog.register(dataset_train_name,
-                            lambda: get_radar_dicts(folders_train))
+                            lambda: get_radar_dicts(folders_train, dataset_train_name))
     MetadataCatalog.get(dataset_train_name).set(thing_classes=["vehicle"])
 
     DatasetCatalog.register(dataset_test_name,
-                            lambda: get_radar_dicts(folders_test))
+                            lambda: get_radar_dicts(folders_test, dataset_test_name))
     MetadataCatalog.get(dataset_test_name).set(thing_classes=["vehicle"])
 
     cfg_file = os.path.join('test', 'config', model_name + '.yaml')
@@ -186,6 +119,7 @@ def train(model_name, root_dir, dataset_mode, max_iter):
 
     os.makedirs(cfg.OUTPUT_DIR, exist_ok=True)
     if cfg.MODEL.PROPOSAL_GENERATOR.NAME == "RRPN":
+        RotatedTrainer.cache_images = cache_images
         trainer = RotatedTrainer(cfg)
     else:
         trainer = Trainer(cfg)
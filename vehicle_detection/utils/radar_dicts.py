@@ -0,0 +1,187 @@
+import os
+import json
+import pickle
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from detectron2.structures import BoxMode
+
+EXCLUDED_CLASSES = ('pedestrian', 'group_of_pedestrians')
+
+
+def gen_boundingboxes(boxes):
+    """
+    Axis aligned bounding boxes of rotated boxes
+
+    :param boxes: boxes with shape Nx5 (x, y, width, height, angle in degrees)
+    :type boxes: np.array
+
+    :return: boxes with shape Nx4 (xmin, ymin, xmax, ymax) of the integer corners
+    :rtype: np.array
+    """
+    x, y, w, h = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    theta = np.deg2rad(-boxes[:, 4])
+    cos = np.cos(theta)[:, None]
+    sin = np.sin(theta)[:, None]
+    cx = (x + w / 2)[:, None]
+    cy = (y + h / 2)[:, None]
+    dx = np.stack([x, x + w, x + w, x], axis=1) - cx
+    dy = np.stack([y, y, y + h, y + h], axis=1) - cy
+    px = (cos * dx - sin * dy + cx).astype(int)
+    py = (sin * dx + cos * dy + cy).astype(int)
+    return np.stack([px.min(axis=1), py.min(axis=1), px.max(axis=1), py.max(axis=1)], axis=1)
+
+
+def sequence_radar_dicts(root_dir, folder, rotated):
+    """
+    Dataset dicts of the radar frames of one sequence
+
+    :param root_dir: root folder with radiate dataset
+    :type root_dir: string
+    :param folder: sequence folder name
+    :type folder: string
+    :param rotated: whether to use rotated boxes (XYWHA_ABS) instead of XYXY_ABS
+    :type rotated: bool
+
+    :return: tuple (records, num_frames)
+        WHERE
+        list records are the dicts of the frames with boxes, whose "image_id" is the
+        frame position inside the sequence (starting at 1)
+        int num_frames is the number of radar frames of the sequence
+    :rtype: tuple
+    """
+    radar_folder = os.path.join(root_dir, folder, 'Navtech_Cartesian')
+    annotation_path = os.path.join(root_dir, folder, 'annotations', 'annotations.json')
+    with open(annotation_path, 'r') as f_annotation:
+        annotation = json.load(f_annotation)
+    radar_files = sorted(os.listdir(radar_folder))
+
+    # all the boxes of the sequence, in track order
+    frames = []
+    boxes = []
+    for obj in annotation:
+        if obj['class_name'] in EXCLUDED_CLASSES:
+            continue
+        for frame_number, bbox in enumerate(obj['bboxes'][:len(radar_files)]):
+            if bbox:
+                frames.append(frame_number)
+                boxes.append(list(bbox['position']) + [bbox['rotation']])
+    frames = np.array(frames, dtype=np.int64)
+    boxes = np.array(boxes, dtype=np.float64).reshape(-1, 5)
+
+    if rotated:
+        bboxes = np.stack([boxes[:, 0] + boxes[:, 2] / 2, boxes[:, 1] + boxes[:, 3] / 2,
+                           boxes[:, 2], boxes[:, 3], boxes[:, 4]], axis=1)
+        bbox_mode = BoxMode.XYWHA_ABS
+    else:
+        bboxes = gen_boundingboxes(boxes)
+        bbox_mode = BoxMode.XYXY_ABS
+
+    # group by frame keeping the track order
+    order = np.argsort(frames, kind='stable')
+    frames = frames[order]
+    bboxes = bboxes[order].tolist()
+    starts = np.searchsorted(frames, np.arange(len(radar_files) + 1))
+
+    records = []
+    for frame_number, radar_file in enumerate(radar_files):
+        start, end = starts[frame_number], starts[frame_number + 1]
+        if start == end:
+            continue
+        filename = os.path.join(radar_folder, radar_file)
+        if not os.path.isfile(filename):
+            print(filename)
+            continue
+        records.append({"file_name": filename,
+                        "image_id": frame_number + 1,
+                        "height": 1152,
+                        "width": 1152,
+                        "annotations": [{"bbox": bbox,
+                                         "bbox_mode": bbox_mode,
+                                         "category_id": 0,
+                                         "iscrowd": 0} for bbox in bboxes[start:end]]})
+    return records, len(radar_files)
+
+
+def cache_key(root_dir, folders, name, proposal_generator):
+    """
+    Hash of everything the dataset dicts depend on
+
+    :param root_dir: root folder with radiate dataset
+    :type root_dir: string
+    :param folders: sequence folder names
+    :type folders: list
+    :param name: dataset name (e.g. 'good_weather_train')
+    :type name: string
+    :param proposal_generator: cfg.MODEL.PROPOSAL_GENERATOR.NAME
+    :type proposal_generator: string
+
+    :return: hexadecimal hash
+    :rtype: string
+    """
+    h = hashlib.sha1()
+    h.update('{}|{}|{}'.format(name, proposal_generator, os.path.abspath(root_dir)).encode())
+    for folder in folders:
+        h.update(folder.encode())
+        for path in [os.path.join(root_dir, folder, 'annotations', 'annotations.json'),
+                     os.path.join(root_dir, folder, 'Navtech_Cartesian')]:
+            stat = os.stat(path)
+            h.update('{}:{}'.format(stat.st_mtime_ns, stat.st_size).encode())
+    return h.hexdigest()
+
+
+def get_radar_dicts(root_dir, folders, proposal_generator, name='radiate', cache_dir=None, workers=8):
+    """
+    Dataset dicts of the radar frames of several sequences, built in parallel (one
+    process per sequence) and cached on disk
+
+    :param root_dir: root folder with radiate dataset
+    :type root_dir: string
+    :param folders: sequence folder names
+    :type folders: list
+    :param proposal_generator: cfg.MODEL.PROPOSAL_GENERATOR.NAME, 'RRPN' uses rotated boxes
+    :type proposal_generator: string
+    :param name: dataset name, part of the cache key
+    :type name: string
+    :param cache_dir: folder of the cache files, None disables the cache
+    :type cache_dir: string
+    :param workers: number of processes, 0 builds the dicts in this process
+    :type workers: int
+
+    :return: list of dataset dicts
+    :rtype: list
+    """
+    folders = list(folders)
+    cache_file = None
+    if cache_dir:
+        key = cache_key(root_dir, folders, name, proposal_generator)
+        cache_file = os.path.join(cache_dir, 'radar_dicts_{}_{}.pkl'.format(name, key[:16]))
+        if os.path.isfile(cache_file):
+            with open(cache_file, 'rb') as f:
+                return pickle.load(f)
+
+    rotated = proposal_generator == 'RRPN'
+    args = ([root_dir] * len(folders), folders, [rotated] * len(folders))
+    if workers > 0 and len(folders) > 1:
+        with ProcessPoolExecutor(min(workers, len(folders))) as executor:
+            results = list(executor.map(sequence_radar_dicts, *args))
+    else:
+        results = list(map(sequence_radar_dicts, *args))
+
+    # image ids are consecutive over the radar frames of all sequences
+    dataset_dicts = []
+    offset = 0
+    for records, num_frames in results:
+        for record in records:
+            record["image_id"] += offset
+            dataset_dicts.append(record)
+        offset += num_frames
+
+    if cache_file is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_file = '{}.{}.tmp'.format(cache_file, os.getpid())
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(dataset_dicts, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+    return dataset_dicts
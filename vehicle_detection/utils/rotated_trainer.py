@@ -1,5 +1,5 @@
 import numpy as np
-import copy
+import cv2
 import torch
 
 from detectron2.structures import BoxMode
@@ -23,25 +23,72 @@ def transform_instance_annotations(annotation, transforms, image_size, *, keypoi
     return annotation
 
 
-def mapper(dataset_dict):
-    dataset_dict = copy.deepcopy(dataset_dict)
-    image = utils.read_image(dataset_dict["file_name"], format="BGR")
-    image, transforms = T.apply_transform_gens([T.Resize((1152, 1152))], image)
-    dataset_dict["image"] = torch.as_tensor(
-        image.transpose(2, 0, 1).astype("float32"))
+class RadarMapper:
+    """
+    Map a radar dataset dict into the format expected by the model.
 
-    annos = [
-        transform_instance_annotations(obj, transforms, image.shape[:2])
-        for obj in dataset_dict.pop("annotations")
-        if obj.get("iscrowd", 0) == 0
-    ]
-    instances = utils.annotations_to_instances_rotated(annos, image.shape[:2])
-    dataset_dict["instances"] = utils.filter_empty_instances(instances)
-    return dataset_dict
+    Only the keys that change are copied, the single-channel Navtech image is decoded
+    once and expanded to 3 channels without copying, the uint8 tensor is normalised by
+    the model itself, and the resize is skipped when the image already has the target
+    size. Decoded images can be kept in memory for small datasets (the cache is per data
+    loader worker).
+    """
+
+    def __init__(self, image_size=(1152, 1152), cache_images=False):
+        """
+        :param image_size: size (height, width) of the model input
+        :type image_size: tuple
+        :param cache_images: whether to keep the decoded images in memory
+        :type cache_images: bool
+        """
+        self.image_size = tuple(image_size)
+        self.cache = {} if cache_images else None
+
+    def read_image(self, file_name):
+        if self.cache is not None and file_name in self.cache:
+            return self.cache[file_name]
+        image = cv2.imread(file_name, cv2.IMREAD_UNCHANGED)
+        if image is None:
+            raise IOError('could not read {}'.format(file_name))
+        if image.ndim == 3 and image.shape[2] == 4:
+            image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+        if self.cache is not None:
+            self.cache[file_name] = image
+        return image
+
+    def __call__(self, dataset_dict):
+        dataset_dict = dict(dataset_dict)
+        image = self.read_image(dataset_dict["file_name"])
+        annos = [dict(obj) for obj in dataset_dict.pop("annotations")
+                 if obj.get("iscrowd", 0) == 0]
+
+        if image.shape[:2] != self.image_size:
+            image, transforms = T.apply_transform_gens(
+                [T.Resize(self.image_size)], image)
+            annos = [transform_instance_annotations(obj, transforms, image.shape[:2])
+                     for obj in annos]
+
+        # HxW (single channel) or HxWxC -> CxHxW uint8 without float copies
+        if image.ndim == 2:
+            tensor = torch.from_numpy(image).unsqueeze(0).expand(3, -1, -1)
+        else:
+            tensor = torch.from_numpy(np.ascontiguousarray(image.transpose(2, 0, 1)))
+        dataset_dict["image"] = tensor
+
+        instances = utils.annotations_to_instances_rotated(annos, image.shape[:2])
+        dataset_dict["instances"] = utils.filter_empty_instances(instances)
+        return dataset_dict
+
+
+mapper = RadarMapper()
 
 
 class RotatedTrainer(DefaultTrainer):
 
+    # keep the decoded radar images in memory (small datasets only)
+    cache_images = False
+
     @classmethod
     def build_train_loader(cls, cfg):
-        return build_detection_train_loader(cfg, mapper=mapper)
+        return build_detection_train_loader(
+            cfg, mapper=RadarMapper(cache_images=cls.cache_images))